@@ -2,28 +2,44 @@
 
 The core logic lives in the `trading/` package, split by responsibility:
   trading/utils.py       — safe_float, clamp_percentage, append_reason
-  trading/database.py    — SQLite persistence
+  trading/database.py    — SQLite persistence (WAL, shared connection)
+  trading/position.py    — in-memory high watermark / last decision time
   trading/indicators.py  — technical indicators, support/resistance
   trading/market.py      — market data, regime detection, charts
+  trading/candles.py     — on-disk OHLCV candle store
   trading/external.py    — news, Fear & Greed index
   trading/orderbook.py   — orderbook depth / slippage
+  trading/orderbook_store.py — orderbook snapshot recorder, binary day partitions
+  trading/fills.py       — backtest fill simulation (book walk, partial fills, latency)
   trading/decision.py    — normalize, risk policy, position sizing
-  trading/dca.py         — DCA splitting
-  trading/execution.py   — buy/sell order execution
-  trading/gpt.py         — GPT analysis
+  trading/risk.py        — vectorized risk kernel shared with the backtesters
+  trading/dca.py         — DCA plans (split buys) stored in the DB
+  trading/account.py     — cached balances and placed orders (one get_balances per TTL)
+  trading/execution.py   — buy/sell order execution, depth-sized order slicing
+  trading/orders.py      — background fill confirmation, reconciliation into the DB
+  trading/gpt.py         — GPT analysis (async, deadlines, hedging)
+  trading/prompt.py      — compact prompt encodings, token budget
+  trading/llm_cache.py   — content-addressed LLM response cache, recorded cycles
+  trading/gather.py      — concurrent input gathering
+  trading/risk_monitor.py — streaming stop-loss / trailing-stop monitor
+  trading/transport.py   — pooled HTTP, rate limiting, retries, circuit breaking
+  trading/cache.py       — TTL response cache for external feeds
+  trading/charts.py      — chart rendering worker and image cache
+  trading/scheduler.py   — asyncio job scheduler (priorities, timeouts, catch-up)
 """
 
+import asyncio
 import os
 import sys
-import signal
 import logging
 import json
+import threading
 import time
 from dotenv import load_dotenv
 load_dotenv()
 
 import pyupbit
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 import config
 
@@ -35,7 +51,8 @@ from trading.utils import safe_float, clamp_percentage, append_reason
 from trading.database import (
     initialize_db, migrate_db, save_decision_to_db,
     fetch_last_decisions, get_last_decision_time,
-    get_high_watermark, compute_high_watermark,
+    get_high_watermark, compute_high_watermark, close_repositories,
+    get_position_state,
 )
 from trading.indicators import add_indicators, detect_support_resistance
 from trading.market import (
@@ -49,22 +66,44 @@ from trading.decision import (
     apply_regime_adjustment, apply_tiered_take_profit,
     apply_risk_policy, check_position_risk,
 )
-from trading.dca import load_dca_state, save_dca_state, apply_dca, execute_dca_tranche, check_pending_dca
-from trading.execution import execute_buy, execute_sell
-from trading.gpt import get_instructions, analyze_data_with_gpt4
+from trading.dca import (
+    apply_dca, execute_dca_tranche, check_pending_dca, next_dca_due, import_legacy_dca_state,
+)
+from trading.execution import execute_buy, execute_sell, cancel_slicing, resume_slicing
+from trading.gpt import get_instructions, analyze_data_with_gpt4, cancel_inflight
+from trading.llm_cache import record_cycle
+from trading.gather import gather_sources
+from trading.transport import get_transport
+from trading.charts import start_renderer, shutdown_renderer
+from trading.risk_monitor import RiskMonitor
+from trading.orderbook_store import OrderbookRecorder
+from trading.orders import OrderTracker, set_tracker
+from trading.account import get_account
+from trading.scheduler import (
+    Scheduler, Job, Every, DailyAt, NextDue, PRIORITY_RISK, PRIORITY_DCA, PRIORITY_ANALYSIS,
+)
 
 # ---------------------------------------------------------------------------
 # Global state
 # ---------------------------------------------------------------------------
 logger = logging.getLogger("autotrade")
-shutdown_requested = False
+risk_monitor = None
+orderbook_recorder = None
+order_tracker = None
+
+# Order placement is serialized across the scheduler jobs and the risk
+# monitor thread; a risk exit also invalidates any decision still in flight.
+execution_lock = threading.Lock()
+last_risk_exit = 0.0  # monotonic time of the last risk-driven sell
 
 # Lazy init — allows backtest.py to import without requiring API keys
 try:
     client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     upbit = pyupbit.Upbit(os.getenv("UPBIT_ACCESS_KEY"), os.getenv("UPBIT_SECRET_KEY"))
 except Exception:
     client = None
+    async_client = None
     upbit = None
 
 
@@ -89,12 +128,6 @@ def setup_logging():
     logger.addHandler(file_handler)
 
 
-def handle_shutdown(sig, _frame):
-    global shutdown_requested
-    logger.info(f"Received signal {sig}, shutting down gracefully...")
-    shutdown_requested = True
-
-
 def validate_config():
     required = {
         "UPBIT_ACCESS_KEY": os.getenv("UPBIT_ACCESS_KEY"),
@@ -110,12 +143,15 @@ def validate_config():
 
 def _init_modules():
     """Wire up lazy-initialized clients to sub-modules."""
-    from trading import market as _market
+    from trading import account as _account
     from trading import execution as _execution
     from trading import gpt as _gpt
-    _market.set_upbit(upbit)
+    from trading import transport as _transport
+    _transport.install_pyupbit()
+    _account.set_upbit(upbit)
     _execution.set_upbit(upbit)
     _gpt.set_client(client)
+    _gpt.set_async_client(async_client)
 
 
 # ---------------------------------------------------------------------------
@@ -123,16 +159,36 @@ def _init_modules():
 # ---------------------------------------------------------------------------
 def make_decision_and_execute():
     logger.info("=== Starting full analysis cycle ===")
-    try:
-        news_data = get_news_data()
-        data_json, market_ctx, df_hourly = fetch_and_prepare_data()
-        last_decisions = fetch_last_decisions()
-        fear_greed = fetch_fear_and_greed_index(limit=config.FEAR_GREED_LIMIT)
-        current_status = get_current_status()
-        chart_b64 = generate_chart_image(df_hourly)
-    except Exception as e:
-        logger.error(f"Data fetch error: {e}", exc_info=True)
+    started = time.monotonic()
+    gathered = gather_sources({
+        "news": {"fn": get_news_data, "fallback": "No news data available."},
+        "market": {"fn": fetch_and_prepare_data},
+        "last_decisions": {"fn": fetch_last_decisions, "fallback": "No decisions found."},
+        "fear_greed": {
+            "fn": lambda: fetch_fear_and_greed_index(limit=config.FEAR_GREED_LIMIT),
+            "fallback": "No fear and greed data available.",
+        },
+        "status": {"fn": get_current_status},
+        "chart": {"fn": lambda market: generate_chart_image(market[2]),
+                  "after": "market", "fallback": ""},
+    }, timeouts=config.GATHER_TIMEOUTS)
+
+    missing = [n for n in ("market", "status") if n in gathered["errors"]]
+    if missing:
+        logger.error(f"Data fetch error: required inputs unavailable: {', '.join(missing)}")
         return
+    values = gathered["values"]
+    news_data = values["news"]
+    data_json, market_ctx, df_hourly = values["market"]
+    last_decisions = values["last_decisions"]
+    fear_greed = values["fear_greed"]
+    current_status = values["status"]
+    chart_b64 = values["chart"]
+    record_cycle({
+        "news_data": news_data, "data_json": data_json, "last_decisions": last_decisions,
+        "fear_and_greed": fear_greed, "current_status": current_status,
+        "chart_base64": chart_b64,
+    }, {"market_ctx": market_ctx})
 
     decision = None
     for attempt in range(config.MAX_RETRIES):
@@ -173,27 +229,75 @@ def make_decision_and_execute():
     logger.info(f"Decision: {decision}")
 
     try:
-        pct = decision.get("percentage", 0)
-        if decision["decision"] == "buy":
-            execute_buy(pct)
-        elif decision["decision"] == "sell":
-            execute_sell(pct)
-        if not skip_save:
-            save_decision_to_db(decision, current_status)
+        with execution_lock:
+            if last_risk_exit > started:
+                logger.warning("Risk exit executed during analysis — dropping stale decision")
+                return
+            pct = decision.get("percentage", 0)
+            order_uuids = []
+            if decision["decision"] == "buy":
+                order_uuids = execute_buy(pct)
+            elif decision["decision"] == "sell":
+                order_uuids = execute_sell(pct, price=cp)
+            if not skip_save:
+                save_decision_to_db(decision, current_status, order_uuids)
+        if risk_monitor is not None and decision["decision"] in ("buy", "sell"):
+            risk_monitor.request_refresh()
     except Exception as e:
         logger.error(f"Execution/save error: {e}", exc_info=True)
 
+    logger.info(f"Transport stats: {get_transport().stats()}")
+
+
+def _position(current_status):
+    """``(ask_price, btc_balance, avg_buy_price)`` from a status JSON."""
+    status = json.loads(current_status)
+    units = status.get("orderbook", {}).get("orderbook_units", [])
+    return (safe_float(units[0].get("ask_price") if units else 0),
+            safe_float(status.get("btc_balance")), safe_float(status.get("btc_avg_buy_price")))
+
+
+def execute_risk_exit(risk_decision, momentum=0.0):
+    """Sell for a stop-loss / trailing-stop / take-profit trigger.
+
+    Sliced orders in flight are stopped before their next child so the exit
+    gets the execution lock at once; the trigger is then re-checked against
+    fresh balances and price, since either may have moved while it waited.
+    Returns whether it sold.
+    """
+    global last_risk_exit
+    cancel_slicing()
+    with execution_lock:
+        resume_slicing()
+        get_account().invalidate()
+        current_status = get_current_status()
+        price, btc, avg = _position(current_status)
+        fresh = check_position_risk(price, avg, momentum) if btc > 0 else None
+        if not fresh:
+            logger.info(f"Risk exit ({risk_decision['reason']}) no longer triggered "
+                        f"at {price:,.0f} — skipped")
+            return False
+        order_uuids = execute_sell(fresh["percentage"], urgent=True, price=price)
+        save_decision_to_db(fresh, current_status, order_uuids)
+        last_risk_exit = time.monotonic()
+    if risk_monitor is not None:
+        risk_monitor.request_refresh()
+    return True
+
 
 def quick_risk_check():
-    """Quick risk check without GPT — runs every 30 minutes."""
+    """Quick risk check without GPT.
+
+    Runs every ``QUICK_RISK_CHECK_INTERVAL_MINUTES``, or as the fallback for
+    the streaming risk monitor, in which case it only acts while the
+    monitor's feed is stale (down or reconnecting).
+    """
+    if risk_monitor is not None and risk_monitor.healthy():
+        logger.debug("Quick risk check skipped — risk monitor is streaming")
+        return
     logger.info("--- Quick risk check ---")
     try:
-        current_status = get_current_status()
-        status = json.loads(current_status)
-        units = status.get("orderbook", {}).get("orderbook_units", [])
-        price = safe_float(units[0].get("ask_price") if units else 0)
-        btc = safe_float(status.get("btc_balance"))
-        avg = safe_float(status.get("btc_avg_buy_price"))
+        price, btc, avg = _position(get_current_status())
 
         if btc <= 0 or avg <= 0 or price <= 0:
             logger.info("No position to monitor")
@@ -210,44 +314,105 @@ def quick_risk_check():
         risk_decision = check_position_risk(price, avg, momentum)
         if risk_decision:
             logger.warning(f"Risk triggered: {risk_decision['reason']}")
-            execute_sell(risk_decision["percentage"])
-            save_decision_to_db(risk_decision, current_status)
+            execute_risk_exit(risk_decision, momentum)
     except Exception as e:
         logger.error(f"Risk check error: {e}")
 
 
+def handle_risk_trigger(risk_decision, tick):
+    """Execute a sell fired by the streaming risk monitor."""
+    execute_risk_exit(risk_decision, risk_monitor.momentum if risk_monitor is not None else 0.0)
+
+
+def on_order_fill(order):
+    """Order tracker callback: drop cached balances and reload the risk
+    monitor's position, so a fill from flat is covered at once."""
+    get_account().on_fill(order)
+    if risk_monitor is not None:
+        risk_monitor.request_refresh()
+
+
+def start_risk_monitor():
+    """Start the streaming risk monitor, seeded with recent hourly closes."""
+    global risk_monitor
+    risk_monitor = RiskMonitor(handle_risk_trigger)
+    df_h = pyupbit.get_ohlcv("KRW-BTC", interval="minute60", count=6)
+    if df_h is not None:
+        risk_monitor.seed_closes(df_h)
+    risk_monitor.start()
+    return risk_monitor
+
+
+def run_pending_dca():
+    with execution_lock:
+        check_pending_dca()
+
+
+# ---------------------------------------------------------------------------
+# Scheduling
+# ---------------------------------------------------------------------------
+def build_scheduler():
+    """Register the bot's recurring jobs (risk first, then DCA, then analysis)."""
+    scheduler = Scheduler(shutdown_timeout=config.SCHEDULER_SHUTDOWN_TIMEOUT)
+    timeouts = config.JOB_TIMEOUTS
+    risk_minutes = (config.QUICK_RISK_CHECK_FALLBACK_MINUTES if config.RISK_MONITOR_ENABLED
+                    else config.QUICK_RISK_CHECK_INTERVAL_MINUTES)
+    scheduler.add(Job(
+        "quick_risk_check", quick_risk_check, Every(risk_minutes * 60),
+        priority=PRIORITY_RISK, timeout=timeouts["quick_risk_check"],
+        catch_up="coalesce",
+    ))
+    if config.DCA_ENABLED:
+        scheduler.add(Job(
+            "dca", run_pending_dca, NextDue(next_dca_due),
+            priority=PRIORITY_DCA, timeout=timeouts["dca"], catch_up="coalesce",
+        ))
+    scheduler.add(Job(
+        "full_analysis", make_decision_and_execute, DailyAt(config.FULL_ANALYSIS_SCHEDULE),
+        priority=PRIORITY_ANALYSIS, timeout=timeouts["full_analysis"],
+        catch_up="coalesce", run_at_start=True,
+    ))
+    scheduler.on_stop.append(cancel_inflight)
+    return scheduler
+
+
 # ---------------------------------------------------------------------------
 # Entry point
 # ---------------------------------------------------------------------------
 if __name__ == "__main__":
-    import schedule
-
     setup_logging()
     validate_config()
     _init_modules()
-
-    signal.signal(signal.SIGINT, handle_shutdown)
-    signal.signal(signal.SIGTERM, handle_shutdown)
+    start_renderer()  # before any threads exist
 
     initialize_db()
     migrate_db()
+    import_legacy_dca_state()
+    logger.info(f"Position state: {get_position_state().snapshot()}")
 
-    make_decision_and_execute()
+    order_tracker = OrderTracker(upbit, on_fill=on_order_fill)
+    set_tracker(order_tracker)
+    order_tracker.start()
 
-    for t in config.FULL_ANALYSIS_SCHEDULE:
-        schedule.every().day.at(t).do(make_decision_and_execute)
-
-    schedule.every(config.QUICK_RISK_CHECK_INTERVAL_MINUTES).minutes.do(quick_risk_check)
-
-    if config.DCA_ENABLED:
-        schedule.every(config.DCA_INTERVAL_MINUTES).minutes.do(check_pending_dca)
+    if config.RISK_MONITOR_ENABLED:
+        start_risk_monitor()
+    if config.ORDERBOOK_RECORDER_ENABLED:
+        orderbook_recorder = OrderbookRecorder()
+        orderbook_recorder.start()
 
     logger.info("Bot started - schedules configured")
-    logger.info(f"  Full analysis: {config.FULL_ANALYSIS_SCHEDULE}")
-    logger.info(f"  Risk check: every {config.QUICK_RISK_CHECK_INTERVAL_MINUTES}min")
-
-    while not shutdown_requested:
-        schedule.run_pending()
-        time.sleep(1)
+    if config.RISK_MONITOR_ENABLED:
+        logger.info("  risk: streaming (every tick)")
+    scheduler = build_scheduler()
+    asyncio.run(scheduler.run())
+
+    logger.info(f"Job stats: {scheduler.stats()}")
+    if risk_monitor is not None:
+        risk_monitor.stop()
+    if orderbook_recorder is not None:
+        orderbook_recorder.stop()
+    order_tracker.stop()
+    shutdown_renderer()
+    close_repositories()
 
     logger.info("Bot shutdown complete")
@@ -2,35 +2,42 @@
 Backtesting engine for gpt-bitcoin trading strategy.
 
 Replays historical OHLCV data through the risk pipeline using a rule-based
-strategy (no GPT calls).  Shares utility functions with autotrade_v3.py.
+strategy (no GPT calls).  Exits, sizing and order checks come from the same
+kernel as the live policy (trading/risk.py).  Shares utility functions with autotrade_v3.py.
 
 Usage:
     python3 backtest.py                        # default 180 days, 10M KRW
     python3 backtest.py --days 90 --capital 5000000
+    python3 backtest.py --vectorized           # precomputed-column engine
+    python3 backtest.py --offline              # candles from local store only
+    python3 backtest.py --days 720 --walk-forward --train-days 180 --test-days 30
+    python3 backtest.py --llm-source stub      # production decision path (llm_backtest.py)
+    python3 backtest.py --capital 5000000000 --fill-model synthetic --snapshots orderbooks
 """
 
 import argparse
 from datetime import datetime
 
+import numpy as np
 import pyupbit
 import pandas as pd
 
 import config
 from autotrade_v3 import (
     safe_float,
-    clamp_percentage,
     add_indicators,
-    apply_tiered_take_profit,
-    apply_volatility_adjustment,
-    apply_regime_adjustment,
 )
+from trading import risk
+from trading.candles import CandleStore, interval_step
+from trading.fills import make_fill_simulator
+from trading.transport import install_pyupbit
 
 
 # ---------------------------------------------------------------------------
 # Data
 # ---------------------------------------------------------------------------
-def fetch_historical_data(days=config.BACKTEST_DAYS):
-    """Fetch daily OHLCV data with paging (pyupbit max 200 per call)."""
+def _fetch_from_exchange(days):
+    """Page daily OHLCV straight from Upbit (pyupbit max 200 per call)."""
     all_data = []
     remaining = days
     to_date = None
@@ -45,10 +52,34 @@ def fetch_historical_data(days=config.BACKTEST_DAYS):
         remaining -= len(df)
 
     if not all_data:
-        raise ValueError("Failed to fetch historical data")
-
+        return None
     combined = pd.concat(all_data).sort_index()
-    combined = combined[~combined.index.duplicated(keep="first")]
+    return combined[~combined.index.duplicated(keep="first")]
+
+
+def fetch_historical_data(days=config.BACKTEST_DAYS, store=None, offline=False):
+    """Fetch daily OHLCV data with indicators.
+
+    When the candle store is enabled only the missing head/tail candles are
+    downloaded; ``offline=True`` serves purely from the store.
+    """
+    if store is None and config.CANDLE_STORE_ENABLED:
+        store = CandleStore()
+
+    if store is not None:
+        if not offline:
+            start = datetime.now() - interval_step("day") * days
+            store.sync("KRW-BTC", "day", start)
+        combined = store.tail("KRW-BTC", "day", days)
+        if combined.empty:
+            combined = None
+    elif offline:
+        raise ValueError("Offline mode requires the candle store")
+    else:
+        combined = _fetch_from_exchange(days)
+
+    if combined is None:
+        raise ValueError("Failed to fetch historical data")
     return add_indicators(combined)
 
 
@@ -105,8 +136,10 @@ def rule_based_strategy(row, prev_row, position_held):
 # Simulation engine
 # ---------------------------------------------------------------------------
 class BacktestEngine:
-    def __init__(self, df, initial_krw, initial_btc=0.0):
+    def __init__(self, df, initial_krw, initial_btc=0.0, fill_model=None, risk_params=None):
         self.df = df
+        self.fill_model = fill_model  # trading.fills.FillSimulator; None = fill at close
+        self.risk_params = risk_params  # trading.risk.RiskParams; None = config at run()
         self.krw = initial_krw
         self.btc = initial_btc
         self.avg_buy_price = 0.0
@@ -115,7 +148,11 @@ class BacktestEngine:
         self.portfolio_history = []
         self.last_trade_idx = -999
 
+    def _params(self):
+        return self.risk_params or risk.RiskParams.from_config()
+
     def run(self):
+        params = self._params()
         # Start after warmup period for indicators
         start = min(26, len(self.df) - 1)
         for i in range(start, len(self.df)):
@@ -132,7 +169,7 @@ class BacktestEngine:
 
             market_ctx = self._build_context(i)
             decision = rule_based_strategy(row, prev_row, self.btc > 0)
-            decision = self._apply_risk(decision, price, market_ctx, i)
+            decision = self._apply_risk(decision, price, market_ctx, i, params)
 
             if decision["decision"] == "buy" and decision["percentage"] > 0:
                 self._execute_buy(price, decision["percentage"], timestamp, decision["reason"])
@@ -173,90 +210,67 @@ class BacktestEngine:
             "adx": adx,
         }
 
-    def _apply_risk(self, decision, price, ctx, idx):
-        dv = decision["decision"]
-        pct = decision["percentage"]
-        reason = decision["reason"]
+    def _apply_risk(self, decision, price, ctx, idx, params=None):
+        """The shared risk kernel (``trading.risk``) for one bar."""
+        params = params or self._params()
 
         # Cooldown (1 bar minimum)
         if idx - self.last_trade_idx < 1:
             return {"decision": "hold", "percentage": 0, "reason": "Cooldown"}
 
-        # Stop-loss
-        if self.btc > 0 and self.avg_buy_price > 0:
-            pnl = (price - self.avg_buy_price) / self.avg_buy_price
-
-            if pnl <= -config.STOP_LOSS_PCT:
-                return {
-                    "decision": "sell", "percentage": config.STOP_LOSS_SELL_PCT,
-                    "reason": f"Stop-loss at {pnl:.2%}",
-                }
-
-            # Trailing stop
-            if config.TRAILING_STOP_ENABLED and price > self.avg_buy_price:
-                self.high_watermark = max(self.high_watermark, price)
-                if self.high_watermark > 0:
-                    dd = (self.high_watermark - price) / self.high_watermark
-                    if dd >= config.TRAILING_STOP_PCT:
-                        return {
-                            "decision": "sell",
-                            "percentage": config.TRAILING_STOP_SELL_PCT,
-                            "reason": f"Trailing stop {dd:.2%} from {self.high_watermark:,.0f}",
-                        }
-
-            # Tiered take-profit
-            tp = apply_tiered_take_profit(pnl, ctx.get("momentum", 0))
-            if tp:
-                return tp
-
-        # Filters
-        if dv in {"buy", "sell"}:
-            trend = ctx.get("trend", "flat")
-            rsi = safe_float(ctx.get("rsi"))
-            momentum = safe_float(ctx.get("momentum"))
-
-            if dv == "buy":
-                if trend == "down":
-                    pct *= 0.5
-                if rsi >= 70:
-                    pct *= 0.4
-                if momentum < 0:
-                    pct *= 0.7
-            else:
-                if trend == "up":
-                    pct *= 0.6
-                if rsi <= 30:
-                    pct *= 0.5
-                if momentum > 0:
-                    pct *= 0.8
-
-            pct = apply_volatility_adjustment(pct, ctx)
-            pct = apply_regime_adjustment(dv, pct, ctx)
-            max_pct = config.MAX_BUY_PERCENT if dv == "buy" else config.MAX_SELL_PERCENT
-            pct = clamp_percentage(pct, 0, max_pct)
-
-            # Apply minimum buy percentage floor
-            if dv == "buy" and 0 < pct < config.MIN_BUY_PCT_FLOOR:
-                pct = config.MIN_BUY_PCT_FLOOR
-
-        # Min order
-        if dv == "buy" and self.krw * (pct / 100) < config.MIN_ORDER_AMOUNT:
-            return {"decision": "hold", "percentage": 0, "reason": "Below min order"}
-        if dv == "sell" and self.btc <= 0:
-            return {"decision": "hold", "percentage": 0, "reason": "No BTC"}
-
-        decision["percentage"] = pct
-        decision["reason"] = reason
+        result = risk.evaluate(
+            [risk.ACTION_CODES[decision["decision"]]], [decision["percentage"]],
+            [price], [self.avg_buy_price], [self.btc], [self.krw], [self.high_watermark],
+            [safe_float(ctx.get("momentum"))], [safe_float(ctx.get("atr"))],
+            [ctx.get("trend", "flat")], [safe_float(ctx.get("rsi"))],
+            [ctx.get("volatility", 0.0)], [ctx.get("regime", "unknown")], params)
+        if self.btc > 0:
+            self.high_watermark = float(result.exits.high_watermark[0])
+
+        exit_decision = risk.exit_decision(result.exits, 0, price, params)
+        if exit_decision:
+            exit_decision.pop("high_watermark", None)
+            return exit_decision
+        blocked = int(result.blocked[0])
+        if blocked != risk.ORDER_OK:
+            return {"decision": "hold", "percentage": 0,
+                    "reason": "No BTC" if blocked == risk.NO_BTC else "Below min order"}
+
+        decision["percentage"] = float(result.percentage[0])
         return decision
 
+    def _simulate_fill(self, side, amount, price, timestamp):
+        """Run the fill model with the next bar's open as the post-latency price."""
+        i = self.df.index.get_loc(timestamp)
+        next_price = bar_seconds = None
+        if i + 1 < len(self.df):
+            next_price = safe_float(self.df["open"].iloc[i + 1])
+            bar_seconds = (self.df.index[i + 1] - self.df.index[i]).total_seconds()
+        return self.fill_model.fill(side, amount, price, timestamp, next_price, bar_seconds)
+
+    def _fill_details(self, fill):
+        return {"fill_price": fill.avg_price, "slippage_pct": fill.slippage_pct,
+                "partial": fill.partial}
+
     def _execute_buy(self, price, percentage, timestamp, reason):
         amount_krw = self.krw * (percentage / 100)
-        btc_bought = (amount_krw * config.FEE_RATE) / price
+        details = {}
+        if self.fill_model is None:
+            btc_bought = (amount_krw * config.FEE_RATE) / price
+            fill_price = price
+        else:
+            fill = self._simulate_fill("buy", amount_krw, price, timestamp)
+            if fill.qty <= 0:
+                return
+            amount_krw = fill.notional
+            btc_bought = fill.qty * config.FEE_RATE
+            fill_price = fill.avg_price
+            details = self._fill_details(fill)
 
         total_btc = self.btc + btc_bought
         if total_btc > 0:
             self.avg_buy_price = (
-                (self.btc * self.avg_buy_price + btc_bought * price) / total_btc
+                (self.btc * self.avg_buy_price + btc_bought * fill_price) / total_btc
             )
         self.btc = total_btc
         self.krw -= amount_krw
@@ -266,12 +280,21 @@ class BacktestEngine:
         self.trades.append({
             "timestamp": timestamp, "action": "buy", "price": price,
             "percentage": percentage, "amount_krw": amount_krw,
-            "btc_amount": btc_bought, "reason": reason,
+            "btc_amount": btc_bought, "reason": reason, **details,
         })
 
     def _execute_sell(self, price, percentage, timestamp, reason):
         btc_sold = self.btc * (percentage / 100)
-        krw_received = btc_sold * price * config.FEE_RATE
+        details = {}
+        if self.fill_model is None:
+            krw_received = btc_sold * price * config.FEE_RATE
+        else:
+            fill = self._simulate_fill("sell", btc_sold, price, timestamp)
+            if fill.qty <= 0:
+                return
+            btc_sold = fill.qty
+            krw_received = fill.notional * config.FEE_RATE
+            details = self._fill_details(fill)
 
         self.btc -= btc_sold
         self.krw += krw_received
@@ -285,14 +308,220 @@ class BacktestEngine:
         self.trades.append({
             "timestamp": timestamp, "action": "sell", "price": price,
             "percentage": percentage, "krw_received": krw_received,
-            "btc_amount": btc_sold, "reason": reason,
+            "btc_amount": btc_sold, "reason": reason, **details,
         })
 
 
+# ---------------------------------------------------------------------------
+# Vectorized simulation engine
+# ---------------------------------------------------------------------------
+def _column(df, name):
+    """Return a column as a float array, or zeros when the column is missing."""
+    if name in df.columns:
+        return df[name].to_numpy(dtype=float)
+    return np.zeros(len(df))
+
+
+def precompute_context(df):
+    """Compute the per-bar market context columns of ``_build_context`` at once.
+
+    Returns a dict of NumPy arrays (momentum, volatility, trend, rsi, atr,
+    regime, adx) aligned with ``df`` and bit-identical to what
+    ``BacktestEngine._build_context`` produces bar by bar.
+    """
+    n = len(df)
+    close = df["close"].to_numpy(dtype=float)
+    idx = np.arange(n)
+
+    # Momentum over the last 6 bars (or fewer at the start of the series)
+    momentum = close / close[np.maximum(idx - 5, 0)] - 1
+    if n:
+        momentum[0] = 0.0
+
+    # Rolling std of returns over the 24-bar close window.  Mirrors pandas'
+    # two-pass nanvar on the sliced pct_change() (leading NaN zero-filled) so
+    # results are bit-identical to the per-bar computation.
+    returns = np.full(n, np.nan)
+    if n > 1:
+        returns[1:] = close[1:] / close[:-1] - 1
+    volatility = np.full(n, np.nan)
+    if n > 23:
+        windows = np.lib.stride_tricks.sliding_window_view(returns, 24)
+        mask = np.isnan(windows)
+        mask[:, 0] = True
+        values = np.where(mask, 0.0, windows)
+        count = (~mask).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg = values.sum(axis=1) / count
+            sqr = np.where(mask, 0.0, (avg[:, None] - values) ** 2)
+            var = sqr.sum(axis=1) / (count - 1)
+        volatility[23:] = np.where(count > 1, np.sqrt(var), np.nan)
+    for i in range(min(n, 23)):
+        window = df["close"].iloc[max(0, i - 23):i + 1].pct_change()
+        volatility[i] = window.std() if len(window) > 1 else 0
+
+    ema = _column(df, "EMA_10")
+    sma = _column(df, "SMA_10")
+    trend = np.where(ema > sma, "up", np.where(ema < sma, "down", "flat"))
+
+    adx = _column(df, f"ADX_{config.ADX_LENGTH}")
+    dmp = _column(df, f"DMP_{config.ADX_LENGTH}")
+    dmn = _column(df, f"DMN_{config.ADX_LENGTH}")
+    regime = np.where(
+        adx < config.ADX_TRENDING_THRESHOLD, "ranging",
+        np.where((dmp > dmn) & (ema >= sma), "trending_up",
+                 np.where((dmn > dmp) & (ema <= sma), "trending_down", "ranging")),
+    )
+
+    return {
+        "trend": trend,
+        "rsi": _column(df, "RSI_14"),
+        "volatility": volatility,
+        "momentum": momentum,
+        "atr": _column(df, "ATR_14"),
+        "regime": regime,
+        "adx": adx,
+    }
+
+
+def precompute_signals(df):
+    """Evaluate ``rule_based_strategy`` for every bar at once.
+
+    Returns ``(buy_pct, sell_pct, flags)``: the buy percentage proposed when
+    flat, the sell percentage proposed when holding (0 means hold), and the
+    arrays needed to rebuild the reason string of a fired signal.
+    """
+    rsi = _column(df, "RSI_14")
+    macd = _column(df, "MACD")
+    sig = _column(df, "Signal_Line")
+    close = df["close"].to_numpy(dtype=float)
+    lower_bb = _column(df, "Lower_Band")
+    upper_bb = _column(df, "Upper_Band")
+    # iloc[i - 1] semantics: bar 0 looks at the last bar
+    prev_macd = np.roll(macd, 1)
+    prev_sig = np.roll(sig, 1)
+
+    macd_cross_up = (prev_macd <= prev_sig) & (macd > sig)
+    macd_cross_down = (prev_macd >= prev_sig) & (macd < sig)
+    near_lower = (lower_bb > 0) & (close <= lower_bb * 1.02)
+    near_upper = (upper_bb > 0) & (close >= upper_bb * 0.98)
+
+    strong_buy = (rsi < 35) & macd_cross_up
+    moderate_buy = (rsi < 45) & (macd > sig) & near_lower
+    buy_pct = np.where(strong_buy, np.where(near_lower, 40, 25),
+                       np.where(moderate_buy, 20, 0))
+
+    strong_sell = (rsi > 70) & macd_cross_down
+    sell_pct = np.where(strong_sell, np.where(near_upper, 50, 30), 0)
+
+    return buy_pct, sell_pct, {
+        "rsi": rsi, "strong_buy": strong_buy,
+        "near_lower": near_lower, "near_upper": near_upper,
+    }
+
+
+def _signal_reason(flags, i, action):
+    """Rebuild the ``rule_based_strategy`` reason string for bar ``i``."""
+    rsi = flags["rsi"][i]
+    if action == "sell":
+        return f"RSI={rsi:.0f}, MACD cross down, BB={'near' if flags['near_upper'][i] else 'mid'}"
+    if flags["strong_buy"][i]:
+        return f"RSI={rsi:.0f}, MACD cross up, BB={'near' if flags['near_lower'][i] else 'mid'}"
+    return f"Moderate buy RSI={rsi:.0f}, near lower BB"
+
+
+class VectorizedBacktestEngine(BacktestEngine):
+    """Drop-in replacement for ``BacktestEngine`` with precomputed columns.
+
+    Context, strategy signals and their risk sizing are computed for the
+    whole frame up front.  The position state machine then jumps from trade
+    to trade: while the position is unchanged, the risk kernel evaluates
+    every remaining bar in one call and the first exit or executable signal
+    becomes the next trade.  Trades, portfolio history and metrics match
+    ``BacktestEngine.run``.
+    """
+
+    MIN_WINDOW = 32  # bars evaluated per kernel call after a trade (doubles while quiet)
+
+    def _running_peak(self, price, params):
+        """High watermark before each bar of ``price`` while the position is held."""
+        hw = self.high_watermark
+        if not params.trailing_stop or self.avg_buy_price <= 0:
+            return np.full(len(price), hw)
+        tracked = np.where(price > self.avg_buy_price, price, hw)
+        peaks = np.maximum.accumulate(np.maximum(tracked, hw))
+        return np.concatenate(([hw], peaks[:-1]))
+
+    def run(self):
+        n = len(self.df)
+        if n == 0:
+            return
+        params = self._params()
+        ctx = precompute_context(self.df)
+        buy_sig, sell_sig, flags = precompute_signals(self.df)
+        market = (ctx["trend"], ctx["rsi"], ctx["momentum"], ctx["volatility"], ctx["regime"])
+        buy_pct = risk.size_orders(risk.BUY, buy_sig, *market, params).percentage
+        sell_pct = risk.size_orders(risk.SELL, sell_sig, *market, params).percentage
+
+        close = np.array([safe_float(p) for p in self.df["close"].tolist()])
+        index = list(self.df.index)
+        start = min(26, n - 1)
+        history = []
+
+        i, window = start, self.MIN_WINDOW
+        while i < n:
+            end = min(n, i + window)
+            price = close[i:end]
+            krw, btc = self.krw, self.btc
+            exits = None
+            if btc > 0:
+                exits = risk.position_exits(
+                    price, self.avg_buy_price, btc, self._running_peak(price, params),
+                    ctx["momentum"][i:end], ctx["atr"][i:end], params)
+                action = np.where(sell_sig[i:end] > 0, risk.SELL, risk.HOLD)
+                pct = sell_pct[i:end]
+            else:
+                action = np.where(buy_sig[i:end] > 0, risk.BUY, risk.HOLD)
+                pct = buy_pct[i:end]
+            fire = (action != risk.HOLD) & (
+                risk.order_checks(action, pct, price, btc, krw, params) == risk.ORDER_OK)
+            if exits is not None:
+                fire |= exits.rule != risk.EXIT_NONE
+            k = int(np.argmax(fire)) if fire.any() else len(price) - 1
+
+            seg = price[:k + 1]
+            history.extend(zip(index[i:i + k + 1], (krw + btc * seg).tolist(),
+                               seg.tolist(), [btc] * len(seg), [krw] * len(seg)))
+            if exits is not None:
+                self.high_watermark = float(exits.high_watermark[k])
+            if not fire[k]:
+                i, window = end, window * 2  # quiet stretch: look further ahead
+                continue
+
+            j = i + k
+            exit_decision = exits is not None and risk.exit_decision(exits, k, close[j], params)
+            if exit_decision:
+                if exit_decision["percentage"] > 0:
+                    self._execute_sell(close[j], exit_decision["percentage"], index[j],
+                                       exit_decision["reason"])
+            elif action[k] == risk.SELL:
+                self._execute_sell(close[j], float(pct[k]), index[j],
+                                   _signal_reason(flags, j, "sell"))
+            else:
+                self._execute_buy(close[j], float(pct[k]), index[j],
+                                  _signal_reason(flags, j, "buy"))
+            i, window = j + 1, self.MIN_WINDOW
+
+        self.portfolio_history = [
+            {"timestamp": t, "value": value, "price": p, "btc": btc, "krw": krw}
+            for t, value, p, btc, krw in history
+        ]
+
+
 # ---------------------------------------------------------------------------
 # Metrics
 # ---------------------------------------------------------------------------
-def compute_metrics(engine):
+def compute_metrics(engine, periods_per_year=365):
     history = engine.portfolio_history
     if not history:
         return {}
@@ -317,10 +546,10 @@ def compute_metrics(engine):
     wins = sum(1 for t in sells if "stop-loss" not in t.get("reason", "").lower())
     win_rate = wins / len(sells) if sells else 0
 
-    # Sharpe ratio (daily returns, annualized)
+    # Sharpe ratio (per-bar returns, annualized)
     daily_returns = pd.Series(values).pct_change().dropna()
     if len(daily_returns) > 1 and daily_returns.std() > 0:
-        sharpe = (daily_returns.mean() / daily_returns.std()) * (365 ** 0.5)
+        sharpe = (daily_returns.mean() / daily_returns.std()) * (periods_per_year ** 0.5)
     else:
         sharpe = 0
 
@@ -334,6 +563,22 @@ def compute_metrics(engine):
         "total_buys": len([t for t in engine.trades if t["action"] == "buy"]),
         "total_sells": len(sells),
         "win_rate": win_rate,
+        **_fill_metrics(engine.trades),
+    }
+
+
+def _fill_metrics(trades):
+    """Slippage summary for trades filled by a fill model (empty otherwise)."""
+    filled = [t for t in trades if "slippage_pct" in t]
+    if not filled:
+        return {}
+    notional = [t.get("amount_krw", t.get("krw_received", 0.0)) for t in filled]
+    total = sum(notional)
+    return {
+        "avg_slippage": (sum(t["slippage_pct"] * n for t, n in zip(filled, notional)) / total
+                         if total > 0 else 0.0),
+        "slippage_cost": sum(t["slippage_pct"] * n for t, n in zip(filled, notional)),
+        "partial_fills": sum(1 for t in filled if t["partial"]),
     }
 
 
@@ -353,6 +598,10 @@ def print_results(metrics, trades):
     print(f"    Buys:           {metrics['total_buys']:>15d}")
     print(f"    Sells:          {metrics['total_sells']:>15d}")
     print(f"  Win Rate:         {metrics['win_rate']:>14.2%}")
+    if "avg_slippage" in metrics:
+        print(f"  Avg Slippage:     {metrics['avg_slippage']:>14.3%}")
+        print(f"  Slippage Cost:    {metrics['slippage_cost']:>15,.0f} KRW")
+        print(f"  Partial Fills:    {metrics['partial_fills']:>15d}")
     print("=" * 60)
 
     if trades:
@@ -375,14 +624,84 @@ if __name__ == "__main__":
                         help="Days of history to fetch")
     parser.add_argument("--capital", type=float, default=config.BACKTEST_INITIAL_KRW,
                         help="Starting capital in KRW")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="Use the precomputed-column engine (same results, faster)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Serve candles from the local store without syncing")
+    parser.add_argument("--walk-forward", action="store_true",
+                        help="Optimize on rolling train windows, evaluate out-of-sample")
+    parser.add_argument("--train-days", type=int, default=config.WALK_FORWARD_TRAIN_DAYS,
+                        help="Walk-forward train window length")
+    parser.add_argument("--test-days", type=int, default=config.WALK_FORWARD_TEST_DAYS,
+                        help="Walk-forward test window length")
+    parser.add_argument("--grid", default=None,
+                        help="JSON parameter grid for walk-forward (default: config)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for walk-forward windows")
+    parser.add_argument("--llm-source", choices=["stub", "recorded", "cache"], default=None,
+                        help="Backtest the GPT decision path with this decision source")
+    parser.add_argument("--db", default=None,
+                        help="Decisions DB for --llm-source recorded")
+    parser.add_argument("--llm-cache", default=None,
+                        help="LLM cache directory for --llm-source cache")
+    parser.add_argument("--fill-model", choices=["close", "synthetic", "recorded"],
+                        default=config.FILL_MODEL,
+                        help="Fill at the close, or walk a synthetic/recorded orderbook")
+    parser.add_argument("--snapshots", default=config.FILL_SNAPSHOTS_PATH,
+                        help="Orderbook store directory or JSONL file for the recorded or calibrated synthetic model")
+    parser.add_argument("--latency", type=float, default=None,
+                        help="Signal-to-fill delay in seconds (default: FILL_LATENCY_SECONDS)")
     args = parser.parse_args()
 
+    install_pyupbit()
+    fill_model = make_fill_simulator(args.fill_model, args.snapshots, args.latency)
+    if args.llm_source:
+        import time
+        import llm_backtest
+
+        print(f"Loading {args.days} days of daily and hourly candles...")
+        daily, hourly = llm_backtest.load_history(args.days, offline=args.offline)
+        source = llm_backtest.make_source(args.llm_source, args.db, args.llm_cache)
+        engine = llm_backtest.LLMBacktestEngine(daily, hourly, source, args.capital,
+                                                args.workers, fill_model=fill_model)
+        print(f"Running {len(engine.times)} analysis cycles ({args.llm_source})...\n")
+        started = time.perf_counter()
+        engine.run()
+        print(f"  {len(engine.times)} cycles in {time.perf_counter() - started:.1f}s\n")
+        print_results(compute_metrics(engine, engine.periods_per_year), engine.trades)
+        raise SystemExit(0)
+
     print(f"Fetching {args.days} days of historical data...")
-    df = fetch_historical_data(args.days)
-    print(f"Running backtest on {len(df)} candles...\n")
+    df = fetch_historical_data(args.days, offline=args.offline)
+
+    if args.walk_forward:
+        import json
+        import sweep
+
+        grid = config.WALK_FORWARD_GRID
+        if args.grid:
+            with open(args.grid, "r") as f:
+                grid = json.load(f)
+        combos = sweep.expand_grid(grid)
+        print(f"Walk-forward on {len(df)} candles: train={args.train_days} "
+              f"test={args.test_days}, {len(combos)} combinations per window...\n")
+        wf = sweep.walk_forward(df, combos, args.train_days, args.test_days,
+                                args.capital, args.workers,
+                                "vectorized" if args.vectorized else "loop",
+                                fill_model=fill_model)
+        for w in wf["windows"]:
+            print(f"  {w['test_start']:%Y-%m-%d} → {w['test_end']:%Y-%m-%d}  "
+                  f"OOS return {w['test_metrics'].get('total_return', 0):>7.2%}  "
+                  f"params {w['params']}")
+        print()
+        if wf["metrics"]:
+            print_results(wf["metrics"], wf["trades"])
+    else:
+        print(f"Running backtest on {len(df)} candles...\n")
 
-    engine = BacktestEngine(df, args.capital)
-    engine.run()
+        engine_cls = VectorizedBacktestEngine if args.vectorized else BacktestEngine
+        engine = engine_cls(df, args.capital, fill_model=fill_model)
+        engine.run()
 
-    metrics = compute_metrics(engine)
-    print_results(metrics, engine.trades)
+        metrics = compute_metrics(engine)
+        print_results(metrics, engine.trades)
@@ -37,14 +37,107 @@ RSI_OVERSOLD_BOOST = 1.5  # 50% larger position on deep oversold
 # Orderbook depth analysis
 MAX_SLIPPAGE_PCT = 0.005  # 0.5% 이상 슬리피지 시 포지션 축소
 
+# Account state cache (trading/account.py): balances from one get_balances call
+ACCOUNT_CACHE_TTL_SECONDS = 60  # order placement and observed fills update it sooner
+
+# Order tracking (trading/orders.py): fills confirmed in the background
+ORDER_POLL_INTERVAL_SECONDS = 2
+ORDER_TRACK_TIMEOUT_SECONDS = 10 * 60  # give up and mark the order "timeout"
+
+# Sliced execution (trading/execution.py): TWAP children capped by live depth
+SLICING_ENABLED = True
+SLICE_MIN_ORDER_KRW = 20_000_000  # smaller orders go out as one market order
+SLICE_WINDOW_SECONDS = 120        # children spread evenly over this window
+SLICE_MAX_CHILDREN = 8
+SLICE_CHILD_SLIPPAGE_PCT = 0.0005  # each child takes at most the depth within this of the touch
+SLICE_SLIPPAGE_BUDGET_PCT = 0.003  # max average-price drift from the arrival price
+
 # API timeouts
 API_TIMEOUT = 10  # API 호출 타임아웃 (초)
 
+# Shared HTTP transport (trading/transport.py)
+TRANSPORT_POOL_SIZE = 10          # keep-alive connections per host
+TRANSPORT_MAX_RETRIES = 3         # GET only — orders are never retried
+TRANSPORT_BACKOFF_BASE = 0.5      # seconds, doubled per attempt (full jitter)
+TRANSPORT_BACKOFF_MAX = 8
+TRANSPORT_CIRCUIT_FAILURES = 5    # consecutive failures before opening
+TRANSPORT_CIRCUIT_COOLDOWN = 30   # seconds before a half-open retry
+TRANSPORT_RATE_LIMITS = {         # group: (requests/sec, burst)
+    "upbit_quotation": (10, 10),
+    "upbit_exchange": (30, 30),
+    "upbit_order": (8, 8),
+    "news": (1, 2),
+    "fear_greed": (1, 2),
+    "default": (5, 5),
+}
+
+# Per-source deadlines for the concurrent input-gathering stage (seconds)
+GATHER_TIMEOUTS = {
+    "news": 10,
+    "market": 15,
+    "last_decisions": 5,
+    "fear_greed": 10,
+    "status": 10,
+    "chart": 30,
+}
+
+# Response cache for slow-changing external feeds (trading/cache.py)
+FEED_CACHE_TTLS = {               # source: seconds an entry is fresh
+    "news": 15 * 60,
+    "fear_greed": 60 * 60,        # index updates once a day
+}
+FEED_CACHE_MAX_STALE = {          # source: extra seconds a stale entry is served
+    "news": 6 * 60 * 60,          # while a background refresh runs
+    "fear_greed": 24 * 60 * 60,
+}
+FEED_CACHE_MAX_ENTRIES = 64
+FEED_CACHE_PATH = "feed_cache.json"  # None disables persistence
+
 # Chart settings
 SCREENSHOT_PATH = "./chart.png"
+CHART_PRESET = "standard"
+CHART_PRESETS = {                 # image sent to the LLM (trading/charts.py)
+    "full": {"figscale": 1.2, "dpi": 100, "format": "png", "detail": "high"},
+    "standard": {"figscale": 1.0, "dpi": 80, "format": "jpeg", "quality": 80, "detail": "high"},
+    "compact": {"figscale": 0.8, "dpi": 64, "format": "jpeg", "quality": 70, "detail": "low"},
+}
+CHART_CACHE_SIZE = 8              # rendered images kept, keyed by data hash
 
 # OpenAI settings
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5-mini")
+GPT_ASYNC_ENABLED = True          # streamed async path (TTFB, deadline, hedging)
+GPT_DEADLINE_SECONDS = 90         # hard cap per analysis call, hedges included
+GPT_HEDGE_ENABLED = True
+GPT_HEDGE_MODEL = os.getenv("OPENAI_HEDGE_MODEL", "")  # empty = same model
+GPT_HEDGE_PERCENTILE = 90         # hedge once the primary is slower than p90
+GPT_HEDGE_DELAY_SECONDS = 30      # used until enough latency samples exist
+GPT_HEDGE_MIN_SAMPLES = 10
+GPT_LATENCY_WINDOW = 100
+
+# Prompt compaction (trading/prompt.py)
+PROMPT_COMPACT = True             # False = legacy verbose payloads
+PROMPT_TOKEN_BUDGET = 12_000      # text sections only; the chart image is extra
+PROMPT_ROWS = {"daily": 14, "hourly": 24}  # last N candles per timeframe
+# "value" and STOCHh (= k - d) are derivable, so dropped; "{adx}" is ADX_LENGTH
+PROMPT_COLUMNS = [
+    "open", "high", "low", "close", "volume",
+    "SMA_10", "EMA_10", "RSI_14", "STOCHk_14_3_3", "STOCHd_14_3_3",
+    "MACD", "Signal_Line", "MACD_Histogram",
+    "Middle_Band", "Upper_Band", "Lower_Band",
+    "ATR_14", "VWAP", "ADX_{adx}", "DMP_{adx}", "DMN_{adx}",
+]
+PROMPT_PRECISION = {              # decimals per field; KRW prices as integers
+    "default": 0, "volume": 3, "btc_balance": 8, "percentage": 1,
+    "RSI_14": 1, "STOCHk_14_3_3": 1, "STOCHd_14_3_3": 1,
+    "ADX_{adx}": 1, "DMP_{adx}": 1, "DMN_{adx}": 1,
+}
+PROMPT_MAX_TEXT = 160             # chars kept from free-text fields (past reasons)
+PROMPT_ORDERBOOK_DEPTH = 5
+
+# LLM response cache (trading/llm_cache.py); replay.py re-runs recorded cycles.
+# Recording is opt-in: the cache is never pruned and grows with every cycle.
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off")  # off | record | replay
+LLM_CACHE_DIR = "llm_cache"
 
 # Database settings
 DB_PATH = 'trading_decisions.sqlite'
@@ -55,7 +148,30 @@ FULL_ANALYSIS_SCHEDULE = [
     "00:01", "02:01", "04:01", "06:01", "08:01", "10:01",
     "12:01", "14:01", "16:01", "18:01", "20:01", "22:01",
 ]
-QUICK_RISK_CHECK_INTERVAL_MINUTES = 30
+QUICK_RISK_CHECK_INTERVAL_MINUTES = 30  # polling risk check when the risk monitor is off
+QUICK_RISK_CHECK_FALLBACK_MINUTES = 5   # with the monitor on; only runs while its feed is stale
+JOB_TIMEOUTS = {                  # seconds before a run is reported as overdue
+    "full_analysis": 10 * 60,
+    "quick_risk_check": 2 * 60,
+    "dca": 2 * 60,
+}
+SCHEDULER_SHUTDOWN_TIMEOUT = 60   # seconds to wait for running jobs on SIGINT/SIGTERM
+
+# Streaming risk monitor (trading/risk_monitor.py)
+RISK_MONITOR_ENABLED = True
+RISK_MONITOR_MARKET = "KRW-BTC"
+RISK_MONITOR_POSITION_REFRESH_SECONDS = 30 * 60  # also refreshed after every trade
+RISK_MONITOR_RECONNECT_DELAY = 5
+RISK_MONITOR_COOLDOWN_SECONDS = 5 * 60  # quiet period after a trigger
+RISK_MONITOR_STALE_SECONDS = 60  # no tick for this long = feed down, polling takes over
+
+# Orderbook snapshot recorder (trading/orderbook_store.py)
+ORDERBOOK_RECORDER_ENABLED = True
+ORDERBOOK_RECORD_MARKET = "KRW-BTC"
+ORDERBOOK_RECORD_INTERVAL_SECONDS = 10
+ORDERBOOK_RECORD_DEPTH = 15       # levels per side (Upbit returns 15)
+ORDERBOOK_STORE_DIR = "orderbooks"
+ORDERBOOK_RETENTION_DAYS = 180    # day partitions older than this are pruned; 0 keeps all
 
 # Retry settings
 MAX_RETRIES = 5
@@ -87,11 +203,37 @@ REGIME_COUNTER_TREND_SIZE_MULT = 0.3  # 역추세 매매: 70% 축소
 DCA_ENABLED = True
 DCA_SPLITS = 3              # 매수를 3회로 분할
 DCA_INTERVAL_MINUTES = 60   # 분할 간격 (분)
-DCA_STATE_FILE = "dca_state.json"
+DCA_MAX_ACTIVE_PLANS = 1    # 동시에 진행 가능한 분할 매수 계획 수
+DCA_STATE_FILE = "dca_state.json"  # legacy state, imported into the DB once
 
 # Backtesting
 BACKTEST_DAYS = 180
 BACKTEST_INITIAL_KRW = 10_000_000
+LLM_BACKTEST_DECISION_THREADS = 8  # concurrent decision-source calls (llm_backtest.py)
+
+# Backtest fill simulation (trading/fills.py)
+FILL_MODEL = "close"        # close (full fill at bar close) | synthetic | recorded
+FILL_LATENCY_SECONDS = 1.0  # signal-to-fill delay
+FILL_SNAPSHOTS_PATH = None  # orderbook store dir or JSONL for "recorded" / calibrating "synthetic"
+FILL_SYNTHETIC_DEPTH = {    # used when no snapshots are given
+    "spread_bps": 1.0,
+    "level_step_bps": 1.0,
+    "level_krw": 30_000_000,
+    "levels": 15,
+}
+
+# Walk-forward optimization (backtest.py --walk-forward)
+WALK_FORWARD_TRAIN_DAYS = 90
+WALK_FORWARD_TEST_DAYS = 30
+WALK_FORWARD_GRID = {
+    "STOP_LOSS_PCT": [0.03, 0.05, 0.08],
+    "TRAILING_STOP_PCT": [0.02, 0.03, 0.05],
+    "TRAILING_STOP_SELL_PCT": [50, 70, 100],
+}
+
+# Local candle store (incremental OHLCV cache for backtests)
+CANDLE_STORE_ENABLED = True
+CANDLE_STORE_DIR = "candles"
 
 # Logging
 LOG_FILE = 'autotrade.log'
@@ -0,0 +1,301 @@
+"""
+GPT-in-the-loop historical backtest.
+
+``backtest.py`` swaps the model for ``rule_based_strategy``; this engine
+instead replays the production cycle.  For every scheduled analysis time
+(``FULL_ANALYSIS_SCHEDULE``) it rebuilds the inputs ``make_decision_and_execute``
+would have seen — the last 30 daily and 24 hourly candles, their indicators,
+the prompt JSON and the market context — asks a pluggable decision source for
+advice, and runs the advice through ``normalize_decision``,
+``apply_risk_policy`` and ``apply_dca`` against a paper account.
+
+Only candles that had closed by the cycle time are used, so there is no
+look-ahead (live cycles also see the forming candle).  Cycle inputs are
+rebuilt across worker processes, and sources that do not need the portfolio
+are queried for all cycles concurrently up front; the portfolio state
+machine then runs sequentially.
+
+Decision sources:
+  recorded — decisions stored in the bot's SQLite DB, matched by time
+  cache    — responses in the LLM cache for recorded cycles, matched by time
+  stub     — a local model callable; defaults to ``rule_based_strategy``
+
+Usage:
+    python3 backtest.py --llm-source stub --days 90
+    python3 backtest.py --llm-source recorded --db trading_decisions.sqlite
+    python3 backtest.py --llm-source cache --llm-cache llm_cache
+"""
+
+import bisect
+import json
+import os
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import config
+from backtest import rule_based_strategy
+from replay import PaperAccount, advance_dca, replay_environment
+from sweep import config_overrides
+from trading.candles import CandleStore, interval_step
+from trading.database import compute_high_watermark, get_position_state
+from trading.dca import apply_dca
+from trading.decision import normalize_decision, apply_risk_policy
+from trading.gpt import analyze_data_with_gpt4
+from trading.llm_cache import ResponseStore, set_store
+from trading.indicators import add_indicators
+from trading.market import DAILY_BARS, HOURLY_BARS, encode_market_data
+from trading.scheduler import DailyAt
+
+MARKET = "KRW-BTC"
+
+Cycle = namedtuple("Cycle", ["timestamp", "price", "data_json", "market_ctx",
+                             "df_daily", "df_hourly"])
+
+
+# ---------------------------------------------------------------------------
+# History and cycle reconstruction
+# ---------------------------------------------------------------------------
+def load_history(days=config.BACKTEST_DAYS, store=None, offline=False):
+    """Daily and hourly candles covering ``days`` plus the indicator warmup."""
+    store = store or CandleStore()
+    start = datetime.now() - interval_step("day") * (days + DAILY_BARS)
+    if not offline:
+        store.sync(MARKET, "day", start)
+        store.sync(MARKET, "minute60", start)
+    daily = store.load(MARKET, "day", start)
+    hourly = store.load(MARKET, "minute60", start)
+    if daily.empty or hourly.empty:
+        raise ValueError("No candles available for the LLM backtest")
+    return daily, hourly
+
+
+def cycle_times(daily, hourly, schedule=None):
+    """Scheduled analysis times with a full daily and hourly window behind them."""
+    trigger = DailyAt(schedule or config.FULL_ANALYSIS_SCHEDULE)
+    day, hour = interval_step("day"), interval_step("minute60")
+    if len(daily) < DAILY_BARS or len(hourly) < HOURLY_BARS:
+        return []
+    first = max(daily.index[DAILY_BARS - 1] + day, hourly.index[HOURLY_BARS - 1] + hour)
+    last = hourly.index[-1] + hour
+    times = []
+    t = trigger.first(first.to_pydatetime() - timedelta(microseconds=1))
+    while t <= last:
+        times.append(t)
+        t = trigger.next_after(t)
+    return times
+
+
+def build_cycle(daily, hourly, t, daily_cache=None):
+    """Rebuild the live cycle inputs at time ``t`` from closed candles only.
+
+    ``daily_cache`` memoizes the daily indicator frame, which only changes
+    once a day while cycles run every couple of hours.
+    """
+    k = daily.index.searchsorted(t - interval_step("day"), side="right")
+    h = hourly.index.searchsorted(t - interval_step("minute60"), side="right")
+    key = daily.index[k - 1]
+    df_daily = daily_cache.get(key) if daily_cache is not None else None
+    if df_daily is None:
+        df_daily = add_indicators(daily.iloc[max(0, k - DAILY_BARS):k])
+        if daily_cache is not None:
+            daily_cache[key] = df_daily
+    df_hourly = add_indicators(hourly.iloc[max(0, h - HOURLY_BARS):h])
+    data_json, market_ctx, df_daily, df_hourly = encode_market_data(df_daily, df_hourly)
+    return Cycle(t, float(df_hourly["close"].iloc[-1]), data_json, market_ctx,
+                 df_daily, df_hourly)
+
+
+_worker_daily = None
+_worker_hourly = None
+_worker_cache = {}
+
+
+def _init_worker(daily, hourly):
+    """Receive the candle frames once per worker process."""
+    global _worker_daily, _worker_hourly
+    _worker_daily, _worker_hourly = daily, hourly
+    _worker_cache.clear()
+
+
+def _build_in_worker(t):
+    return build_cycle(_worker_daily, _worker_hourly, t, _worker_cache)
+
+
+def build_cycles(daily, hourly, times, workers=None):
+    """Rebuild every cycle; fans out over processes (indicators are CPU-bound)."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(times) <= 1:
+        cache = {}
+        return [build_cycle(daily, hourly, t, cache) for t in times]
+    # Contiguous chunks keep each worker's daily cache warm
+    chunksize = max(1, len(times) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(daily, hourly)) as pool:
+        return list(pool.map(_build_in_worker, times, chunksize=chunksize))
+
+
+def synthetic_status(account, price, t):
+    """``get_current_status`` JSON for the paper account at ``price``."""
+    return json.dumps({
+        "current_time": int(t.timestamp() * 1000),
+        "orderbook": {"market": MARKET, "orderbook_units": [
+            {"ask_price": price, "bid_price": price, "ask_size": 1e9, "bid_size": 1e9}]},
+        "btc_balance": account.btc,
+        "krw_balance": account.krw,
+        "btc_avg_buy_price": account.avg_buy_price,
+    })
+
+
+# ---------------------------------------------------------------------------
+# Decision sources: decide(cycle, status=None) -> advice JSON string or None
+# ---------------------------------------------------------------------------
+class StubModelSource:
+    """A local model callable ``model(cycle) -> dict``; defaults to the rule strategy."""
+
+    needs_status = False
+
+    def __init__(self, model=None):
+        self.model = model or self.rule_model
+
+    @staticmethod
+    def rule_model(cycle):
+        row, prev = cycle.df_daily.iloc[-1], cycle.df_daily.iloc[-2]
+        decision = rule_based_strategy(row, prev, position_held=False)
+        if decision["decision"] == "hold":
+            decision = rule_based_strategy(row, prev, position_held=True)
+        return decision
+
+    def decide(self, cycle, status=None):
+        return json.dumps(self.model(cycle))
+
+
+class _TimedSource:
+    """Serves the latest entry at or before each cycle, within ``max_age``."""
+
+    needs_status = False
+
+    def __init__(self, entries, max_age=None):
+        entries = sorted(entries, key=lambda e: e[0])
+        self.times = [t for t, _ in entries]
+        self.advice = [a for _, a in entries]
+        self.max_age = max_age or timedelta(hours=2)
+
+    def decide(self, cycle, status=None):
+        k = bisect.bisect_right(self.times, cycle.timestamp) - 1
+        if k < 0 or cycle.timestamp - self.times[k] >= self.max_age:
+            return None
+        return self.advice[k]
+
+
+class RecordedDecisionSource(_TimedSource):
+    """Decisions the bot actually recorded in its decisions table."""
+
+    def __init__(self, db_path=None, max_age=None):
+        with sqlite3.connect(db_path or config.DB_PATH) as conn:
+            rows = conn.execute(
+                "SELECT timestamp, decision, percentage, reason FROM decisions "
+                "ORDER BY timestamp").fetchall()
+        entries = [(datetime.strptime(ts, "%Y-%m-%d %H:%M:%S"),
+                    json.dumps({"decision": d, "percentage": p, "reason": r}))
+                   for ts, d, p, r in rows]
+        super().__init__(entries, max_age)
+
+
+class CachedLLMSource(_TimedSource):
+    """LLM responses for recorded cycles, served from the response cache."""
+
+    def __init__(self, store, max_age=None):
+        entries = []
+        with config_overrides({"LLM_CACHE_MODE": "replay"}):
+            set_store(store)
+            try:
+                for cycle in store.cycles():
+                    advice = analyze_data_with_gpt4(**cycle["inputs"])
+                    if advice:
+                        entries.append((datetime.fromtimestamp(cycle["recorded_at"]), advice))
+            finally:
+                set_store(None)
+        super().__init__(entries, max_age)
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+class LLMBacktestEngine:
+    """Runs the production decision path over historical cycles.
+
+    Exposes ``trades`` and ``portfolio_history`` like ``BacktestEngine`` so
+    ``compute_metrics`` and ``print_results`` work unchanged.
+    """
+
+    def __init__(self, daily, hourly, source, initial_krw, workers=None, schedule=None,
+                 fill_model=None):
+        self.daily = daily
+        self.hourly = hourly
+        self.source = source
+        self.account = PaperAccount(initial_krw, fill_model=fill_model)
+        self.workers = workers
+        self.times = cycle_times(daily, hourly, schedule)
+        self.trades = self.account.trades
+        self.portfolio_history = []
+        self.decisions = []
+
+    @property
+    def periods_per_year(self):
+        if len(self.times) < 2:
+            return 365
+        span = (self.times[-1] - self.times[0]).total_seconds()
+        return (len(self.times) - 1) * 365 * 86400 / span
+
+    def run(self):
+        cycles = build_cycles(self.daily, self.hourly, self.times, self.workers)
+        if self.source.needs_status:
+            advices = [None] * len(cycles)
+        else:
+            with ThreadPoolExecutor(max_workers=config.LLM_BACKTEST_DECISION_THREADS) as pool:
+                advices = list(pool.map(self.source.decide, cycles))
+
+        account = self.account
+        with replay_environment():
+            position = get_position_state()
+            for cycle, advice in zip(cycles, advices):
+                t, price = cycle.timestamp, cycle.price
+                advance_dca(t, account, price, t)
+                if account.btc > 0 and price > account.avg_buy_price:
+                    position.observe_price(price)
+
+                status = synthetic_status(account, price, t)
+                if self.source.needs_status:
+                    advice = self.source.decide(cycle, status)
+                decision = normalize_decision(advice)
+                decision = apply_risk_policy(decision, status, cycle.market_ctx, t)
+                decision = apply_dca(decision, t)
+                decision.pop("_skip_save", None)
+
+                before = len(account.trades)
+                if decision["decision"] == "buy":
+                    account.buy(decision["percentage"], price, decision["reason"], t)
+                elif decision["decision"] == "sell":
+                    account.sell(decision["percentage"], price, decision["reason"], t)
+                if len(account.trades) > before:
+                    hw = (compute_high_watermark(price, account.avg_buy_price)
+                          if account.btc > 0 else 0.0)
+                    position.record(t, hw)
+
+                self.decisions.append({"timestamp": t, "price": price, **decision})
+                self.portfolio_history.append({
+                    "timestamp": t, "value": account.value(price), "price": price,
+                    "btc": account.btc, "krw": account.krw,
+                })
+
+
+def make_source(name, db_path=None, cache_dir=None):
+    if name == "stub":
+        return StubModelSource()
+    if name == "recorded":
+        return RecordedDecisionSource(db_path)
+    if name == "cache":
+        return CachedLLMSource(ResponseStore(cache_dir or config.LLM_CACHE_DIR))
+    raise ValueError(f"Unknown decision source: {name}")
@@ -0,0 +1,236 @@
+"""
+Offline replay of recorded analysis cycles.
+
+With ``LLM_CACHE_MODE=record`` (off by default), every live analysis cycle
+records its inputs (news, market data, last decisions, Fear & Greed, current
+status, chart) and market context in the LLM cache, and every GPT response
+is stored under a hash of its request.
+This script feeds the recorded cycles back through the live pipeline —
+prompt building, ``analyze_data_with_gpt4`` (served from the cache, never
+calling OpenAI), ``normalize_decision``, ``apply_risk_policy``, ``apply_dca``
+— and executes the results against a paper account.
+
+Decisions see the recorded exchange status, not the paper account, and each
+replayed decision is saved into the replay DB at its cycle's recorded time,
+so the cooldown and the trailing high watermark evolve as they did live.  A
+cache miss means the prompt for that cycle changed (code, config or
+instructions) and is reported.  Pending DCA tranches are filled at the next
+cycle's price once their interval has elapsed between recorded cycles.
+
+What a replay cannot reproduce:
+  - state from before the first recorded cycle (the replay DB starts empty);
+  - peaks the streaming risk monitor saw between cycles, which raised the
+    live high watermark;
+  - sells from ``quick_risk_check``/the risk monitor and executed DCA
+    tranches, which are not recorded as cycles and so neither reset the
+    cooldown nor move the watermark here.
+
+Usage:
+    python3 replay.py                          # replay ./llm_cache
+    python3 replay.py --dir /path/to/llm_cache --capital 5000000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import config
+from sweep import config_overrides
+from trading.utils import safe_float
+from trading.database import (
+    close_repositories, compute_high_watermark, initialize_db, migrate_db, save_decision_to_db,
+)
+from trading.decision import normalize_decision, apply_risk_policy
+from trading.dca import active_dca_plans, apply_dca, claim_tranche, tranche_percentage
+from trading.gpt import analyze_data_with_gpt4
+from trading.llm_cache import ResponseStore, set_store
+
+
+class PaperAccount:
+    """Market-order fills at a given price with the live fee model.
+
+    With a ``fill_model`` (``trading.fills.FillSimulator``) orders walk a
+    simulated book instead and may fill partially.
+    """
+
+    def __init__(self, krw, btc=0.0, fill_model=None):
+        self.krw = krw
+        self.btc = btc
+        self.avg_buy_price = 0.0
+        self.fill_model = fill_model
+        self.trades = []
+
+    def buy(self, percentage, price, reason="", timestamp=None):
+        amount_krw = self.krw * (percentage / 100)
+        if amount_krw < config.MIN_ORDER_AMOUNT or price <= 0:
+            return
+        details = {}
+        fill_price = price
+        if self.fill_model is not None:
+            fill = self.fill_model.fill("buy", amount_krw, price, timestamp)
+            if fill.qty <= 0:
+                return
+            amount_krw, fill_price = fill.notional, fill.avg_price
+            details = {"fill_price": fill.avg_price, "slippage_pct": fill.slippage_pct,
+                       "partial": fill.partial}
+        bought = amount_krw * config.FEE_RATE / fill_price
+        self.avg_buy_price = (self.btc * self.avg_buy_price + bought * fill_price) / (self.btc + bought)
+        self.btc += bought
+        self.krw -= amount_krw
+        self.trades.append({"timestamp": timestamp, "action": "buy", "price": price, "percentage": percentage,
+                            "amount_krw": amount_krw, "btc_amount": bought, "reason": reason, **details})
+
+    def sell(self, percentage, price, reason="", timestamp=None):
+        sold = self.btc * (percentage / 100)
+        if sold * price < config.MIN_ORDER_AMOUNT:
+            return
+        details = {}
+        if self.fill_model is not None:
+            fill = self.fill_model.fill("sell", sold, price, timestamp)
+            if fill.qty <= 0:
+                return
+            sold = fill.qty
+            received = fill.notional * config.FEE_RATE
+            details = {"fill_price": fill.avg_price, "slippage_pct": fill.slippage_pct,
+                       "partial": fill.partial}
+        else:
+            received = sold * price * config.FEE_RATE
+        self.btc -= sold
+        self.krw += received
+        if self.btc <= 0.00000001:
+            self.btc = 0.0
+            self.avg_buy_price = 0.0
+        self.trades.append({"timestamp": timestamp, "action": "sell", "price": price, "percentage": percentage,
+                            "krw_received": received, "btc_amount": sold, "reason": reason, **details})
+
+    def value(self, price):
+        return self.krw + self.btc * price
+
+
+def _status(current_status):
+    try:
+        status = json.loads(current_status)
+    except (TypeError, ValueError):
+        return {}
+    return status if isinstance(status, dict) else {}
+
+
+def _ask_price(current_status):
+    units = _status(current_status).get("orderbook", {}).get("orderbook_units", [])
+    return safe_float(units[0].get("ask_price")) if units else 0.0
+
+
+def advance_dca(now, account, price, timestamp=None):
+    """Fill the DCA tranches that would have run up to ``now`` (simulated time)."""
+    for plan in active_dca_plans():
+        while plan is not None and plan.get("status", "active") == "active" \
+                and plan["next_due"] <= now:
+            plan = claim_tranche(plan, plan["next_due"])  # as if run on schedule
+            if plan is not None:
+                account.buy(tranche_percentage(plan), price,
+                            f"DCA tranche {plan['tranches_done']}/{plan['splits']}", timestamp)
+
+
+@contextmanager
+def replay_environment(store=None):
+    """Throwaway DB with its DCA plans (and replay mode on ``store``), restored afterwards."""
+    with tempfile.TemporaryDirectory() as tmp:
+        overrides = {"DB_PATH": os.path.join(tmp, "replay.sqlite")}
+        if store is not None:
+            overrides["LLM_CACHE_MODE"] = "replay"
+        with config_overrides(overrides):
+            if store is not None:
+                set_store(store)
+            initialize_db()
+            migrate_db()
+            try:
+                yield
+            finally:
+                if store is not None:
+                    set_store(None)
+                close_repositories()
+
+
+def replay_cycles(store, initial_krw=None):
+    """Run every recorded cycle through the pipeline; returns results and summary."""
+    if initial_krw is None:
+        initial_krw = config.BACKTEST_INITIAL_KRW
+    account = PaperAccount(initial_krw)
+    results = []
+    started = time.perf_counter()
+    price = 0.0
+    with replay_environment(store):
+        for cycle in store.cycles():
+            inputs = cycle["inputs"]
+            market_ctx = cycle["context"].get("market_ctx", {})
+            price = _ask_price(inputs["current_status"])
+            now = datetime.fromtimestamp(cycle["recorded_at"])
+            advance_dca(now, account, price)
+
+            misses = store.stats["misses"]
+            advice = analyze_data_with_gpt4(**inputs)
+            decision = normalize_decision(advice)
+            decision = apply_risk_policy(decision, inputs["current_status"], market_ctx, now)
+            decision = apply_dca(decision, now)
+            decision["high_watermark"] = compute_high_watermark(
+                price, safe_float(_status(inputs["current_status"]).get("btc_avg_buy_price")))
+            if not decision.pop("_skip_save", False):
+                save_decision_to_db(decision, inputs["current_status"], now=now)
+            decision.pop("high_watermark")
+
+            if decision["decision"] == "buy":
+                account.buy(decision["percentage"], price, decision["reason"])
+            elif decision["decision"] == "sell":
+                account.sell(decision["percentage"], price, decision["reason"])
+            results.append({"recorded_at": cycle["recorded_at"], "price": price,
+                             "cache_hit": store.stats["misses"] == misses, **decision})
+
+    summary = {
+        "cycles": len(results),
+        "cache_hits": sum(r["cache_hit"] for r in results),
+        "cache_misses": sum(not r["cache_hit"] for r in results),
+        "trades": len(account.trades),
+        "initial_capital": initial_krw,
+        "final_value": account.value(price),
+        "seconds": time.perf_counter() - started,
+    }
+    return results, summary, account
+
+
+def print_results(results, summary):
+    print("=" * 60)
+    print("  REPLAY RESULTS")
+    print("=" * 60)
+    print(f"  Cycles:           {summary['cycles']:>15d}")
+    print(f"  Cache hits:       {summary['cache_hits']:>15d}")
+    print(f"  Cache misses:     {summary['cache_misses']:>15d}")
+    print(f"  Paper trades:     {summary['trades']:>15d}")
+    print(f"  Initial Capital:  {summary['initial_capital']:>15,.0f} KRW")
+    print(f"  Final Value:      {summary['final_value']:>15,.0f} KRW")
+    print(f"  Replay time:      {summary['seconds']:>14.2f}s")
+    print("=" * 60)
+    for r in results:
+        ts = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["recorded_at"]))
+        miss = "" if r["cache_hit"] else "  [miss]"
+        print(f"  {ts}  {r['decision']:>4}  {r['percentage']:>5.1f}%  "
+              f"{r['price']:>13,.0f}  {r['reason'][:30]}{miss}")
+    print()
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded analysis cycles offline")
+    parser.add_argument("--dir", default=config.LLM_CACHE_DIR,
+                        help="LLM cache directory with cycles.jsonl")
+    parser.add_argument("--capital", type=float, default=config.BACKTEST_INITIAL_KRW,
+                        help="Paper account starting KRW")
+    args = parser.parse_args()
+
+    results, summary, _ = replay_cycles(ResponseStore(args.dir), args.capital)
+    print_results(results, summary)
@@ -0,0 +1,298 @@
+"""
+Parallel parameter sweep and walk-forward optimization for the backtester.
+
+Runs the backtest engine once per parameter combination across a process
+pool.  Each run applies its own overrides to the module-level `config`
+values, so combinations never leak into each other, and the
+indicator-enriched DataFrame is shipped to each worker once at start-up
+instead of with every task.
+
+Usage:
+    python3 sweep.py --grid grid.json                  # full grid search
+    python3 sweep.py --grid space.json --random 200    # random search
+    python3 sweep.py --grid grid.json --workers 8 --out results.csv
+
+Grid file: {"STOP_LOSS_PCT": [0.03, 0.05], "TRAILING_STOP_PCT": [0.02, 0.03]}
+In random mode a {"min": a, "max": b} entry is sampled uniformly; lists are
+sampled as choices.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pandas as pd
+
+import config
+from backtest import (
+    BacktestEngine,
+    VectorizedBacktestEngine,
+    compute_metrics,
+    fetch_historical_data,
+)
+
+ENGINES = {"loop": BacktestEngine, "vectorized": VectorizedBacktestEngine}
+
+
+# ---------------------------------------------------------------------------
+# Parameter space
+# ---------------------------------------------------------------------------
+def _validate_params(names):
+    unknown = [n for n in names if not hasattr(config, n)]
+    if unknown:
+        raise ValueError(f"Unknown config parameters: {', '.join(unknown)}")
+
+
+def expand_grid(grid):
+    """Return every combination of a {name: [values]} grid as a list of dicts."""
+    _validate_params(grid)
+    names = list(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(grid[n] for n in names))]
+
+
+def sample_random(space, n, seed=None):
+    """Draw ``n`` combinations from a {name: [choices] | {"min", "max"}} space."""
+    _validate_params(space)
+    rng = random.Random(seed)
+    combos = []
+    for _ in range(n):
+        combo = {}
+        for name, spec in space.items():
+            if isinstance(spec, dict):
+                combo[name] = rng.uniform(spec["min"], spec["max"])
+            else:
+                combo[name] = rng.choice(spec)
+        combos.append(combo)
+    return combos
+
+
+@contextmanager
+def config_overrides(overrides):
+    """Temporarily set attributes on the `config` module."""
+    _validate_params(overrides)
+    saved = {name: getattr(config, name) for name in overrides}
+    try:
+        for name, value in overrides.items():
+            setattr(config, name, value)
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+
+# ---------------------------------------------------------------------------
+# Execution
+# ---------------------------------------------------------------------------
+_worker_df = None
+_worker_fill_model = None
+
+
+def _init_worker(df, fill_model=None):
+    """Receive the shared DataFrame and fill model once per worker process."""
+    global _worker_df, _worker_fill_model
+    _worker_df = df
+    _worker_fill_model = fill_model
+
+
+def run_single(df, params, capital, engine="vectorized", fill_model=None):
+    """Run one backtest with ``params`` applied and return its metrics.
+
+    ``fill_model`` is a ``trading.fills.FillSimulator`` (None fills at close).
+    """
+    with config_overrides(params):
+        bt_engine = ENGINES[engine](df, capital, fill_model=fill_model)
+        bt_engine.run()
+        metrics = compute_metrics(bt_engine)
+    return {"params": params, **metrics}
+
+
+def _run_in_worker(args):
+    params, capital, engine = args
+    return run_single(_worker_df, params, capital, engine, _worker_fill_model)
+
+
+def run_sweep(df, combos, capital=config.BACKTEST_INITIAL_KRW, workers=None,
+              engine="vectorized", rank_by="sharpe_ratio", fill_model=None):
+    """Backtest every combination and return results ranked by ``rank_by``.
+
+    ``workers=1`` runs serially in-process; otherwise runs fan out over a
+    ProcessPoolExecutor.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    tasks = [(params, capital, engine) for params in combos]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(tasks) <= 1:
+        results = [run_single(df, *task, fill_model) for task in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(df, fill_model)) as pool:
+            results = list(pool.map(_run_in_worker, tasks, chunksize=chunksize))
+
+    return sorted(results, key=lambda r: r.get(rank_by, float("-inf")), reverse=True)
+
+
+def results_to_frame(results):
+    """Flatten sweep results into a ranked table (one row per combination)."""
+    rows = []
+    for rank, r in enumerate(results, start=1):
+        row = {"rank": rank}
+        for name, value in r["params"].items():
+            row[name] = json.dumps(value) if isinstance(value, (list, dict)) else value
+        row.update({k: v for k, v in r.items() if k != "params"})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# ---------------------------------------------------------------------------
+# Walk-forward optimization
+# ---------------------------------------------------------------------------
+WARMUP_BARS = 26  # bars the engine skips before trading (see BacktestEngine.run)
+
+
+def walk_forward_windows(n_bars, train_bars, test_bars):
+    """Return rolling ``(train_start, test_start, test_end)`` bar indices.
+
+    Test windows are back to back, so their out-of-sample curves can be
+    stitched into one continuous series.
+    """
+    if train_bars <= WARMUP_BARS:
+        raise ValueError(f"Train window must exceed {WARMUP_BARS} warmup bars")
+    if test_bars <= 0:
+        raise ValueError("Test window must be positive")
+    windows = []
+    start = 0
+    while start + train_bars + test_bars <= n_bars:
+        windows.append((start, start + train_bars, start + train_bars + test_bars))
+        start += test_bars
+    return windows
+
+
+def _window_slice(df, start, end):
+    """Slice ``[start, end)`` with warmup bars so trading begins at ``start``."""
+    return df.iloc[max(0, start - WARMUP_BARS):end]
+
+
+def evaluate_window(df, window, combos, capital, engine="vectorized",
+                    rank_by="sharpe_ratio", fill_model=None):
+    """Optimize on the train window, then run the winner on the test window."""
+    train_start, test_start, test_end = window
+    ranked = run_sweep(_window_slice(df, train_start, test_start), combos,
+                       capital, workers=1, engine=engine, rank_by=rank_by,
+                       fill_model=fill_model)
+    best = ranked[0]
+
+    with config_overrides(best["params"]):
+        bt_engine = ENGINES[engine](_window_slice(df, test_start, test_end), capital,
+                                    fill_model=fill_model)
+        bt_engine.run()
+        test_metrics = compute_metrics(bt_engine)
+
+    return {
+        "train_start": df.index[train_start],
+        "test_start": df.index[test_start],
+        "test_end": df.index[test_end - 1],
+        "params": best["params"],
+        "train_metrics": {k: v for k, v in best.items() if k != "params"},
+        "test_metrics": test_metrics,
+        "portfolio_history": bt_engine.portfolio_history,
+        "trades": bt_engine.trades,
+    }
+
+
+def _evaluate_window_in_worker(args):
+    window, combos, capital, engine, rank_by = args
+    return evaluate_window(_worker_df, window, combos, capital, engine, rank_by,
+                           _worker_fill_model)
+
+
+def stitch_equity(window_results):
+    """Chain the out-of-sample curves, compounding each window's return."""
+    history, trades = [], []
+    scale = 1.0
+    for r in window_results:
+        curve = r["portfolio_history"]
+        if not curve:
+            continue
+        for h in curve:
+            history.append({**h, "value": h["value"] * scale})
+        scale *= curve[-1]["value"] / curve[0]["value"]
+        trades.extend(r["trades"])
+    return SimpleNamespace(portfolio_history=history, trades=trades)
+
+
+def walk_forward(df, combos, train_bars, test_bars, capital=config.BACKTEST_INITIAL_KRW,
+                 workers=None, engine="vectorized", rank_by="sharpe_ratio", fill_model=None):
+    """Run walk-forward optimization; windows are evaluated concurrently.
+
+    ``df`` must already carry indicators (computed once over the full
+    series).  ``fill_model`` is used for both the train sweeps and the test
+    runs.  Returns per-window results plus stitched out-of-sample equity and
+    metrics.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    windows = walk_forward_windows(len(df), train_bars, test_bars)
+    tasks = [(w, combos, capital, engine, rank_by) for w in windows]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(tasks) <= 1:
+        results = [evaluate_window(df, *task, fill_model) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 initializer=_init_worker, initargs=(df, fill_model)) as pool:
+            results = list(pool.map(_evaluate_window_in_worker, tasks))
+
+    stitched = stitch_equity(results)
+    return {
+        "windows": results,
+        "equity": stitched.portfolio_history,
+        "trades": stitched.trades,
+        "metrics": compute_metrics(stitched),
+    }
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parameter sweep for gpt-bitcoin backtests")
+    parser.add_argument("--grid", required=True, help="JSON file with the parameter grid/space")
+    parser.add_argument("--random", type=int, default=0,
+                        help="Sample N random combinations instead of the full grid")
+    parser.add_argument("--seed", type=int, default=None, help="Random search seed")
+    parser.add_argument("--days", type=int, default=config.BACKTEST_DAYS,
+                        help="Days of history to fetch")
+    parser.add_argument("--capital", type=float, default=config.BACKTEST_INITIAL_KRW,
+                        help="Starting capital in KRW")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="vectorized")
+    parser.add_argument("--rank-by", default="sharpe_ratio", help="Metric to rank by")
+    parser.add_argument("--out", default="sweep_results.csv", help="Results CSV path")
+    parser.add_argument("--offline", action="store_true",
+                        help="Serve candles from the local store without syncing")
+    args = parser.parse_args()
+
+    with open(args.grid, "r") as f:
+        space = json.load(f)
+    combos = (sample_random(space, args.random, args.seed) if args.random
+              else expand_grid(space))
+
+    print(f"Fetching {args.days} days of historical data...")
+    df = fetch_historical_data(args.days, offline=args.offline)
+    print(f"Running {len(combos)} backtests on {len(df)} candles...\n")
+
+    results = run_sweep(df, combos, args.capital, args.workers, args.engine, args.rank_by)
+    table = results_to_frame(results)
+    table.to_csv(args.out, index=False)
+
+    print(table.head(10).to_string(index=False))
+    print(f"\nWrote {len(table)} results to {args.out}")
@@ -23,6 +23,8 @@ with patch.dict(os.environ, {
         from trading import (
             utils, database, indicators, market,
             external, orderbook, decision, dca, execution, gpt,
+            candles, gather, transport, cache, charts, position, risk_monitor,
+            scheduler, prompt, llm_cache, orderbook_store, account, orders, risk,
         )
 
 
@@ -94,8 +96,24 @@ def sample_ohlcv_df():
 
 
 @pytest.fixture
-def dca_state_file(tmp_path):
-    return str(tmp_path / "dca_state.json")
+def dca_db(tmp_db):
+    with patch.object(config, "DB_PATH", tmp_db), patch.object(config, "DCA_ENABLED", True):
+        yield tmp_db
+
+
+@pytest.fixture(autouse=True)
+def isolated_feed_cache():
+    """Give every test an empty, memory-only feed cache."""
+    with patch.object(external, "feed_cache", cache.TTLCache(path=None)):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def isolated_llm_cache(tmp_path):
+    """Record LLM requests and cycles under the test's tmp dir."""
+    store = llm_cache.ResponseStore(str(tmp_path / "llm_cache"))
+    with patch.object(llm_cache, "_store", store):
+        yield store
 
 
 # ---------------------------------------------------------------------------
@@ -275,6 +293,95 @@ class TestGetHighWatermark:
         assert database.get_high_watermark(tmp_db) == 55000000
 
 
+class TestDecisionRepository:
+    def test_wal_mode(self, tmp_db):
+        repo = database.get_repository(tmp_db)
+        assert repo.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_connection_reused(self, tmp_db):
+        assert database.get_repository(tmp_db) is database.get_repository(tmp_db)
+
+    def test_queries_use_indexes(self, tmp_db):
+        conn = database.get_repository(tmp_db).conn
+        plan = " ".join(str(r) for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT timestamp FROM decisions "
+            "ORDER BY timestamp DESC LIMIT 1"))
+        assert "idx_decisions_timestamp" in plan
+        plan = " ".join(str(r) for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT high_watermark FROM decisions "
+            "WHERE high_watermark IS NOT NULL ORDER BY timestamp DESC LIMIT 1"))
+        assert "idx_decisions_high_watermark" in plan
+
+    def test_reader_not_blocked_by_open_write(self, tmp_db, sample_status):
+        repo = database.get_repository(tmp_db)
+        repo.conn.execute("BEGIN IMMEDIATE")
+        repo.conn.execute("INSERT INTO decisions (timestamp, decision) "
+                          "VALUES ('2024-01-01 12:00:00', 'buy')")
+        try:
+            with sqlite3.connect(tmp_db, timeout=0.1) as reader:
+                assert reader.execute("SELECT count(*) FROM decisions").fetchone()[0] == 0
+        finally:
+            repo.conn.commit()
+
+    def test_concurrent_saves(self, tmp_db, sample_status):
+        from concurrent.futures import ThreadPoolExecutor
+        d = {"decision": "hold", "percentage": 0, "reason": "x"}
+        with patch.object(config, "DB_PATH", tmp_db):
+            with ThreadPoolExecutor(8) as pool:
+                list(pool.map(lambda _: database.save_decision_to_db(d, sample_status),
+                              range(40)))
+        with sqlite3.connect(tmp_db) as conn:
+            assert conn.execute("SELECT count(*) FROM decisions").fetchone()[0] == 40
+
+
+class TestPositionState:
+    def insert(self, db, ts, hw):
+        with sqlite3.connect(db) as conn:
+            conn.execute("INSERT INTO decisions (timestamp, decision, high_watermark) "
+                         "VALUES (?, 'buy', ?)", (ts, hw))
+
+    def test_rehydrates_from_table(self, tmp_db):
+        self.insert(tmp_db, "2024-01-01 12:00:00", 51000000)
+        self.insert(tmp_db, "2024-01-01 13:00:00", None)
+        state = database.get_position_state(tmp_db)
+        assert state.high_watermark == 51000000
+        assert state.last_decision_time == datetime(2024, 1, 1, 13, 0, 0)
+
+    def test_reads_stay_in_memory(self, tmp_db):
+        repo = database.get_repository(tmp_db)
+        database.get_high_watermark(tmp_db)
+        with patch.object(repo, "high_watermark") as hw_query, \
+             patch.object(repo, "last_decision_time") as time_query:
+            database.get_high_watermark(tmp_db)
+            database.get_last_decision_time(tmp_db)
+        hw_query.assert_not_called()
+        time_query.assert_not_called()
+
+    def test_save_writes_through(self, tmp_db, sample_status):
+        assert database.get_high_watermark(tmp_db) == 0.0
+        with patch.object(config, "DB_PATH", tmp_db):
+            database.save_decision_to_db(
+                {"decision": "buy", "percentage": 10, "high_watermark": 52000000},
+                sample_status)
+            database.save_decision_to_db({"decision": "hold", "percentage": 0}, sample_status)
+        state = database.get_position_state(tmp_db)
+        assert state.high_watermark == 52000000
+        assert (datetime.now() - state.last_decision_time).total_seconds() < 5
+        # A fresh process rehydrates the same values from disk
+        assert position.PositionState.rehydrate(database.DecisionRepository(tmp_db)).snapshot() \
+            == state.snapshot()
+
+    def test_full_close_resets_watermark(self, tmp_db, sample_status):
+        with patch.object(config, "DB_PATH", tmp_db):
+            database.save_decision_to_db(
+                {"decision": "buy", "percentage": 10, "high_watermark": 52000000},
+                sample_status)
+            database.save_decision_to_db(
+                {"decision": "sell", "percentage": 100, "high_watermark": 52000000},
+                sample_status)
+        assert database.get_high_watermark(tmp_db) == 0.0
+
+
 class TestComputeHighWatermark:
     def test_new_high(self):
         with patch.object(database, "get_high_watermark", return_value=49000000):
@@ -295,6 +402,86 @@ class TestComputeHighWatermark:
         assert result == 0.0
 
 
+# ---------------------------------------------------------------------------
+# Candle store
+# ---------------------------------------------------------------------------
+class FakeUpbitCandles:
+    """Local stand-in for pyupbit.get_ohlcv with `count`/`to` paging."""
+
+    def __init__(self, df):
+        self.df = df
+        self.calls = []
+
+    def __call__(self, market, interval="day", count=200, to=None):
+        self.calls.append(to)
+        end = len(self.df) if to is None else self.df.index.searchsorted(pd.Timestamp(to), "left")
+        out = self.df.iloc[max(0, end - count):end]
+        return out.copy() if len(out) else None
+
+
+@pytest.fixture
+def daily_history():
+    n = 700
+    dates = pd.date_range("2022-01-01 09:00", periods=n, freq="D")
+    close = np.linspace(30000000, 60000000, n)
+    return pd.DataFrame({
+        "open": close, "high": close * 1.01, "low": close * 0.99,
+        "close": close, "volume": np.ones(n), "value": close,
+    }, index=dates)
+
+
+class TestCandleStore:
+    def test_initial_sync_and_slice(self, tmp_path, daily_history):
+        fetcher = FakeUpbitCandles(daily_history)
+        store = candles.CandleStore(str(tmp_path), fetcher=fetcher)
+        added = store.sync("KRW-BTC", "day", daily_history.index[-300])
+        assert added >= 300
+        tail = store.tail("KRW-BTC", "day", 300)
+        pd.testing.assert_frame_equal(tail, daily_history.iloc[-300:],
+                                      check_freq=False, check_index_type=False)
+        window = store.load("KRW-BTC", "day", daily_history.index[-10], daily_history.index[-5])
+        assert len(window) == 6
+
+    def test_incremental_tail_only(self, tmp_path, daily_history):
+        fetcher = FakeUpbitCandles(daily_history.iloc[:-20])
+        store = candles.CandleStore(str(tmp_path), fetcher=fetcher)
+        store.sync("KRW-BTC", "day", daily_history.index[-300])
+        fetcher.df = daily_history
+        fetcher.calls.clear()
+        added = store.sync("KRW-BTC", "day", daily_history.index[-300])
+        assert added == 20
+        assert fetcher.calls == [None]
+        assert store.coverage("KRW-BTC", "day")[1] == daily_history.index[-1]
+
+    def test_head_extension_and_dedupe(self, tmp_path, daily_history):
+        fetcher = FakeUpbitCandles(daily_history)
+        store = candles.CandleStore(str(tmp_path), fetcher=fetcher)
+        store.sync("KRW-BTC", "day", daily_history.index[-100])
+        store.sync("KRW-BTC", "day", daily_history.index[-500])
+        loaded = store.load("KRW-BTC", "day")
+        assert loaded.index.is_unique
+        assert loaded.index.is_monotonic_increasing
+        assert loaded.index[0] <= daily_history.index[-500]
+
+    def test_head_exhausted_not_refetched(self, tmp_path, daily_history):
+        fetcher = FakeUpbitCandles(daily_history)
+        store = candles.CandleStore(str(tmp_path), fetcher=fetcher)
+        store.sync("KRW-BTC", "day", "2020-01-01")
+        assert store.count("KRW-BTC", "day") == len(daily_history)
+        fetcher.calls.clear()
+        store.sync("KRW-BTC", "day", "2020-01-01")
+        assert fetcher.calls == [None]
+
+    def test_empty_store(self, tmp_path):
+        store = candles.CandleStore(str(tmp_path), fetcher=lambda *a, **k: None)
+        assert store.coverage("KRW-BTC", "day") is None
+        assert store.load("KRW-BTC", "day").empty
+
+    def test_unknown_interval(self):
+        with pytest.raises(ValueError):
+            candles.interval_step("minute7")
+
+
 # ---------------------------------------------------------------------------
 # Market data functions
 # ---------------------------------------------------------------------------
@@ -312,6 +499,43 @@ class TestAddIndicators:
             assert col in result.columns
 
 
+class TestIndicatorState:
+    @pytest.fixture
+    def long_ohlcv(self):
+        rng = np.random.default_rng(7)
+        n = 200
+        close = 50000000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+        open_ = close * (1 + rng.normal(0, 0.003, n))
+        return pd.DataFrame({
+            "open": open_,
+            "high": np.maximum(open_, close) * (1 + rng.random(n) * 0.01),
+            "low": np.minimum(open_, close) * (1 - rng.random(n) * 0.01),
+            "close": close,
+            "volume": rng.random(n) * 10 + 1,
+        }, index=pd.date_range("2024-01-01", periods=n, freq="h"))
+
+    def test_matches_add_indicators(self, long_ohlcv):
+        expected = indicators.add_indicators(long_ohlcv.copy())
+        result, _ = indicators.stream_indicators(long_ohlcv)
+        assert list(result.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-9)
+
+    def test_snapshot_restore_continues_stream(self, long_ohlcv):
+        full, _ = indicators.stream_indicators(long_ohlcv)
+        head, state = indicators.stream_indicators(long_ohlcv.iloc[:120])
+        restored = indicators.IndicatorState.restore(json.loads(json.dumps(state.snapshot())))
+        tail, _ = indicators.stream_indicators(long_ohlcv.iloc[120:], restored)
+        pd.testing.assert_frame_equal(pd.concat([head, tail]), full)
+
+    def test_warmup_is_nan(self):
+        state = indicators.IndicatorState()
+        row = state.update({"open": 1, "high": 2, "low": 0.5, "close": 1.5, "volume": 1})
+        assert np.isnan(row["SMA_10"])
+        assert np.isnan(row["RSI_14"])
+        assert row["VWAP"] == pytest.approx((2 + 0.5 + 1.5) / 3)
+        assert row["MACD"] == 0
+
+
 class TestDetectSupportResistance:
     def test_returns_dict(self, sample_ohlcv_df):
         result = indicators.detect_support_resistance(sample_ohlcv_df)
@@ -393,12 +617,12 @@ class TestGetNewsData:
         mock_resp.content = xml
         mock_resp.raise_for_status = MagicMock()
 
-        with patch("trading.external.requests.get", return_value=mock_resp):
+        with patch("trading.external.transport.get", return_value=mock_resp):
             result = external.get_news_data()
         assert "Bitcoin rises" in result
 
     def test_failure(self):
-        with patch("trading.external.requests.get", side_effect=Exception("timeout")):
+        with patch("trading.external.transport.get", side_effect=Exception("timeout")):
             result = external.get_news_data()
         assert "No news data" in result
 
@@ -409,16 +633,244 @@ class TestFetchFearAndGreedIndex:
         mock_resp.json.return_value = {"data": [{"value": "50", "classification": "Neutral"}]}
         mock_resp.raise_for_status = MagicMock()
 
-        with patch("trading.external.requests.get", return_value=mock_resp):
+        with patch("trading.external.transport.get", return_value=mock_resp):
             result = external.fetch_fear_and_greed_index()
         assert "50" in result
 
     def test_failure(self):
-        with patch("trading.external.requests.get", side_effect=Exception("error")):
+        with patch("trading.external.transport.get", side_effect=Exception("error")):
             result = external.fetch_fear_and_greed_index()
         assert "No fear and greed" in result
 
 
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    def make_cache(self, clock, **kwargs):
+        kwargs.setdefault("ttls", {"feed": 60})
+        kwargs.setdefault("max_stale", {"feed": 600})
+        return cache.TTLCache(clock=clock, **kwargs)
+
+    def test_fresh_entry_skips_fetch(self):
+        clock = FakeClock()
+        c = self.make_cache(clock)
+        fetch = MagicMock(return_value="v1")
+        assert c.get_or_fetch("feed", "k", fetch) == "v1"
+        clock.now += 30
+        assert c.get_or_fetch("feed", "k", fetch) == "v1"
+        assert fetch.call_count == 1
+
+    def test_stale_entry_served_while_refreshing(self):
+        import threading
+        clock = FakeClock()
+        c = self.make_cache(clock)
+        c.set("feed", "k", "old")
+        clock.now += 120
+        release = threading.Event()
+
+        def slow_fetch():
+            release.wait(5)
+            return "new"
+
+        assert c.get_or_fetch("feed", "k", slow_fetch) == "old"
+        release.set()
+        for t in threading.enumerate():
+            if t.name == "refresh-k":
+                t.join(5)
+        assert c.get("k")[0] == "new"
+
+    def test_refresh_failure_keeps_last_good_value(self):
+        clock = FakeClock()
+        c = self.make_cache(clock)
+        c.set("feed", "k", "good")
+        clock.now += 120
+        c._refresh_in_background = lambda *a: None
+        assert c.get_or_fetch("feed", "k", MagicMock(side_effect=RuntimeError)) == "good"
+
+    def test_beyond_max_stale_fetches_synchronously(self):
+        clock = FakeClock()
+        c = self.make_cache(clock)
+        c.set("feed", "k", "old")
+        clock.now += 1000
+        assert c.get_or_fetch("feed", "k", lambda: "new") == "new"
+
+    def test_failed_fetch_not_cached(self):
+        c = self.make_cache(FakeClock())
+        with pytest.raises(RuntimeError):
+            c.get_or_fetch("feed", "k", MagicMock(side_effect=RuntimeError))
+        assert c.get("k") is None
+
+    def test_lru_eviction(self):
+        c = self.make_cache(FakeClock(), max_entries=2)
+        c.set("feed", "a", 1)
+        c.set("feed", "b", 2)
+        c.get("a")
+        c.set("feed", "c", 3)
+        assert c.get("b") is None
+        assert c.get("a")[0] == 1 and c.get("c")[0] == 3
+
+    def test_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "feeds.json")
+        clock = FakeClock()
+        self.make_cache(clock, path=path).set("feed", "k", "v")
+        fetch = MagicMock()
+        assert self.make_cache(clock, path=path).get_or_fetch("feed", "k", fetch) == "v"
+        fetch.assert_not_called()
+
+    def test_corrupt_file_ignored(self, tmp_path):
+        path = tmp_path / "feeds.json"
+        path.write_text("{not json")
+        c = self.make_cache(FakeClock(), path=str(path))
+        assert c.get_or_fetch("feed", "k", lambda: "v") == "v"
+
+    def test_external_feed_served_from_cache_on_outage(self):
+        clock = FakeClock()
+        external.feed_cache.clock = clock
+        mock_resp = MagicMock()
+        mock_resp.json.return_value = {"data": [{"value": "42"}]}
+        with patch("trading.external.transport.get", return_value=mock_resp):
+            assert "42" in external.fetch_fear_and_greed_index()
+        clock.now += 10 * 86400
+        with patch("trading.external.transport.get", side_effect=Exception("down")):
+            assert "42" in external.fetch_fear_and_greed_index()
+
+
+# ---------------------------------------------------------------------------
+# HTTP transport
+# ---------------------------------------------------------------------------
+class FakeSession:
+    """Returns queued responses/exceptions and records requests."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0) if self.outcomes else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        resp = MagicMock()
+        resp.status_code = outcome
+        resp.ok = outcome < 400
+        return resp
+
+
+def make_transport(*outcomes, **kwargs):
+    kwargs.setdefault("max_retries", 2)
+    kwargs.setdefault("failure_threshold", 3)
+    kwargs.setdefault("cooldown", 60)
+    return transport.Transport(session=FakeSession(*outcomes), sleep=lambda s: None, **kwargs)
+
+
+class TestTransport:
+    def test_classify(self):
+        assert transport.classify("GET", "https://api.upbit.com/v1/candles/days") == "upbit_quotation"
+        assert transport.classify("GET", "https://api.upbit.com/v1/accounts") == "upbit_exchange"
+        assert transport.classify("POST", "https://api.upbit.com/v1/orders") == "upbit_order"
+        assert transport.classify("GET", "https://news.google.com/rss/search") == "news"
+        assert transport.classify("GET", "https://example.com") == "default"
+
+    def test_retries_transient_status(self):
+        t = make_transport(503, 200)
+        resp = t.get("https://api.upbit.com/v1/orderbook")
+        assert resp.status_code == 200
+        stats = t.stats()["upbit_quotation"]
+        assert stats["requests"] == 2
+        assert stats["retries"] == 1
+
+    def test_retries_connection_error_then_raises(self):
+        import requests
+        err = requests.exceptions.ConnectionError("reset")
+        t = make_transport(err, err, err)
+        with pytest.raises(requests.exceptions.ConnectionError):
+            t.get("https://api.alternative.me/fng/")
+        assert t.stats()["fear_greed"]["requests"] == 3
+
+    def test_orders_never_retried(self):
+        t = make_transport(503, 200)
+        resp = t.post("https://api.upbit.com/v1/orders")
+        assert resp.status_code == 503
+        assert len(t.session.calls) == 1
+
+    def test_default_timeout_applied(self):
+        t = make_transport(200)
+        t.get("https://api.upbit.com/v1/ticker")
+        assert t.session.calls[0][2]["timeout"] == config.API_TIMEOUT
+
+    def test_circuit_opens_after_failures(self):
+        t = make_transport(500, 500, 500, max_retries=0)
+        for _ in range(3):
+            t.get("https://news.google.com/rss")
+        with pytest.raises(transport.CircuitOpenError):
+            t.get("https://news.google.com/rss")
+        assert t.stats()["news"]["circuit"] == "open"
+        assert t.stats()["news"]["circuit_rejections"] == 1
+
+    def test_circuit_half_opens_after_cooldown(self):
+        now = [0.0]
+        breaker = transport.CircuitBreaker(2, 10, clock=lambda: now[0])
+        breaker.record_failure()
+        breaker.record_failure()
+        assert not breaker.allow()
+        now[0] = 11
+        assert breaker.state == "half_open"
+        assert breaker.allow()
+        assert not breaker.allow()  # one probe at a time
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.allow() and breaker.allow()
+
+    def test_failed_probe_reopens_circuit(self):
+        now = [0.0]
+        breaker = transport.CircuitBreaker(2, 10, clock=lambda: now[0])
+        breaker.record_failure()
+        breaker.record_failure()
+        now[0] = 11
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+        now[0] = 21
+        assert breaker.allow() and not breaker.allow()
+        now[0] = 31  # the probe never reported back: its slot expires
+        assert breaker.allow()
+
+    def test_token_bucket_throttles(self):
+        now = [0.0]
+        waits = []
+        bucket = transport.TokenBucket(2, 2, clock=lambda: now[0], sleep=waits.append)
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == pytest.approx(0.5)
+        now[0] = 1.0
+        assert bucket.acquire() == 0
+        assert waits == [pytest.approx(0.5)]
+
+    def test_install_pyupbit_routes_requests(self):
+        import pyupbit
+        from pyupbit import request_api
+        original_requests = request_api.requests
+        t = make_transport()
+        resp = MagicMock(ok=True, status_code=200, headers={"Remaining-Req": "group=orderbook; min=1; sec=9"})
+        resp.json.return_value = [{"market": "KRW-BTC", "orderbook_units": []}]
+        t.session.request = MagicMock(return_value=resp)
+        try:
+            with patch.object(transport, "_transport", t):
+                transport.install_pyupbit()
+                pyupbit.get_orderbook("KRW-BTC")
+        finally:
+            request_api.requests = original_requests
+        method, url = t.session.request.call_args[0]
+        assert method == "GET" and "/v1/orderbook" in url
+        assert t.stats()["upbit_quotation"]["requests"] == 1
+
+
 # ---------------------------------------------------------------------------
 # Orderbook depth analysis
 # ---------------------------------------------------------------------------
@@ -450,6 +902,71 @@ class TestAnalyzeOrderbookDepth:
         assert result["executable"] is True
 
 
+def linear_walk(levels, amount, in_krw):
+    """Reference level-by-level fill: ``levels`` of (price, size)."""
+    qty = notional = 0.0
+    remaining = amount
+    for price, size in levels:
+        take = min(size, remaining / price if in_krw else remaining)
+        qty += take
+        notional += take * price
+        remaining -= take * price if in_krw else take
+    return qty, notional
+
+
+class TestOrderbook:
+    @pytest.fixture
+    def book(self):
+        rng = np.random.default_rng(3)
+        units = [{"ask_price": 100_000_000 + 5000 * (i + 1), "ask_size": rng.uniform(0.01, 0.5),
+                  "bid_price": 100_000_000 - 5000 * (i + 1), "bid_size": rng.uniform(0.01, 0.5)}
+                 for i in range(15)]
+        return units, orderbook.Orderbook.from_dict({"orderbook_units": units})
+
+    def test_batch_matches_linear_walk(self, book):
+        units, ob = book
+        asks = [(u["ask_price"], u["ask_size"]) for u in units]
+        bids = [(u["bid_price"], u["bid_size"]) for u in units]
+        krw = np.array([1e5, 5e6, 1e8, 3e8, 1e10])
+        quote = ob.buy(krw)
+        for i, amount in enumerate(krw):
+            qty, notional = linear_walk(asks, amount, in_krw=True)
+            assert quote.qty[i] == pytest.approx(qty)
+            assert quote.notional[i] == pytest.approx(notional)
+        assert quote.remaining[-1] > 0 and (quote.remaining[:-1] == 0).all()
+        btc = np.array([0.001, 0.3, 2.0, 50.0])
+        quote = ob.sell(btc)
+        for i, amount in enumerate(btc):
+            qty, notional = linear_walk(bids, amount, in_krw=False)
+            assert quote.qty[i] == pytest.approx(qty)
+            assert quote.notional[i] == pytest.approx(notional)
+        assert np.all(np.diff(quote.slippage_pct) >= 0)
+
+    def test_scalar_query(self, book):
+        _, ob = book
+        quote = ob.buy(1_000_000)
+        assert isinstance(quote.avg_price, float)
+        assert quote.avg_price == pytest.approx(ob.best_ask)
+        assert quote.slippage_pct == pytest.approx(0, abs=1e-12)
+        assert ob.sell(0.0).qty == 0
+
+    @pytest.mark.parametrize("side", ["buy", "sell"])
+    def test_capacity_hits_slippage_limit(self, book, side):
+        _, ob = book
+        full = ob.buy(1e12) if side == "buy" else ob.sell(1e6)
+        for limit in np.array([0.2, 0.5, 0.9]) * full.slippage_pct:
+            size = ob.capacity(side, limit)
+            quote = ob.buy(size) if side == "buy" else ob.sell(size)
+            assert quote.slippage_pct == pytest.approx(limit, rel=1e-6)
+        total = ob.capacity(side, 1.0)
+        assert total == pytest.approx(ob.asks.cum_krw[-1] if side == "buy" else ob.bids.cum_btc[-1])
+
+    def test_empty_side(self):
+        ob = orderbook.Orderbook.from_dict({"orderbook_units": [{"ask_price": 0, "ask_size": 1}]})
+        assert ob.best_ask == 0 and ob.capacity("buy", 0.01) == 0
+        assert ob.buy([1e6, 2e6]).remaining.tolist() == [1e6, 2e6]
+
+
 # ---------------------------------------------------------------------------
 # GPT analysis
 # ---------------------------------------------------------------------------
@@ -465,6 +982,366 @@ class TestGetInstructions:
         assert result is None
 
 
+class FakeAsyncClient:
+    """Streams canned JSON per model after a configurable delay."""
+
+    def __init__(self, delays, fail=()):
+        from types import SimpleNamespace
+        self.delays = delays
+        self.fail = set(fail)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, stream, **kwargs):
+        import asyncio
+        from types import SimpleNamespace
+        self.calls.append(model)
+        await asyncio.sleep(self.delays[model])
+        if model in self.fail:
+            raise RuntimeError(f"{model} failed")
+
+        async def chunks():
+            for part in ('{"decision": "hold", ', f'"reason": "{model}"}}'):
+                yield SimpleNamespace(choices=[SimpleNamespace(
+                    delta=SimpleNamespace(content=part))])
+        return chunks()
+
+
+class TestAsyncGpt:
+    @pytest.fixture(autouse=True)
+    def gpt_env(self):
+        with patch.object(config, "GPT_HEDGE_MODEL", "fallback"), \
+             patch.object(config, "OPENAI_MODEL", "primary"), \
+             patch.object(gpt, "latency", gpt.LatencyTracker(window=20)):
+            yield
+
+    def run(self, client, **kwargs):
+        import asyncio
+        with patch.object(gpt, "async_client", client):
+            return asyncio.run(gpt.analyze_async([{"role": "user", "content": "x"}], **kwargs))
+
+    def test_streams_and_records_latency(self):
+        result = self.run(FakeAsyncClient({"primary": 0.01}), hedge=False)
+        assert json.loads(result)["reason"] == "primary"
+        call = gpt.latency.calls[-1]
+        assert call["outcome"] == "ok"
+        assert 0 < call["ttfb"] <= call["total"]
+
+    def test_hedge_wins_when_primary_slow(self):
+        client = FakeAsyncClient({"primary": 1.0, "fallback": 0.01})
+        with patch.object(config, "GPT_HEDGE_DELAY_SECONDS", 0.05):
+            result = self.run(client, hedge=True)
+        assert json.loads(result)["reason"] == "fallback"
+        assert client.calls == ["primary", "fallback"]
+        outcomes = {(c["model"], c["outcome"]) for c in gpt.latency.calls}
+        assert ("primary", "cancelled") in outcomes
+
+    def test_no_hedge_when_primary_fast(self):
+        client = FakeAsyncClient({"primary": 0.01, "fallback": 0.01})
+        with patch.object(config, "GPT_HEDGE_DELAY_SECONDS", 0.5):
+            self.run(client, hedge=True)
+        assert client.calls == ["primary"]
+
+    def test_hedge_covers_primary_failure(self):
+        client = FakeAsyncClient({"primary": 0.2, "fallback": 0.01}, fail={"primary"})
+        with patch.object(config, "GPT_HEDGE_DELAY_SECONDS", 0.05):
+            assert "fallback" in self.run(client, hedge=True)
+
+    def test_hedge_delay_uses_percentile(self):
+        tracker = gpt.LatencyTracker(window=20)
+        with patch.object(config, "GPT_HEDGE_MIN_SAMPLES", 10), \
+             patch.object(config, "GPT_HEDGE_PERCENTILE", 90), \
+             patch.object(config, "GPT_HEDGE_DELAY_SECONDS", 99):
+            for i in range(9):
+                tracker.record("m", 0.1, float(i + 1), "ok")
+            assert tracker.hedge_delay() == 99
+            tracker.record("m", 0.1, 10.0, "ok")
+            assert tracker.hedge_delay() == 9.0
+
+    def test_cache_records_winning_model(self, tmp_path, monkeypatch, isolated_llm_cache):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "instructions_v3.md").write_text("instructions")
+        client = FakeAsyncClient({"primary": 1.0, "fallback": 0.01})
+        with patch.object(gpt, "async_client", client), \
+             patch.object(config, "LLM_CACHE_MODE", "record"), \
+             patch.object(config, "GPT_HEDGE_ENABLED", True), \
+             patch.object(config, "GPT_HEDGE_DELAY_SECONDS", 0.05):
+            response = gpt.analyze_data_with_gpt4("n", "d", "l", "f", "s", "")
+        assert json.loads(response)["reason"] == "fallback"
+        [path] = (tmp_path / "llm_cache" / "responses").rglob("*.json")
+        assert json.loads(path.read_text())["model"] == "fallback"
+
+    def test_deadline(self):
+        import asyncio
+        with pytest.raises(asyncio.TimeoutError):
+            self.run(FakeAsyncClient({"primary": 1.0}), deadline=0.05, hedge=False)
+
+    def test_sync_wrapper_deadline_returns_none(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "instructions_v3.md").write_text("instructions")
+        with patch.object(gpt, "async_client", FakeAsyncClient({"primary": 1.0})), \
+             patch.object(config, "GPT_DEADLINE_SECONDS", 0.05), \
+             patch.object(config, "GPT_HEDGE_ENABLED", False):
+            assert gpt.analyze_data_with_gpt4("n", "d", "l", "f", "s", "") is None
+
+    def test_cancel_inflight_from_another_thread(self, tmp_path, monkeypatch):
+        import threading
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "instructions_v3.md").write_text("instructions")
+        result = {}
+        with patch.object(gpt, "async_client", FakeAsyncClient({"primary": 5.0})), \
+             patch.object(config, "GPT_HEDGE_ENABLED", False):
+            worker = threading.Thread(target=lambda: result.setdefault(
+                "value", gpt.analyze_data_with_gpt4("n", "d", "l", "f", "s", "")))
+            worker.start()
+            for _ in range(100):
+                if gpt._inflight:
+                    break
+                threading.Event().wait(0.01)
+            gpt.cancel_inflight()
+            worker.join(2)
+        assert not worker.is_alive()
+        assert result["value"] is None
+        assert not gpt._inflight
+
+
+# ---------------------------------------------------------------------------
+# Prompt compaction
+# ---------------------------------------------------------------------------
+class TestPromptEncoding:
+    def frame(self, n, freq):
+        idx = pd.date_range("2024-01-01", periods=n, freq=freq)
+        close = np.linspace(50_000_000.4, 51_000_000.4, n)
+        return pd.DataFrame({"open": close, "high": close, "low": close, "close": close,
+                             "volume": np.full(n, 1.23456), "value": close * 2,
+                             "RSI_14": np.full(n, 55.555)}, index=idx)
+
+    def test_frames_subset_round_and_tail(self):
+        with patch.object(config, "PROMPT_COLUMNS", ["close", "volume", "RSI_14"]):
+            out = json.loads(prompt.encode_frames(
+                {"daily": self.frame(30, "D"), "hourly": self.frame(24, "h")},
+                rows={"daily": 5, "hourly": 3}))
+        assert out["columns"] == ["close", "volume", "RSI_14"]
+        assert [label for label, _ in out["index"]] == ["daily"] * 5 + ["hourly"] * 3
+        assert out["index"][4] == ["daily", "2024-01-30"]
+        assert out["data"][-1] == [51_000_000, 1.235, 55.6]
+
+    def test_adx_columns_follow_length_setting(self):
+        df = self.frame(5, "D").assign(ADX_20=21.234, DMP_20=30.0, DMN_20=10.0)
+        with patch.object(config, "ADX_LENGTH", 20):
+            out = json.loads(prompt.encode_frames({"daily": df}))
+        assert out["columns"][-3:] == ["ADX_20", "DMP_20", "DMN_20"]
+        assert out["data"][0][-3:] == [21.2, 30.0, 10.0]
+
+    def test_fear_greed_rows_are_dated(self):
+        out = json.loads(prompt.encode_fear_greed([
+            {"value": "42", "value_classification": "Fear", "timestamp": "1704067200"}]))
+        assert out == {"fields": ["date", "value", "classification"],
+                       "rows": [["2024-01-01", 42, "Fear"]]}
+
+    def test_records_dedupe_field_names(self):
+        records = [{"decision": "buy", "reason": "x" * 500, "percentage": 33.333}] * 3
+        out = prompt.encode_records(records, ["decision", "percentage", "reason"], max_text=10)
+        payload = json.loads(out)
+        assert payload["fields"] == ["decision", "percentage", "reason"]
+        assert payload["rows"][0] == ["buy", 33.3, "x" * 9 + "…"]
+        assert out.count("decision") == 1
+
+    def test_status_truncates_orderbook(self):
+        units = [{"ask_price": 50_000_000.0 + i, "ask_size": 0.123456789,
+                  "bid_price": 49_990_000.0 - i, "bid_size": 1.0} for i in range(15)]
+        status = json.dumps({"current_time": 1, "btc_balance": 0.5, "krw_balance": 1000.4,
+                             "btc_avg_buy_price": 48_000_000.0,
+                             "orderbook": {"total_ask_size": 3.0, "orderbook_units": units}})
+        out = json.loads(prompt.encode_status(status, depth=3))
+        assert len(out["orderbook"]["rows"]) == 3
+        assert out["orderbook"]["rows"][0] == [50_000_000, 0.1235, 49_990_000, 1.0]
+        assert out["krw_balance"] == 1000
+
+    def test_fetch_last_decisions_compact(self, tmp_db):
+        database.get_repository(tmp_db).save_decision(
+            ("sell", 50, "take profit", 0.1, 100.0, 48_000_000.0, 50_000_000.0, None, ""))
+        with patch.object(config, "PROMPT_COMPACT", True):
+            payload = json.loads(database.fetch_last_decisions(tmp_db))
+        assert payload["fields"][:2] == ["timestamp", "decision"]
+        assert payload["rows"][0][1:4] == ["sell", 50.0, "take profit"]
+
+
+class TestPromptBuilder:
+    @pytest.fixture(autouse=True)
+    def char_estimate(self):
+        with patch.object(prompt, "_encoding", None):  # deterministic token counts
+            yield
+
+    def rows(self, n):
+        return json.dumps({"fields": ["v"], "rows": [[i] for i in range(n)]})
+
+    def test_report_without_shrinking(self):
+        builder = prompt.PromptBuilder(budget=10_000)
+        builder.add("a", "x" * 40).add("b", "y" * 80)
+        contents, report = builder.build()
+        assert contents == ["x" * 40, "y" * 80]
+        assert report == {"a": 10, "b": 20, "total": 30}
+
+    def test_shrinks_lowest_priority_first(self):
+        builder = prompt.PromptBuilder(budget=150)
+        builder.add("keep", self.rows(100), priority=1, shrink=prompt.shrink_rows)
+        builder.add("drop", self.rows(100), priority=5, shrink=prompt.shrink_rows)
+        builder.add("fixed", "z" * 100)
+        contents, report = builder.build()
+        assert report["total"] <= 150
+        assert len(json.loads(contents[1])["rows"]) < len(json.loads(contents[0])["rows"])
+        assert json.loads(contents[1])["rows"][0] == [0]  # newest rows kept
+        assert contents[2] == "z" * 100
+
+    def test_gives_up_when_nothing_left_to_shrink(self):
+        builder = prompt.PromptBuilder(budget=5)
+        builder.add("fixed", "z" * 100)
+        builder.add("rows", self.rows(8), shrink=prompt.shrink_rows)
+        contents, report = builder.build()
+        assert contents[0] == "z" * 100
+        assert json.loads(contents[1])["rows"] == [[0]]
+
+    def test_shrink_frames_keeps_latest_per_timeframe(self):
+        payload = json.dumps({"columns": ["close"],
+                              "index": [["daily", d] for d in "abcd"] + [["hourly", "x"], ["hourly", "y"]],
+                              "data": [[1], [2], [3], [4], [5], [6]]})
+        out = json.loads(prompt.shrink_frames(payload))
+        assert out["index"] == [["daily", "c"], ["daily", "d"], ["hourly", "y"]]
+        assert out["data"] == [[3], [4], [6]]
+
+    def test_fit_prompt_compacts_status(self):
+        status = json.dumps({"current_time": 1, "orderbook": {"orderbook_units": [
+            {"ask_price": 1.0, "ask_size": 1.0, "bid_price": 1.0, "bid_size": 1.0}] * 15}})
+        with patch.object(config, "PROMPT_COMPACT", True), \
+             patch.object(config, "PROMPT_ORDERBOOK_DEPTH", 2):
+            sections = gpt.fit_prompt("instr", "news", "{}", "none", "fng", status)
+        assert len(json.loads(sections[4])["orderbook"]["rows"]) == 2
+
+
+# ---------------------------------------------------------------------------
+# LLM response cache and replay
+# ---------------------------------------------------------------------------
+def chat_messages(data, chart=""):
+    messages = [{"role": "system", "content": "instructions"},
+                {"role": "user", "content": data}]
+    if chart:
+        messages.append({"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{chart}"}}]})
+    return messages
+
+
+class TestLlmCache:
+    def test_key_ignores_json_formatting(self):
+        a = llm_cache.request_key("m", chat_messages('{"a": 1, "b": [1, 2]}'))
+        b = llm_cache.request_key("m", chat_messages('{"b":[1,2],"a":1}\n'))
+        assert a == b
+        assert a != llm_cache.request_key("other", chat_messages('{"a": 1, "b": [1, 2]}'))
+        assert a != llm_cache.request_key("m", chat_messages('{"a": 2, "b": [1, 2]}'))
+
+    def test_key_uses_image_digest(self):
+        a = llm_cache.request_key("m", chat_messages("x", chart="AAAA"))
+        assert a == llm_cache.request_key("m", chat_messages("x", chart="AAAA"))
+        assert a != llm_cache.request_key("m", chat_messages("x", chart="BBBB"))
+
+    def test_put_get_dedupes_blobs(self, tmp_path):
+        store = llm_cache.ResponseStore(str(tmp_path))
+        for data in ("one", "two"):
+            messages = chat_messages(data, chart="AAAA")
+            key = llm_cache.request_key("m", messages)
+            store.put(key, "m", messages, f'{{"r": "{data}"}}')
+            assert store.get(key)["response"] == f'{{"r": "{data}"}}'
+            assert store.load_messages(store.get(key)) == messages
+        blobs = list((tmp_path / "blobs").rglob("*"))
+        assert len([b for b in blobs if b.is_file()]) == 4  # instructions + chart shared
+        assert store.get("0" * 64) is None
+        assert store.stats["misses"] == 1
+
+    def test_records_and_replays_without_api(self, tmp_path, monkeypatch, isolated_llm_cache):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "instructions_v3.md").write_text("instructions")
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices = [
+            MagicMock(message=MagicMock(content='{"decision": "hold"}'))]
+        args = ("news", '{"columns": []}', "none", "fng", "status", "")
+        with patch.object(gpt, "client", client), patch.object(gpt, "async_client", None), \
+             patch.object(config, "LLM_CACHE_MODE", "record"):
+            assert gpt.analyze_data_with_gpt4(*args) == '{"decision": "hold"}'
+        assert isolated_llm_cache.stats["writes"] == 1
+
+        client.reset_mock()
+        with patch.object(gpt, "client", client), patch.object(gpt, "async_client", None), \
+             patch.object(config, "LLM_CACHE_MODE", "replay"):
+            assert gpt.analyze_data_with_gpt4(*args) == '{"decision": "hold"}'
+            assert gpt.analyze_data_with_gpt4("other news", *args[1:]) is None
+        client.chat.completions.create.assert_not_called()
+
+
+class TestReplay:
+    def status(self, price, krw=10_000_000, btc=0.0):
+        return json.dumps({"current_time": 0, "krw_balance": krw, "btc_balance": btc,
+                           "btc_avg_buy_price": 0, "orderbook": {"orderbook_units": [
+                               {"ask_price": price, "ask_size": 10.0,
+                                "bid_price": price - 1000, "bid_size": 10.0}]}})
+
+    def record(self, store, monkeypatch, tmp_path, cycles, spacing=7200):
+        """Record cycles through the live gpt path with a fake client."""
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "instructions_v3.md").write_text("instructions")
+        client = MagicMock()
+        for i, (status, answer) in enumerate(cycles):
+            inputs = {"news_data": "news", "data_json": "{}", "last_decisions": "none",
+                      "fear_and_greed": "fng", "current_status": status, "chart_base64": ""}
+            client.chat.completions.create.return_value.choices = [
+                MagicMock(message=MagicMock(content=json.dumps(answer)))]
+            with patch.object(gpt, "client", client), patch.object(gpt, "async_client", None), \
+                 patch.object(config, "LLM_CACHE_MODE", "record"), \
+                 patch.object(llm_cache.time, "time", return_value=1_700_000_000 + i * spacing):
+                llm_cache.record_cycle(inputs, {"market_ctx": {"trend": "up", "rsi": 50}})
+                gpt.analyze_data_with_gpt4(**inputs)
+        return client
+
+    def test_replays_recorded_cycles_offline(self, tmp_path, monkeypatch, isolated_llm_cache):
+        import replay
+        client = self.record(isolated_llm_cache, monkeypatch, tmp_path, [
+            (self.status(50_000_000), {"decision": "buy", "percentage": 30, "reason": "a"}),
+            (self.status(51_000_000), {"decision": "hold", "percentage": 0, "reason": "b"}),
+        ])
+        client.reset_mock()
+        with patch.object(config, "DCA_SPLITS", 3), patch.object(config, "DCA_ENABLED", True):
+            first = replay.replay_cycles(isolated_llm_cache, 10_000_000)
+            second = replay.replay_cycles(isolated_llm_cache, 10_000_000)
+        client.chat.completions.create.assert_not_called()
+        results, summary, account = first
+        assert summary["cycles"] == 2 and summary["cache_misses"] == 0
+        assert [r["decision"] for r in results] == ["buy", "hold"]
+        # first DCA tranche; two hours later both remaining tranches have come due
+        assert [t["price"] for t in account.trades] == [50_000_000, 51_000_000, 51_000_000]
+        assert second[0] == results
+        assert config.LLM_CACHE_MODE != "replay"
+
+    def test_cooldown_uses_recorded_times(self, tmp_path, monkeypatch, isolated_llm_cache):
+        import replay
+        buy = {"decision": "buy", "percentage": 20, "reason": "a"}
+        self.record(isolated_llm_cache, monkeypatch, tmp_path,
+                    [(self.status(50_000_000), buy)] * 3, spacing=20 * 60)
+        with patch.object(config, "MIN_TRADE_INTERVAL_MINUTES", 30), \
+             patch.object(config, "DCA_ENABLED", False):
+            results, _, account = replay.replay_cycles(isolated_llm_cache, 10_000_000)
+        assert [r["decision"] for r in results] == ["buy", "hold", "buy"]
+        assert results[1]["reason"].startswith("Cooldown (20.0m")
+        assert len(account.trades) == 2
+
+    def test_reports_misses_when_prompt_changes(self, tmp_path, monkeypatch, isolated_llm_cache):
+        import replay
+        self.record(isolated_llm_cache, monkeypatch, tmp_path, [
+            (self.status(50_000_000), {"decision": "buy", "percentage": 30, "reason": "a"})])
+        (tmp_path / "instructions_v3.md").write_text("new instructions")
+        results, summary, _ = replay.replay_cycles(isolated_llm_cache)
+        assert summary["cache_misses"] == 1
+        assert results[0]["decision"] == "hold"
+
+
 # ---------------------------------------------------------------------------
 # Decision logic
 # ---------------------------------------------------------------------------
@@ -770,104 +1647,399 @@ class TestApplyRiskPolicy:
 # ---------------------------------------------------------------------------
 # DCA functions
 # ---------------------------------------------------------------------------
-class TestLoadSaveDcaState:
-    def test_load_missing_file(self, dca_state_file):
-        with patch.object(config, "DCA_STATE_FILE", dca_state_file):
-            state = dca.load_dca_state()
-        assert state["active"] is False
-        assert state["tranches_remaining"] == 0
-
-    def test_save_and_load(self, dca_state_file):
-        with patch.object(config, "DCA_STATE_FILE", dca_state_file):
-            state = {"active": True, "tranches_remaining": 2,
-                     "original_percentage": 30, "last_tranche_time": None}
-            dca.save_dca_state(state)
-            loaded = dca.load_dca_state()
-        assert loaded["active"] is True
-        assert loaded["tranches_remaining"] == 2
+class TestDcaPlans:
+    T0 = datetime(2024, 1, 1, 9, 0)
+
+    def test_plans_persist_across_repositories(self, dca_db):
+        plan = dca.create_dca_plan(30, splits=3, interval_minutes=60, start=self.T0)
+        database.close_repositories()
+        [loaded] = dca.active_dca_plans()
+        assert loaded == plan
+        assert dca.next_dca_due() == self.T0
+
+    def test_tranche_claimed_once(self, dca_db):
+        plan = dca.create_dca_plan(30, splits=2, interval_minutes=60, start=self.T0)
+        claimed = dca.claim_tranche(plan, self.T0)
+        assert claimed["tranches_done"] == 1
+        assert claimed["next_due"] == self.T0 + timedelta(minutes=60)
+        assert dca.claim_tranche(plan, self.T0) is None  # stale tranches_done
+        assert dca.claim_tranche(claimed, self.T0)["status"] == "done"
+        assert dca.active_dca_plans() == []
+        assert dca.next_dca_due() is None
+
+    def test_independent_schedules(self, dca_db):
+        dca.create_dca_plan(30, splits=3, interval_minutes=60, start=self.T0)
+        dca.create_dca_plan(20, splits=2, interval_minutes=15, start=self.T0)
+        for plan in dca.active_dca_plans():
+            dca.claim_tranche(plan, self.T0)
+        assert dca.next_dca_due() == self.T0 + timedelta(minutes=15)
+        assert sorted(p["next_due"] for p in dca.active_dca_plans()) == [
+            self.T0 + timedelta(minutes=15), self.T0 + timedelta(minutes=60)]
+
+    def test_import_legacy_state(self, dca_db, tmp_path):
+        path = tmp_path / "dca_state.json"
+        path.write_text(json.dumps({"active": True, "tranches_remaining": 1,
+                                    "original_percentage": 30,
+                                    "last_tranche_time": self.T0.isoformat()}))
+        with patch.object(config, "DCA_SPLITS", 3), patch.object(config, "DCA_INTERVAL_MINUTES", 60):
+            plan = dca.import_legacy_dca_state(str(path))
+        assert plan["tranches_done"] == 2
+        assert plan["next_due"] == self.T0 + timedelta(minutes=60)
+        assert not path.exists()
+        assert dca.import_legacy_dca_state(str(path)) is None
 
 
 class TestApplyDca:
-    def test_disabled(self, dca_state_file):
+    def test_disabled(self):
         with patch.object(config, "DCA_ENABLED", False):
             d = {"decision": "buy", "percentage": 30, "reason": "test"}
             result = dca.apply_dca(d)
         assert result["percentage"] == 30
 
-    def test_non_buy_cancels_active_dca(self, dca_state_file):
-        with patch.object(config, "DCA_STATE_FILE", dca_state_file), \
-             patch.object(config, "DCA_ENABLED", True):
-            dca.save_dca_state({"active": True, "tranches_remaining": 2,
-                                "original_percentage": 30, "last_tranche_time": None})
-            d = {"decision": "sell", "percentage": 50, "reason": "sell now"}
-            result = dca.apply_dca(d)
+    def test_non_buy_cancels_active_dca(self, dca_db):
+        dca.create_dca_plan(30)
+        d = {"decision": "sell", "percentage": 50, "reason": "sell now"}
+        result = dca.apply_dca(d)
         assert "DCA cancelled" in result["reason"]
+        assert dca.active_dca_plans() == []
 
-    def test_new_dca_sequence(self, dca_state_file):
-        with patch.object(config, "DCA_STATE_FILE", dca_state_file), \
-             patch.object(config, "DCA_ENABLED", True), \
-             patch.object(config, "DCA_SPLITS", 3):
+    def test_new_dca_sequence(self, dca_db):
+        now = datetime(2024, 1, 1, 9, 0)
+        with patch.object(config, "DCA_SPLITS", 3), \
+             patch.object(config, "DCA_INTERVAL_MINUTES", 60):
             d = {"decision": "buy", "percentage": 30, "reason": "buy signal"}
-            result = dca.apply_dca(d)
+            result = dca.apply_dca(d, now)
         assert result["percentage"] == 10
         assert "DCA tranche 1/3" in result["reason"]
-
-    def test_hold_during_active_dca(self, dca_state_file):
-        with patch.object(config, "DCA_STATE_FILE", dca_state_file), \
-             patch.object(config, "DCA_ENABLED", True):
-            dca.save_dca_state({"active": True, "tranches_remaining": 2,
-                                "original_percentage": 30, "last_tranche_time": None})
-            d = {"decision": "buy", "percentage": 30, "reason": "another buy"}
-            result = dca.apply_dca(d)
+        [plan] = dca.active_dca_plans()
+        assert plan["tranches_done"] == 1
+        assert plan["next_due"] == now + timedelta(minutes=60)
+
+    def test_hold_during_active_dca(self, dca_db):
+        dca.create_dca_plan(30)
+        d = {"decision": "buy", "percentage": 30, "reason": "another buy"}
+        result = dca.apply_dca(d)
         assert result["decision"] == "hold"
         assert "DCA already active" in result["reason"]
 
+    def test_concurrent_plans(self, dca_db):
+        dca.create_dca_plan(30)
+        with patch.object(config, "DCA_MAX_ACTIVE_PLANS", 2):
+            result = dca.apply_dca({"decision": "buy", "percentage": 30, "reason": "more"})
+        assert result["decision"] == "buy"
+        assert len(dca.active_dca_plans()) == 2
+
+
+class TestCheckPendingDca:
+    T0 = datetime(2024, 1, 1, 9, 0)
+
+    def status(self, ask=50_000_000, avg=0):
+        return json.dumps({"orderbook": {"orderbook_units": [{"ask_price": ask}]},
+                           "btc_avg_buy_price": avg, "krw_balance": 10_000_000,
+                           "btc_balance": 0})
+
+    def test_executes_only_due_plans(self, dca_db):
+        due = dca.create_dca_plan(30, splits=3, start=self.T0)
+        dca.create_dca_plan(20, splits=2, start=self.T0 + timedelta(hours=1))
+        with patch("trading.market.get_current_status", return_value=self.status()), \
+             patch.object(dca, "execute_buy", return_value=["u1"]) as buy, \
+             patch.object(dca, "save_decision_to_db") as save:
+            dca.check_pending_dca(self.T0)
+        buy.assert_called_once_with(10)
+        assert save.call_args[0][2] == ["u1"]
+        plans = {p["id"]: p for p in dca.active_dca_plans()}
+        assert plans[due["id"]]["tranches_done"] == 1
+
+    def test_later_tranches_see_spent_balance(self, dca_db):
+        first = dca.create_dca_plan(30, splits=3, start=self.T0)
+        second = dca.create_dca_plan(30, splits=3, start=self.T0)
+        wallet = MagicMock()
+        wallet.balance.return_value = 40_000  # after the first tranche: 10% = 4,000 KRW
+        with patch("trading.market.get_current_status", return_value=self.status()), \
+             patch.object(dca, "get_account", return_value=wallet), \
+             patch.object(dca, "execute_buy", return_value=["u1"]) as buy, \
+             patch.object(dca, "save_decision_to_db"):
+            dca.check_pending_dca(self.T0)
+        buy.assert_called_once_with(10)
+        wallet.balance.assert_called_once_with("KRW")
+        plans = {p["id"]: p for p in dca.active_dca_plans()}
+        assert plans[first["id"]]["tranches_done"] == 1
+        assert plans[second["id"]]["tranches_done"] == 0  # not consumed by the skip
+        assert plans[second["id"]]["next_due"] == self.T0 + timedelta(minutes=60)
+
+    def test_sub_minimum_tranche_moves_next_due(self, dca_db):
+        plan = dca.create_dca_plan(30, splits=3, interval_minutes=15, start=self.T0)
+        with patch("trading.market.get_current_status", return_value=self.status()), \
+             patch.object(config, "MIN_ORDER_AMOUNT", 5_000_000), \
+             patch.object(dca, "execute_buy") as buy:
+            dca.check_pending_dca(self.T0)
+            assert dca.next_dca_due() == self.T0 + timedelta(minutes=15)
+            dca.check_pending_dca(self.T0 + timedelta(minutes=1))  # not due again yet
+        buy.assert_not_called()
+        [pending] = dca.active_dca_plans()
+        assert pending["tranches_done"] == 0
+        assert dca.postpone_tranche(dict(plan, tranches_done=1), self.T0) is None
+
+    def test_stop_loss_cancels_plans(self, dca_db):
+        dca.create_dca_plan(30, start=self.T0)
+        with patch("trading.market.get_current_status",
+                   return_value=self.status(ask=40_000_000, avg=50_000_000)), \
+             patch.object(dca, "execute_buy") as buy:
+            dca.check_pending_dca(self.T0)
+        buy.assert_not_called()
+        assert dca.active_dca_plans() == []
+
 
 # ---------------------------------------------------------------------------
 # Execution functions
 # ---------------------------------------------------------------------------
+def mock_exchange_account(krw=0.0, btc=0.0):
+    """A mocked Upbit client wired into execution and the account cache."""
+    mock_upbit = MagicMock()
+    mock_upbit.get_balances.return_value = [
+        {"currency": "KRW", "balance": str(krw), "locked": "0", "avg_buy_price": "0"},
+        {"currency": "BTC", "balance": str(btc), "locked": "0", "avg_buy_price": "50000000"},
+    ]
+    execution.upbit = mock_upbit
+    account.set_upbit(mock_upbit)
+    return mock_upbit
+
+
 class TestExecuteBuy:
     def test_buy_above_minimum(self):
-        mock_upbit = MagicMock()
-        mock_upbit.get_balance.return_value = 10000000
+        mock_upbit = mock_exchange_account(krw=10000000)
         mock_upbit.buy_market_order.return_value = {"uuid": "test"}
-        execution.upbit = mock_upbit
         execution.execute_buy(30)
         mock_upbit.buy_market_order.assert_called_once()
 
     def test_buy_below_minimum(self):
-        mock_upbit = MagicMock()
-        mock_upbit.get_balance.return_value = 1000
-        execution.upbit = mock_upbit
+        mock_upbit = mock_exchange_account(krw=1000)
         execution.execute_buy(30)
         mock_upbit.buy_market_order.assert_not_called()
 
 
 class TestExecuteSell:
     def test_sell_above_minimum(self):
-        mock_upbit = MagicMock()
-        mock_upbit.get_balance.return_value = 0.1
+        mock_upbit = mock_exchange_account(btc=0.1)
         mock_upbit.sell_market_order.return_value = {"uuid": "test"}
-        execution.upbit = mock_upbit
         mock_orderbook = {"orderbook_units": [{"ask_price": 50000000}]}
         with patch("trading.execution.pyupbit.get_orderbook", return_value=mock_orderbook):
             execution.execute_sell(50)
         mock_upbit.sell_market_order.assert_called_once()
 
     def test_sell_below_minimum(self):
-        mock_upbit = MagicMock()
-        mock_upbit.get_balance.return_value = 0.00001
-        execution.upbit = mock_upbit
+        mock_upbit = mock_exchange_account(btc=0.00001)
         mock_orderbook = {"orderbook_units": [{"ask_price": 50000000}]}
         with patch("trading.execution.pyupbit.get_orderbook", return_value=mock_orderbook):
             execution.execute_sell(50)
         mock_upbit.sell_market_order.assert_not_called()
 
 
+class TestAccountCache:
+    def test_one_balances_call_per_ttl(self):
+        clock = FakeClock()
+        mock_upbit = mock_exchange_account(krw=10_000_000, btc=0.5)
+        cache = account.AccountCache(mock_upbit, ttl=60, clock=clock)
+        assert cache.balance("KRW") == 10_000_000
+        assert cache.balance("BTC") == 0.5 and cache.avg_buy_price("BTC") == 50_000_000
+        assert cache.snapshot()["KRW"]["locked"] == 0
+        assert mock_upbit.get_balances.call_count == 1
+        clock.now += 61
+        cache.balance("KRW")
+        assert mock_upbit.get_balances.call_count == 2
+        assert cache.stats["hits"] == 3
+
+    def test_order_reserves_funds_locally(self):
+        mock_upbit = mock_exchange_account(krw=10_000_000, btc=0.5)
+        cache = account.AccountCache(mock_upbit, ttl=60, clock=FakeClock())
+        cache.balance("KRW")
+        cache.on_order({"uuid": "b1", "side": "bid", "price": "3000000", "reserved_fee": "1500"})
+        cache.on_order({"uuid": "s1", "side": "ask", "volume": "0.2", "locked": "0.2"})
+        assert cache.balance("KRW") == pytest.approx(6_998_500)
+        assert cache.balance("BTC") == pytest.approx(0.3)
+        assert cache.snapshot()["BTC"]["locked"] == pytest.approx(0.2)
+        assert set(cache.orders) == {"b1", "s1"}
+        assert mock_upbit.get_balances.call_count == 1
+
+    def test_fill_invalidates(self):
+        mock_upbit = mock_exchange_account(krw=10_000_000)
+        cache = account.AccountCache(mock_upbit, ttl=60, clock=FakeClock())
+        cache.balance("KRW")
+        cache.on_fill({"uuid": "b1", "state": "done", "trades": [{"volume": "0.01"}]})
+        cache.balance("KRW")
+        assert mock_upbit.get_balances.call_count == 2
+        assert cache.orders["b1"]["state"] == "done"
+
+    def test_bad_response_raises_and_status_degrades(self):
+        mock_upbit = mock_exchange_account()
+        mock_upbit.get_balances.return_value = {"error": {"name": "too_many_requests"}}
+        with patch("trading.market.pyupbit.get_orderbook", return_value=None):
+            status = json.loads(market.get_current_status())
+        assert status["krw_balance"] == 0 and status["btc_balance"] == 0
+
+    def test_cycle_reuses_status_balances(self):
+        mock_upbit = mock_exchange_account(krw=10_000_000, btc=0.1)
+        mock_upbit.buy_market_order.return_value = {"uuid": "b1", "side": "bid",
+                                                    "price": "2998500", "reserved_fee": "1499"}
+        with patch("trading.market.pyupbit.get_orderbook", return_value=None):
+            status = json.loads(market.get_current_status())
+        execution.execute_buy(30)
+        execution.execute_sell(50, price=50_000_000)
+        assert status["krw_balance"] == 10_000_000
+        assert mock_upbit.get_balances.call_count == 1
+        mock_upbit.get_balance.assert_not_called()
+        assert account.get_account().balance("KRW") == pytest.approx(10_000_000 - 2998500 - 1499)
+
+
+class FakeExchange:
+    """Local order book that market orders consume; ``drift`` moves prices per read."""
+
+    def __init__(self, mid=100_000_000, levels=15, size=0.2, step=10_000, drift=0.0):
+        self.asks = [[mid + step * (i + 1), size] for i in range(levels)]
+        self.bids = [[mid - step * (i + 1), size] for i in range(levels)]
+        self.drift = drift
+        self.orders = {}
+        self.reads = 0
+
+    def get_orderbook(self, market):
+        if self.reads:
+            for level in self.asks + self.bids:
+                level[0] *= 1 + self.drift
+        self.reads += 1
+        return {"market": market, "orderbook_units": [
+            {"ask_price": a[0], "ask_size": a[1], "bid_price": b[0], "bid_size": b[1]}
+            for a, b in zip(self.asks, self.bids)]}
+
+    def _take(self, levels, amount, in_krw):
+        trades = []
+        for level in levels:
+            if amount <= 1e-12 or level[1] <= 0:
+                continue
+            volume = min(level[1], amount / level[0] if in_krw else amount)
+            level[1] -= volume
+            amount -= volume * level[0] if in_krw else volume
+            trades.append({"price": level[0], "volume": volume, "funds": volume * level[0]})
+        uuid = f"00000000-0000-0000-0000-{len(self.orders):012d}"
+        self.orders[uuid] = {"uuid": uuid, "trades": trades}
+        return {"uuid": uuid}
+
+    def buy_market_order(self, market, amount_krw):
+        return self._take(self.asks, amount_krw, in_krw=True)
+
+    def sell_market_order(self, market, volume):
+        return self._take(self.bids, volume, in_krw=False)
+
+    def get_order(self, uuid):
+        return self.orders[uuid]
+
+    known_order = get_order  # fills are instant here
+
+
+class TestOrderSlicer:
+    def make(self, exchange, **kwargs):
+        sleeps = []
+        kwargs = {"window": 60, "max_children": 6, "child_slippage": 0.0002,
+                  "budget": 0.003, "sleep": sleeps.append, **kwargs}
+        return execution.OrderSlicer(exchange, **kwargs), sleeps
+
+    def test_slices_beat_single_market_order(self):
+        single = FakeExchange()
+        single.get_orderbook("KRW-BTC")
+        order = single.buy_market_order("KRW-BTC", 150_000_000)
+        trades = single.get_order(order["uuid"])["trades"]
+        single_avg = sum(t["funds"] for t in trades) / sum(t["volume"] for t in trades)
+
+        slicer, sleeps = self.make(FakeExchange(levels=15), max_children=6)
+        report = slicer.execute("buy", 150_000_000)
+        assert report["status"] == "filled"
+        assert report["notional"] == pytest.approx(150_000_000)
+        assert len(report["children"]) == 6 and all(c["confirmed"] for c in report["children"])
+        assert sleeps == [10.0] * 5
+        assert report["arrival_price"] == 100_010_000
+        assert report["avg_price"] < single_avg
+        assert report["slippage_pct"] == pytest.approx(
+            report["avg_price"] / report["arrival_price"] - 1)
+
+    def test_children_capped_by_depth(self):
+        fresh = orderbook.Orderbook.from_dict(FakeExchange().get_orderbook("KRW-BTC"))
+        slicer, _ = self.make(FakeExchange(), child_slippage=0.00001, max_children=4)
+        report = slicer.execute("sell", 1.0)
+        sizes = [c["size"] for c in report["children"]]
+        assert sizes[0] == pytest.approx(fresh.capacity("sell", 0.00001))
+        assert sizes[0] < 0.25  # below the TWAP share
+        assert report["executed"] == pytest.approx(1.0)  # last child sends the rest
+
+    def test_stops_when_price_runs_past_budget(self):
+        slicer, _ = self.make(FakeExchange(drift=0.002), budget=0.003)
+        report = slicer.execute("buy", 300_000_000)
+        assert report["status"] == "budget"
+        assert 0 < report["executed"] < 300_000_000
+        assert report["remaining"] == pytest.approx(300_000_000 - report["executed"])
+        assert report["slippage_pct"] <= 0.003
+
+    def test_thin_depth_skips_slice_instead_of_oversizing(self):
+        exchange = FakeExchange(size=0.00001)  # 1,000 KRW per level
+        slicer, _ = self.make(exchange, max_children=3)
+        report = slicer.execute("sell", 0.001)
+        # two slices find < 5,000 KRW within the child cap and wait; the last
+        # takes only what the budget allows (all 15 levels)
+        assert [c["size"] for c in report["children"]] == [pytest.approx(0.00015)]
+        assert report["remaining"] == pytest.approx(0.00085)
+
+    def test_sub_minimum_remainder_rides_with_child(self):
+        slicer, _ = self.make(FakeExchange(), max_children=2)
+        with patch.object(config, "MIN_ORDER_AMOUNT", 5000):
+            report = slicer.execute("buy", 9000)
+        assert [c["size"] for c in report["children"]] == [9000]
+        assert report["remaining"] == 0 and report["status"] == "filled"
+
+    def test_unconfirmed_children_use_book_estimate(self):
+        exchange = FakeExchange()
+        exchange.known_order = lambda uuid: {"uuid": uuid}  # tracker has not seen it yet
+        slicer, _ = self.make(exchange, max_children=2)
+        report = slicer.execute("buy", 20_000_000)
+        assert not any(c["confirmed"] for c in report["children"])
+        assert report["notional"] == pytest.approx(20_000_000)
+
+    def test_order_failure_reported(self):
+        exchange = FakeExchange()
+        exchange.sell_market_order = MagicMock(return_value=None)
+        slicer, _ = self.make(exchange)
+        report = slicer.execute("sell", 1.0)
+        assert report["status"] == "error" and report["executed"] == 0
+
+    def test_execute_buy_slices_large_orders(self):
+        mock_upbit = mock_exchange_account(krw=1_000_000_000)
+        with patch.object(execution, "slice_order") as mock_slice:
+            execution.execute_buy(10)
+        mock_slice.assert_called_once_with("buy", pytest.approx(100_000_000 * config.FEE_RATE))
+        mock_upbit.buy_market_order.assert_not_called()
+        with patch.object(config, "SLICING_ENABLED", False):
+            execution.execute_buy(10)
+        mock_upbit.buy_market_order.assert_called_once()
+
+    def test_urgent_sell_skips_window(self):
+        mock_upbit = mock_exchange_account(btc=1.0)
+        book = {"orderbook_units": [{"ask_price": 100_000_000}]}
+        with patch("trading.execution.pyupbit.get_orderbook", return_value=book), \
+             patch.object(execution.OrderSlicer, "execute") as mock_execute, \
+             patch.object(execution.OrderSlicer, "__init__", return_value=None) as mock_init:
+            execution.execute_sell(100, urgent=True)
+        assert mock_init.call_args.kwargs["window"] == 0
+        mock_execute.assert_called_once_with("sell", 1.0)
+
+
 # ---------------------------------------------------------------------------
 # Chart generation
 # ---------------------------------------------------------------------------
 class TestGenerateChartImage:
+    @pytest.fixture(autouse=True)
+    def chart_env(self, tmp_path):
+        charts.clear_cache()
+        with patch.object(config, "SCREENSHOT_PATH", str(tmp_path / "chart.png")):
+            yield
+        charts.clear_cache()
+
     def test_generates_base64(self, sample_ohlcv_df):
         df = indicators.add_indicators(sample_ohlcv_df)
         result = market.generate_chart_image(df)
@@ -876,6 +2048,90 @@ class TestGenerateChartImage:
             import base64
             base64.b64decode(result)
 
+    def test_unchanged_frame_not_rerendered(self, sample_ohlcv_df):
+        df = indicators.add_indicators(sample_ohlcv_df)
+        with patch.object(charts, "render_chart", return_value=b"img") as render:
+            assert charts.get_chart(df) == b"img"
+            assert charts.get_chart(df.copy()) == b"img"
+            assert render.call_count == 1
+            df.iloc[-1, df.columns.get_loc("close")] += 1
+            charts.get_chart(df)
+            assert render.call_count == 2
+
+    def test_preset_changes_key(self, sample_ohlcv_df):
+        df = indicators.add_indicators(sample_ohlcv_df)
+        assert (charts.chart_key(df, charts.get_preset("full"))
+                != charts.chart_key(df, charts.get_preset("compact")))
+
+    def test_presets_encode_expected_format(self, sample_ohlcv_df):
+        df = indicators.add_indicators(sample_ohlcv_df)
+        png = charts.render_chart(df, charts.get_preset("full"))
+        jpeg = charts.render_chart(df, charts.get_preset("compact"))
+        assert png.startswith(b"\x89PNG")
+        assert jpeg.startswith(b"\xff\xd8")
+        assert len(jpeg) < len(png)
+
+    def test_unknown_preset(self):
+        with pytest.raises(ValueError):
+            charts.get_preset("nope")
+
+    def test_worker_process(self, sample_ohlcv_df):
+        df = indicators.add_indicators(sample_ohlcv_df)
+        charts.start_renderer()
+        try:
+            assert charts.get_chart(df).startswith(b"\xff\xd8")
+        finally:
+            charts.shutdown_renderer()
+
+
+# ---------------------------------------------------------------------------
+# Concurrent input gathering
+# ---------------------------------------------------------------------------
+class TestGatherSources:
+    def test_runs_concurrently(self):
+        import time
+        slow = lambda: time.sleep(0.2) or "ok"
+        started = time.monotonic()
+        result = gather.gather_sources({n: {"fn": slow} for n in ("a", "b", "c")})
+        assert time.monotonic() - started < 0.5
+        assert result["values"] == {"a": "ok", "b": "ok", "c": "ok"}
+        assert set(result["latency"]) == {"a", "b", "c"}
+
+    def test_failure_uses_fallback(self):
+        def boom():
+            raise RuntimeError("down")
+        result = gather.gather_sources({
+            "news": {"fn": boom, "fallback": "No news"},
+            "status": {"fn": lambda: "{}"},
+        })
+        assert result["values"]["news"] == "No news"
+        assert "RuntimeError" in result["errors"]["news"]
+        assert result["values"]["status"] == "{}"
+
+    def test_timeout_uses_fallback(self):
+        import time
+        result = gather.gather_sources({
+            "slow": {"fn": lambda: time.sleep(1) or "late", "fallback": "fb"},
+            "fast": {"fn": lambda: "ok"},
+        }, timeouts={"slow": 0.1})
+        assert result["values"] == {"slow": "fb", "fast": "ok"}
+        assert "timed out" in result["errors"]["slow"]
+
+    def test_dependent_source(self):
+        result = gather.gather_sources({
+            "market": {"fn": lambda: 21},
+            "chart": {"fn": lambda m: m * 2, "after": "market"},
+        })
+        assert result["values"]["chart"] == 42
+
+    def test_dependent_skipped_when_parent_fails(self):
+        result = gather.gather_sources({
+            "market": {"fn": lambda: 1 / 0},
+            "chart": {"fn": lambda m: m, "after": "market", "fallback": ""},
+        })
+        assert result["values"]["chart"] == ""
+        assert "skipped" in result["errors"]["chart"]
+
 
 # ---------------------------------------------------------------------------
 # Integration-style tests for full flow
@@ -912,6 +2168,47 @@ class TestMakeDecisionAndExecute:
         mock_sell.assert_not_called()
 
 
+class TestMakeDecisionDegradation:
+    @patch.object(at, "save_decision_to_db")
+    @patch.object(at, "execute_buy")
+    @patch.object(at, "analyze_data_with_gpt4", return_value='{"decision":"hold","percentage":0,"reason":"x"}')
+    @patch.object(at, "generate_chart_image", return_value="")
+    @patch.object(at, "get_current_status")
+    @patch.object(at, "fetch_fear_and_greed_index", side_effect=RuntimeError("fng down"))
+    @patch.object(at, "fetch_last_decisions", return_value="No decisions")
+    @patch.object(at, "fetch_and_prepare_data")
+    @patch.object(at, "get_news_data", side_effect=RuntimeError("news down"))
+    def test_optional_source_failure_continues(self, mock_news, mock_data, mock_last, mock_fng,
+                                               mock_status, mock_chart, mock_gpt, mock_buy,
+                                               mock_save, sample_ohlcv_df, sample_market_context):
+        mock_data.return_value = ("data", sample_market_context, sample_ohlcv_df)
+        mock_status.return_value = json.dumps({
+            "orderbook": {"orderbook_units": [{"ask_price": 50000000, "ask_size": 1}]},
+            "btc_balance": 0, "krw_balance": 5000000, "btc_avg_buy_price": 0,
+        })
+        with patch.object(at, "apply_risk_policy", side_effect=lambda d, s, c: d), \
+             patch.object(at, "apply_dca", side_effect=lambda d: d), \
+             patch.object(at, "compute_high_watermark", return_value=0.0):
+            at.make_decision_and_execute()
+        args = mock_gpt.call_args[0]
+        assert args[0] == "No news data available."
+        assert args[3] == "No fear and greed data available."
+        mock_chart.assert_called_once()
+
+    @patch.object(at, "analyze_data_with_gpt4")
+    @patch.object(at, "generate_chart_image", return_value="")
+    @patch.object(at, "get_current_status", return_value="{}")
+    @patch.object(at, "fetch_fear_and_greed_index", return_value="50")
+    @patch.object(at, "fetch_last_decisions", return_value="No decisions")
+    @patch.object(at, "fetch_and_prepare_data", side_effect=ValueError("no ohlcv"))
+    @patch.object(at, "get_news_data", return_value="news")
+    def test_market_failure_aborts(self, mock_news, mock_data, mock_last, mock_fng,
+                                   mock_status, mock_chart, mock_gpt):
+        at.make_decision_and_execute()
+        mock_gpt.assert_not_called()
+        mock_chart.assert_not_called()
+
+
 class TestQuickRiskCheck:
     @patch.object(at, "save_decision_to_db")
     @patch.object(at, "execute_sell")
@@ -940,10 +2237,669 @@ class TestQuickRiskCheck:
         at.quick_risk_check()
         mock_sell.assert_called_once()
 
+    @patch.object(at, "get_current_status")
+    def test_skipped_while_monitor_streams(self, mock_status):
+        clock = FakeClock()
+        monitor = risk_monitor.RiskMonitor(lambda d, t: None, position_loader=lambda: (0.0, 0.0),
+                                           position_state=position.PositionState(), clock=clock)
+        with patch.object(at, "risk_monitor", monitor), \
+             patch.object(config, "RISK_MONITOR_STALE_SECONDS", 60):
+            monitor.on_tick(risk_monitor.Tick(1700000000, 50000000.0))
+            at.quick_risk_check()
+            mock_status.assert_not_called()
+            clock.now += 61  # feed went quiet: polling takes over
+            mock_status.side_effect = RuntimeError("down")
+            at.quick_risk_check()
+            mock_status.assert_called_once()
+
+    def position_status(self, ask, btc=0.1, avg=50_000_000):
+        return json.dumps({
+            "orderbook": {"orderbook_units": [{"ask_price": ask, "ask_size": 1}]},
+            "btc_balance": btc, "krw_balance": 5000000, "btc_avg_buy_price": avg,
+        })
+
+    def test_risk_exit_rechecks_fresh_price(self):
+        stop = {"decision": "sell", "percentage": 100, "reason": "stop"}
+        with patch.object(at, "get_account"), \
+             patch.object(at, "get_current_status") as status, \
+             patch.object(at, "execute_sell", return_value=[]) as sell, \
+             patch.object(at, "save_decision_to_db") as save:
+            status.return_value = self.position_status(49_500_000)  # recovered while waiting
+            assert not at.execute_risk_exit(stop)
+            sell.assert_not_called()
+            status.return_value = self.position_status(45_000_000)
+            assert at.execute_risk_exit(stop)
+        sell.assert_called_once_with(100, urgent=True, price=45_000_000)
+        assert save.call_args[0][0]["reason"].startswith("Stop-loss triggered")
+
+    def test_risk_exit_cancels_inflight_slicing(self):
+        import threading
+        import time
+        exchange = FakeExchange()
+        report = {}
+
+        def sliced_buy():  # an analysis-cycle buy spread over a long window
+            with at.execution_lock:
+                slicer = execution.OrderSlicer(exchange, window=600, max_children=4,
+                                               cancel=execution._slicing_cancelled)
+                report.update(slicer.execute("buy", 100_000_000))
+
+        worker = threading.Thread(target=sliced_buy, daemon=True)
+        worker.start()
+        for _ in range(200):
+            if exchange.orders:
+                break
+            threading.Event().wait(0.01)
+        started = time.monotonic()
+        with patch.object(at, "get_account"), \
+             patch.object(at, "get_current_status", return_value=self.position_status(45_000_000)), \
+             patch.object(at, "execute_sell", return_value=[]) as sell, \
+             patch.object(at, "save_decision_to_db"):
+            assert at.execute_risk_exit({"decision": "sell", "percentage": 100, "reason": "s"})
+        worker.join(5)
+        assert time.monotonic() - started < 5
+        sell.assert_called_once()
+        assert report["status"] == "cancelled" and len(report["children"]) == 1
+        assert not execution._slicing_cancelled.is_set()
+
+    def test_risk_exit_drops_inflight_decision(self):
+        advice = json.dumps({"decision": "buy", "percentage": 30, "reason": "x"})
+        status = self.position_status(45_000_000)
+
+        def analyze(*args):  # a risk exit lands while GPT is thinking
+            at.execute_risk_exit({"decision": "sell", "percentage": 100, "reason": "stop"})
+            return advice
+
+        gathered = {"values": {"news": "", "market": ("{}", {}, None), "last_decisions": "",
+                               "fear_greed": "", "status": status, "chart": ""}, "errors": {}}
+        with patch.object(at, "gather_sources", return_value=gathered), \
+             patch.object(at, "get_account"), \
+             patch.object(at, "get_current_status", return_value=status), \
+             patch.object(at, "record_cycle"), \
+             patch.object(at, "analyze_data_with_gpt4", side_effect=analyze), \
+             patch.object(at, "apply_risk_policy", side_effect=lambda d, *a: d), \
+             patch.object(at, "apply_dca", side_effect=lambda d: d), \
+             patch.object(at, "compute_high_watermark", return_value=0.0), \
+             patch.object(at, "execute_sell", return_value=[]) as sell, \
+             patch.object(at, "execute_buy") as buy, \
+             patch.object(at, "save_decision_to_db") as save:
+            at.make_decision_and_execute()
+        sell.assert_called_once()
+        buy.assert_not_called()
+        assert save.call_count == 1  # only the risk exit
+
+
+class TestRiskMonitorAfterFill:
+    def test_buy_from_flat_is_covered_once_filled(self, tmp_db):
+        mock_upbit = mock_exchange_account(krw=10_000_000)
+        mock_upbit.buy_market_order.return_value = {
+            "uuid": "u1", "side": "bid", "price": "2998500", "reserved_fee": "1499"}
+        client = FakeOrderClient()
+        tracker = orders.OrderTracker(client, db_path=tmp_db, poll_interval=0, timeout=30,
+                                      clock=FakeClock(), on_fill=at.on_order_fill)
+        monitor = risk_monitor.RiskMonitor(MagicMock(), position_state=position.PositionState(),
+                                           refresh_interval=3600, clock=FakeClock())
+        with patch.object(at, "risk_monitor", monitor), patch.object(orders, "_tracker", tracker):
+            monitor.on_tick(risk_monitor.Tick(1700000000, 50_000_000.0))
+            assert monitor.btc_balance == 0
+            execution.execute_buy(30)
+
+            # the exchange executes it; the tracker sees the fill
+            mock_upbit.get_balances.return_value = [
+                {"currency": "KRW", "balance": "7000000", "locked": "0", "avg_buy_price": "0"},
+                {"currency": "BTC", "balance": "0.06", "locked": "0",
+                 "avg_buy_price": "50000000"}]
+            client.orders["u1"] = done_order("u1", 0.06, 50_000_000, 1499)
+            assert tracker.poll_once() == ["u1"]
+            monitor.on_tick(risk_monitor.Tick(1700000001, 50_000_000.0))
+        assert monitor.btc_balance == pytest.approx(0.06)
+        assert monitor.avg_price == 50_000_000
+
+    def test_refresh_bypasses_fresh_cache(self):
+        mock_upbit = mock_exchange_account(krw=10_000_000)
+        account.get_account().balance("KRW")  # cache is fresh
+        mock_upbit.get_balances.return_value = [
+            {"currency": "BTC", "balance": "0.1", "locked": "0", "avg_buy_price": "1"}]
+        assert risk_monitor.fetch_position() == (0.1, 1.0)
+
 
 # ---------------------------------------------------------------------------
 # Backward compatibility tests
 # ---------------------------------------------------------------------------
+# ---------------------------------------------------------------------------
+# Streaming risk monitor
+# ---------------------------------------------------------------------------
+def make_monitor(btc=0.1, avg=50000000, hw=0.0, clock=None):
+    loader = MagicMock(return_value=(btc, avg))
+    trigger = MagicMock()
+    monitor = risk_monitor.RiskMonitor(
+        trigger, position_loader=loader,
+        position_state=position.PositionState(high_watermark=hw),
+        refresh_interval=3600, clock=clock or FakeClock())
+    return monitor, loader, trigger
+
+
+def ticks(prices, start=1700000000, step=1):
+    return [risk_monitor.Tick(start + i * step, float(p)) for i, p in enumerate(prices)]
+
+
+class TestRiskMonitor:
+    def test_stop_loss_fires_once_without_polling(self):
+        monitor, loader, trigger = make_monitor()
+        state = monitor.position_state
+        with patch.object(database, "get_high_watermark",
+                          side_effect=lambda: state.high_watermark):
+            for tick in ticks([50000000, 49500000, 47000000, 46000000, 45000000]):
+                monitor.on_tick(tick)
+        trigger.assert_called_once()
+        risk_decision, tick = trigger.call_args[0]
+        assert risk_decision["decision"] == "sell"
+        assert "Stop-loss" in risk_decision["reason"]
+        assert tick.price == 47000000
+        # One load at start, one reload requested by the trigger
+        assert loader.call_count == 2
+
+    def test_rearms_after_cooldown(self):
+        clock = FakeClock()
+        monitor, _, trigger = make_monitor(clock=clock)
+        monitor.on_tick(risk_monitor.Tick(1700000000, 45000000.0))
+        monitor.on_tick(risk_monitor.Tick(1700000001, 45000000.0))
+        assert trigger.call_count == 1
+        clock.now += config.RISK_MONITOR_COOLDOWN_SECONDS
+        monitor.on_tick(risk_monitor.Tick(1700000400, 45000000.0))
+        assert trigger.call_count == 2
+
+    def test_trailing_stop_uses_streamed_peak(self):
+        monitor, _, trigger = make_monitor(avg=40000000)
+        state = monitor.position_state
+        with patch.object(database, "get_high_watermark",
+                          side_effect=lambda: state.high_watermark), \
+             patch.object(config, "TIERED_TAKE_PROFIT", []):
+            monitor.on_tick(risk_monitor.Tick(1700000000, 50000000.0))
+            assert state.high_watermark == 50000000
+            trigger.assert_not_called()
+            monitor.on_tick(risk_monitor.Tick(
+                1700000001, 50000000 * (1 - config.TRAILING_STOP_PCT)))
+        trigger.assert_called_once()
+        assert "Trailing stop" in trigger.call_args[0][0]["reason"]
+
+    def test_no_position_skips_checks(self):
+        monitor, _, trigger = make_monitor(btc=0.0)
+        with patch.object(risk_monitor, "check_position_risk") as check:
+            monitor.on_tick(risk_monitor.Tick(1700000000, 1.0))
+        check.assert_not_called()
+        trigger.assert_not_called()
+
+    def test_momentum_from_hourly_closes(self):
+        monitor, _, _ = make_monitor(btc=0.0)
+        prices = [100, 101, 102, 103, 104, 110]
+        for tick in ticks(prices, step=3600):
+            monitor.on_tick(tick)
+        assert monitor.momentum == pytest.approx(110 / 100 - 1)
+        monitor.on_tick(risk_monitor.Tick(1700000000 + 5 * 3600 + 60, 120.0))
+        assert monitor.momentum == pytest.approx(120 / 100 - 1)
+
+    def test_seed_closes(self, sample_ohlcv_df):
+        monitor, _, _ = make_monitor()
+        monitor.seed_closes(sample_ohlcv_df)
+        closes = sample_ohlcv_df["close"]
+        assert monitor.momentum == pytest.approx(closes.iloc[-1] / closes.iloc[-6] - 1)
+
+    def test_run_consumes_replay(self, sample_ohlcv_df):
+        monitor, _, _ = make_monitor(btc=0.0)
+
+        def feed():
+            yield from risk_monitor.replay_feed(risk_monitor.candles_to_ticks(sample_ohlcv_df))
+            monitor.stop()
+
+        monitor.run(feed)
+        assert monitor.stats["ticks"] == 4 * len(sample_ohlcv_df)
+        assert monitor.stats["last_price"] == sample_ohlcv_df["close"].iloc[-1]
+
+    def test_replay_paced(self):
+        sleeps = []
+        list(risk_monitor.replay_feed(ticks([1, 2, 3], step=2), speed=2.0,
+                                      sleep=sleeps.append))
+        assert sleeps == [1.0, 1.0]
+
+
+# ---------------------------------------------------------------------------
+# Vectorized risk kernel
+# ---------------------------------------------------------------------------
+def risk_inputs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    avg = np.where(rng.random(n) < 0.7, 50_000_000, 0.0)
+    price = 50_000_000 * (1 + rng.normal(0, 0.08, n))
+    return {
+        "action": rng.integers(0, 3, n), "percentage": rng.uniform(0, 80, n),
+        "price": price, "avg_price": avg, "btc": np.where(avg > 0, 0.1, 0.0),
+        "krw": rng.choice([1_000, 5_000_000], n),
+        "high_watermark": np.maximum(price, avg) * (1 + rng.uniform(0, 0.1, n)),
+        "momentum": rng.normal(0, 0.03, n), "atr": rng.choice([0, 2_000_000], n),
+        "trend": rng.choice(["up", "down", "flat"], n), "rsi": rng.uniform(10, 90, n),
+        "volatility": rng.uniform(0, 0.06, n),
+        "regime": rng.choice(["ranging", "trending_up", "trending_down", "unknown"], n),
+    }
+
+
+class TestRiskKernel:
+    def test_batch_matches_single_bars(self):
+        params = risk.RiskParams.from_config()
+        inputs = risk_inputs(300)
+        batch = risk.evaluate(**inputs, params=params)
+        assert set(batch.exits.rule) == {0, 1, 2, 3}
+        for i in range(300):
+            one = risk.evaluate(**{k: v[i:i + 1] for k, v in inputs.items()}, params=params)
+            assert one.action[0] == batch.action[i]
+            assert one.percentage[0] == batch.percentage[i]
+            assert one.flags[0] == batch.flags[i]
+
+    def test_live_policy_uses_kernel(self, sample_status):
+        ctx = {"trend": "down", "rsi": 75, "momentum": -0.02, "volatility": 0.05,
+               "regime": "trending_up"}
+        with patch.object(decision, "get_last_decision_time", return_value=None), \
+             patch.object(decision, "check_position_risk", return_value=None), \
+             patch.object(decision, "analyze_orderbook_depth",
+                          return_value={"slippage_pct": 0.01}):
+            result = decision.apply_risk_policy(
+                {"decision": "buy", "percentage": 50, "reason": "x"}, sample_status, ctx)
+        sizing = risk.size_orders(risk.BUY, 50, "down", 75, -0.02, 0.05, "trending_up",
+                                  risk.RiskParams.from_config(), slippage=0.01)
+        assert result["percentage"] == sizing.percentage
+        assert result["reason"].startswith("x")
+        for note in ("High slippage", "Downtrend filter", "RSI overbought filter",
+                     "Negative momentum filter", "Regime: trending_up"):
+            assert note in result["reason"]
+
+    def test_exit_priority(self):
+        params = risk.RiskParams.from_config()
+        exits = risk.position_exits(
+            price=[40_000_000, 49_000_000, 65_000_000, 51_000_000],
+            avg_price=50_000_000, btc=0.1,
+            high_watermark=[0, 52_000_000, 0, 0], momentum=[0, 0, 0, 0.01], atr=0,
+            params=params)
+        assert list(exits.rule) == [risk.EXIT_STOP_LOSS, risk.EXIT_NONE,
+                                    risk.EXIT_TAKE_PROFIT, risk.EXIT_NONE]
+        assert exits.percentage[2] == params.take_profit[-1][1]
+        assert exits.high_watermark[2] == 65_000_000
+
+    def test_order_checks(self):
+        params = risk.RiskParams.from_config()
+        codes = risk.order_checks(
+            [risk.BUY, risk.BUY, risk.SELL, risk.SELL, risk.HOLD], [50, 0.001, 50, 0.0001, 0],
+            50_000_000, [0, 0, 0, 0.1, 0], [1_000, 1_000_000, 0, 0, 0], params)
+        assert list(codes) == [risk.INSUFFICIENT_KRW, risk.BELOW_MINIMUM, risk.NO_BTC,
+                               risk.BELOW_MINIMUM, risk.ORDER_OK]
+
+
+# ---------------------------------------------------------------------------
+# Job scheduler
+# ---------------------------------------------------------------------------
+def run_scheduler(sched, seconds):
+    import asyncio
+
+    async def main():
+        asyncio.get_running_loop().call_later(seconds, sched.stop)
+        await sched.run(install_signals=False)
+
+    asyncio.run(main())
+
+
+class TestTriggers:
+    def test_daily_wraps_to_next_day(self):
+        trig = scheduler.DailyAt(["12:01", "00:01"])
+        assert trig.next_after(datetime(2024, 1, 1, 0, 0)) == datetime(2024, 1, 1, 0, 1)
+        assert trig.next_after(datetime(2024, 1, 1, 12, 1)) == datetime(2024, 1, 2, 0, 1)
+
+    def test_every(self):
+        assert scheduler.Every(60).next_after(datetime(2024, 1, 1)) == datetime(2024, 1, 1, 0, 1)
+        with pytest.raises(ValueError):
+            scheduler.Every(0)
+
+
+class TestCatchUp:
+    def make_job(self, policy):
+        job = scheduler.Job("j", lambda: None, scheduler.Every(60), catch_up=policy, grace=30)
+        job.next_run = datetime(2024, 1, 1, 0, 1)
+        return job
+
+    @pytest.mark.parametrize("policy, late, expected", [
+        ("all", 5 * 60, 5),
+        ("coalesce", 5 * 60, 1),
+        ("skip", 5 * 60 + 10, 1),   # last slot within grace
+        ("skip", 5 * 60 + 45, 0),   # every slot missed by more than grace
+    ])
+    def test_policies(self, policy, late, expected):
+        job = self.make_job(policy)
+        job.collect_due(datetime(2024, 1, 1) + timedelta(seconds=late))
+        assert job.pending == expected
+        assert job.next_run == datetime(2024, 1, 1, 0, 6)
+
+    def test_coalesce_while_running(self):
+        job = self.make_job("coalesce")
+        job.running = True
+        job.collect_due(datetime(2024, 1, 1, 0, 3))
+        assert job.pending == 0
+        assert job.stats["missed"] == 3
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            scheduler.Job("j", lambda: None, scheduler.Every(1), catch_up="later")
+
+
+class TestScheduler:
+    def test_no_overlap(self):
+        import threading
+        import time
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def slow():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+
+        sched = scheduler.Scheduler()
+        job = sched.add(scheduler.Job("slow", slow, scheduler.Every(0.01), run_at_start=True))
+        run_scheduler(sched, 0.3)
+        assert peak[0] == 1
+        assert job.stats["runs"] >= 2
+        assert job.stats["missed"] > 0
+
+    def test_risk_holds_back_analysis_but_not_vice_versa(self):
+        import time
+        events = []
+
+        def record(name, duration):
+            def fn():
+                events.append((name, "start", time.monotonic()))
+                time.sleep(duration)
+                events.append((name, "end", time.monotonic()))
+            return fn
+
+        sched = scheduler.Scheduler()
+        sched.add(scheduler.Job("analysis", record("analysis", 0.1), scheduler.Every(60),
+                                priority=scheduler.PRIORITY_ANALYSIS, run_at_start=True))
+        sched.add(scheduler.Job("risk", record("risk", 0.1), scheduler.Every(0.15),
+                                priority=scheduler.PRIORITY_RISK, run_at_start=True))
+        run_scheduler(sched, 0.35)
+        times = {}
+        for n, k, t in events:
+            times.setdefault((n, k), t)
+        # Both due at start: risk runs first, analysis waits for it
+        assert times[("analysis", "start")] >= times[("risk", "end")]
+        # The next risk run starts while analysis is still in progress
+        risk_starts = [t for n, k, t in events if n == "risk" and k == "start"]
+        assert any(times[("analysis", "start")] < t < times[("analysis", "end")]
+                   for t in risk_starts)
+
+    def test_timeout_releases_priority_gate(self):
+        import time
+        ran = []
+        sched = scheduler.Scheduler(shutdown_timeout=1)
+        hung = sched.add(scheduler.Job("risk", lambda: time.sleep(0.3), scheduler.Every(60),
+                                       priority=scheduler.PRIORITY_RISK, timeout=0.05,
+                                       run_at_start=True))
+        sched.add(scheduler.Job("analysis", lambda: ran.append(1), scheduler.Every(60),
+                                run_at_start=True))
+        run_scheduler(sched, 0.2)
+        assert hung.stats["timeouts"] == 1
+        assert ran == [1]
+
+    def test_hung_job_abandoned_on_daemon_thread(self):
+        import threading
+        import time
+        release = threading.Event()
+        sched = scheduler.Scheduler(shutdown_timeout=0.1)
+        job = sched.add(scheduler.Job("hung", release.wait, scheduler.Every(60),
+                                      run_at_start=True))
+        started = time.monotonic()
+        run_scheduler(sched, 0.1)
+        assert time.monotonic() - started < 1
+        [worker] = [t for t in threading.enumerate() if t.name == "job-hung"]
+        assert worker.daemon  # interpreter exit does not wait for it
+        assert not job.running
+        release.set()
+        worker.join(1)
+
+    def test_failures_counted(self):
+        sched = scheduler.Scheduler()
+        job = sched.add(scheduler.Job("bad", MagicMock(side_effect=RuntimeError("x")),
+                                      scheduler.Every(60), run_at_start=True))
+        run_scheduler(sched, 0.1)
+        assert job.stats["failures"] == 1
+
+    def test_sigterm_stops_cleanly(self):
+        import asyncio
+        import signal as _signal
+        sched = scheduler.Scheduler()
+        sched.add(scheduler.Job("kill", lambda: os.kill(os.getpid(), _signal.SIGTERM),
+                                scheduler.Every(60), run_at_start=True))
+        hook = MagicMock()
+        sched.on_stop.append(hook)
+        asyncio.run(asyncio.wait_for(sched.run(), 5))
+        assert sched.stats()["kill"]["runs"] == 1
+        hook.assert_called_once()
+
+    def test_next_due_trigger_follows_its_source(self):
+        clock = FakeClock(0.0)
+        due = {"at": None}
+        runs = []
+        sched = scheduler.Scheduler(now=lambda: datetime(2024, 1, 1) + timedelta(seconds=clock()))
+
+        def advance():
+            runs.append(clock())
+            due["at"] = None
+
+        sched.add(scheduler.Job("dca", advance, scheduler.NextDue(lambda: due["at"], min_gap=1)))
+        job = sched.jobs["dca"]
+        job.refresh(sched.now())
+        assert job.next_run is None
+        due["at"] = datetime(2024, 1, 1, 0, 0, 5)
+        job.refresh(sched.now())
+        assert job.next_run == due["at"]
+        clock.now = 5.0
+        job.collect_due(sched.now())
+        assert job.pending == 1 and job.next_run is None
+        job.pending = 0  # ran, but the due time did not move on
+        job.refresh(sched.now())
+        assert job.next_run == datetime(2024, 1, 1, 0, 0, 6)
+
+    def test_build_scheduler(self):
+        with patch.object(config, "RISK_MONITOR_ENABLED", False), \
+             patch.object(config, "DCA_ENABLED", True):
+            sched = at.build_scheduler()
+        assert list(sched.jobs) == ["quick_risk_check", "dca", "full_analysis"]
+        assert sched.jobs["full_analysis"].run_at_start
+        assert at.cancel_inflight in sched.on_stop
+        with patch.object(config, "RISK_MONITOR_ENABLED", True), \
+             patch.object(config, "QUICK_RISK_CHECK_FALLBACK_MINUTES", 5):
+            job = at.build_scheduler().jobs["quick_risk_check"]
+        assert job.trigger.interval.total_seconds() == 300
+
+
+# ---------------------------------------------------------------------------
+# Orderbook snapshot store
+# ---------------------------------------------------------------------------
+def make_orderbook(ts, mid=100_000_000, levels=15):
+    return {"market": "KRW-BTC", "timestamp": ts, "total_ask_size": 3.5, "total_bid_size": 4.25,
+            "orderbook_units": [{"ask_price": mid + 1000 * (i + 1), "ask_size": 0.125 * (i + 1),
+                                 "bid_price": mid - 1000 * (i + 1), "bid_size": 0.25}
+                                for i in range(levels)]}
+
+
+class TestOrderbookStore:
+    DAY0 = 1_700_000_000_000 - 1_700_000_000_000 % 86_400_000  # UTC midnight
+
+    def test_round_trip_and_fixed_width(self, tmp_path):
+        store = orderbook_store.OrderbookStore(str(tmp_path), depth=10)
+        assert store.append("KRW-BTC", make_orderbook(self.DAY0 + 5, levels=3))
+        [snap] = store.snapshots("KRW-BTC")
+        assert snap["timestamp"] == self.DAY0 + 5
+        assert snap["total_bid_size"] == 4.25
+        assert snap["orderbook_units"] == make_orderbook(0, levels=3)["orderbook_units"]
+        [path] = tmp_path.joinpath("KRW-BTC").glob("*.bin")
+        assert path.stat().st_size == orderbook_store.record_dtype(10).itemsize
+
+    def test_range_read_across_day_partitions(self, tmp_path):
+        store = orderbook_store.OrderbookStore(str(tmp_path))
+        hour = 3_600_000
+        for k in range(72):
+            store.append("KRW-BTC", make_orderbook(self.DAY0 + k * hour))
+        assert len(store.days("KRW-BTC")) == 3
+        records = store.read("KRW-BTC", self.DAY0 + 20 * hour, self.DAY0 + 50 * hour)
+        assert list(records["timestamp"]) == [self.DAY0 + k * hour for k in range(20, 51)]
+        assert len(store.read("KRW-BTC", self.DAY0 + 80 * hour)) == 0
+        assert len(store.read("KRW-BTC")) == 72
+
+    def test_duplicates_and_torn_tail(self, tmp_path):
+        store = orderbook_store.OrderbookStore(str(tmp_path))
+        assert store.append("KRW-BTC", make_orderbook(self.DAY0 + 1))
+        assert not store.append("KRW-BTC", make_orderbook(self.DAY0 + 1))
+        [path] = tmp_path.joinpath("KRW-BTC").glob("*.bin")
+        with open(path, "ab") as f:
+            f.write(b"\x00" * 17)  # crash mid-append
+        reopened = orderbook_store.OrderbookStore(str(tmp_path))
+        assert len(reopened.read("KRW-BTC")) == 1
+        assert not reopened.append("KRW-BTC", make_orderbook(self.DAY0))  # older than stored
+        assert reopened.append("KRW-BTC", make_orderbook(self.DAY0 + 2))
+        assert list(reopened.read("KRW-BTC")["timestamp"]) == [self.DAY0 + 1, self.DAY0 + 2]
+
+    def test_recorder_sample_counts_and_survives_errors(self, tmp_path):
+        books = iter([[make_orderbook(self.DAY0)], make_orderbook(self.DAY0), None])
+        def fetcher(market):
+            book = next(books, RuntimeError("down"))
+            if isinstance(book, Exception):
+                raise book
+            return book
+        recorder = orderbook_store.OrderbookRecorder(
+            orderbook_store.OrderbookStore(str(tmp_path)), interval=1, fetcher=fetcher)
+        results = [recorder.sample() for _ in range(4)]
+        assert results == [True, False, False, False]
+        assert recorder.stats == {"samples": 1, "duplicates": 1, "errors": 2}
+
+    def test_feeds_fill_simulator(self, tmp_path):
+        from trading import fills
+        store = orderbook_store.OrderbookStore(str(tmp_path))
+        for k in range(3):
+            store.append("KRW-BTC", make_orderbook(self.DAY0 + k * 1000))
+        with patch.object(config, "ORDERBOOK_RECORD_MARKET", "KRW-BTC"):
+            sim = fills.make_fill_simulator("recorded", str(tmp_path), latency=0)
+        assert len(sim.depth.snapshots) == 3
+        fill = sim.fill("sell", 1.0, 100_000_000, self.DAY0 + 1500)
+        assert fill.qty == pytest.approx(1.0)
+        assert fill.slippage_pct > 0
+
+
+# ---------------------------------------------------------------------------
+# Order tracking and reconciliation
+# ---------------------------------------------------------------------------
+class FakeOrderClient:
+    def __init__(self):
+        self.orders = {}
+        self.calls = 0
+
+    def get_order(self, uuid):
+        self.calls += 1
+        return self.orders.get(uuid, {"uuid": uuid, "state": "wait", "trades": []})
+
+
+def done_order(uuid, volume, price, fee, side="bid"):
+    return {"uuid": uuid, "side": side, "state": "done", "executed_volume": str(volume),
+            "paid_fee": str(fee), "trades": [{"volume": str(volume), "price": str(price),
+                                              "funds": str(volume * price)}]}
+
+
+class TestOrderTracker:
+    def make(self, tmp_db, clock=None, **kw):
+        client = FakeOrderClient()
+        tracker = orders.OrderTracker(client, db_path=tmp_db, poll_interval=0,
+                                      timeout=30, clock=clock or FakeClock(), **kw)
+        return client, tracker
+
+    def decision_row(self, tmp_db, decision_id):
+        return database.get_repository(tmp_db)._execute(
+            "SELECT fill_status, executed_volume, executed_avg_price, paid_fee "
+            "FROM decisions WHERE id = ?", (decision_id,))[0]
+
+    def test_fill_reconciled_into_decision(self, tmp_db, sample_status):
+        client, tracker = self.make(tmp_db)
+        tracker.track("u1", "bid")
+        with patch.object(config, "DB_PATH", tmp_db):
+            decision_id = database.save_decision_to_db(
+                {"decision": "buy", "percentage": 10, "reason": "t"}, sample_status, ["u1"])
+        assert self.decision_row(tmp_db, decision_id)[0] == "pending"
+
+        assert tracker.poll_once() == []
+        client.orders["u1"] = done_order("u1", 0.01, 50_000_000, 250)
+        assert tracker.poll_once() == ["u1"]
+        status, volume, avg, fee = self.decision_row(tmp_db, decision_id)
+        assert status == "filled"
+        assert volume == pytest.approx(0.01)
+        assert avg == pytest.approx(50_000_000)
+        assert fee == pytest.approx(250)
+        assert tracker.pending == {}
+
+    def test_split_orders_sum_into_one_decision(self, tmp_db, sample_status):
+        client, tracker = self.make(tmp_db)
+        for uuid in ("a", "b"):
+            tracker.track(uuid)
+        client.orders["a"] = done_order("a", 0.01, 50_000_000, 250)
+        client.orders["b"] = done_order("b", 0.03, 50_100_000, 750)
+        with patch.object(config, "DB_PATH", tmp_db):
+            decision_id = database.save_decision_to_db(
+                {"decision": "buy", "percentage": 50}, sample_status, ["a", "b"])
+        tracker.poll_once()
+        _, volume, avg, fee = self.decision_row(tmp_db, decision_id)
+        assert volume == pytest.approx(0.04)
+        assert avg == pytest.approx((0.01 * 50_000_000 + 0.03 * 50_100_000) / 0.04)
+        assert fee == pytest.approx(1000)
+
+    def test_unconfirmed_order_times_out(self, tmp_db):
+        clock = FakeClock()
+        client, tracker = self.make(tmp_db, clock=clock)
+        client.get_order = MagicMock(side_effect=Exception("429"))
+        tracker.track("u1")
+        assert tracker.poll_once() == []
+        clock.now += 31
+        assert tracker.poll_once() == ["u1"]
+        assert tracker.stats["timeouts"] == 1
+        assert database.get_repository(tmp_db).pending_orders() == []
+
+    def test_resume_requeues_pending_orders(self, tmp_db):
+        _, tracker = self.make(tmp_db)
+        tracker.track("u1")
+        client, restarted = self.make(tmp_db)
+        assert restarted.resume() == 1
+        client.orders["u1"] = done_order("u1", 0.01, 50_000_000, 250)
+        assert restarted.poll_once() == ["u1"]
+
+    def test_fill_invalidates_account(self, tmp_db):
+        cache = account.AccountCache(MagicMock(), ttl=60, clock=FakeClock())
+        client, tracker = self.make(tmp_db, on_fill=cache.on_fill)
+        tracker.track("u1")
+        client.orders["u1"] = done_order("u1", 0.01, 50_000_000, 250)
+        tracker.poll_once()
+        assert "u1" in cache.orders
+        assert cache.stats["invalidations"] == 1
+
+    def test_track_order_without_tracker(self):
+        with patch.object(orders, "_tracker", None):
+            assert orders.track_order({"uuid": "u1"}) == "u1"
+            assert orders.track_order({"error": "x"}) is None
+
+    def test_execute_returns_order_uuids(self, tmp_db):
+        mock_exchange_account(krw=1_000_000, btc=0)
+        execution.upbit.buy_market_order.return_value = {"uuid": "u1", "side": "bid"}
+        _, tracker = self.make(tmp_db)
+        with patch.object(orders, "_tracker", tracker):
+            assert execution.execute_buy(50) == ["u1"]
+        assert "u1" in tracker.pending
+        assert execution.execute_buy(0) == []
+
+
 class TestBackwardCompatibility:
     """Ensure backtest.py imports still work through autotrade_v3."""
 
@@ -0,0 +1,319 @@
+"""Unit tests for backtest.py"""
+
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+import pandas as pd
+import numpy as np
+
+with patch.dict(os.environ, {
+    "OPENAI_API_KEY": "test-key",
+    "UPBIT_ACCESS_KEY": "test-access",
+    "UPBIT_SECRET_KEY": "test-secret",
+}):
+    with patch("pyupbit.Upbit"), patch("openai.OpenAI"):
+        import backtest as bt
+        import config
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+def make_ohlcv(n=400, seed=0, sigma=0.03):
+    rng = np.random.default_rng(seed)
+    close = 50000000 * np.exp(np.cumsum(rng.normal(0, sigma, n)))
+    return pd.DataFrame({
+        "open": close * (1 + rng.normal(0, 0.005, n)),
+        "high": close * 1.02,
+        "low": close * 0.98,
+        "close": close,
+        "volume": rng.random(n) * 10 + 1,
+    }, index=pd.date_range("2022-01-01", periods=n, freq="D"))
+
+
+@pytest.fixture
+def history_df():
+    return bt.add_indicators(make_ohlcv())
+
+
+# ---------------------------------------------------------------------------
+# Vectorized engine
+# ---------------------------------------------------------------------------
+class TestPrecomputeContext:
+    def test_matches_build_context(self, history_df):
+        engine = bt.BacktestEngine(history_df, 10000000)
+        ctx = bt.precompute_context(history_df)
+        for i in range(len(history_df)):
+            expected = engine._build_context(i)
+            for key in ("trend", "regime", "momentum", "rsi", "atr", "adx"):
+                assert ctx[key][i] == expected[key] or (
+                    pd.isna(ctx[key][i]) and pd.isna(expected[key])), (key, i)
+            assert (ctx["volatility"][i] == expected["volatility"]
+                    or (np.isnan(ctx["volatility"][i]) and np.isnan(expected["volatility"])))
+
+    def test_short_frame(self):
+        df = pd.DataFrame({"close": [100.0, 101.0, 99.0]})
+        ctx = bt.precompute_context(df)
+        assert ctx["momentum"][0] == 0.0
+        assert ctx["volatility"][0] == 0.0
+        assert list(ctx["regime"]) == ["ranging"] * 3
+
+
+class TestVectorizedBacktestEngine:
+    @pytest.mark.parametrize("seed", [0, 1, 4, 7])
+    def test_matches_loop_engine(self, seed):
+        df = bt.add_indicators(make_ohlcv(seed=seed))
+        loop = bt.BacktestEngine(df, 10000000)
+        loop.run()
+        vec = bt.VectorizedBacktestEngine(df, 10000000)
+        vec.run()
+        assert loop.trades
+        assert vec.trades == loop.trades
+        assert vec.portfolio_history == loop.portfolio_history
+        assert bt.compute_metrics(vec) == bt.compute_metrics(loop)
+
+    def test_matches_with_trailing_stop_disabled(self, history_df):
+        with patch.object(config, "TRAILING_STOP_ENABLED", False):
+            loop = bt.BacktestEngine(history_df, 10000000)
+            loop.run()
+            vec = bt.VectorizedBacktestEngine(history_df, 10000000)
+            vec.run()
+        assert vec.trades == loop.trades
+
+    def test_risk_params_override_config(self, history_df):
+        params = bt.risk.RiskParams.from_config()._replace(stop_loss_pct=0.02)
+        with patch.object(config, "STOP_LOSS_PCT", 0.02):
+            expected = bt.VectorizedBacktestEngine(history_df, 10000000)
+            expected.run()
+        for engine_cls in (bt.BacktestEngine, bt.VectorizedBacktestEngine):
+            engine = engine_cls(history_df, 10000000, risk_params=params)
+            engine.run()
+            assert engine.trades == expected.trades
+
+    def test_empty_frame(self):
+        engine = bt.VectorizedBacktestEngine(make_ohlcv(0), 10000000)
+        engine.run()
+        assert engine.trades == []
+        assert bt.compute_metrics(engine) == {}
+
+
+# ---------------------------------------------------------------------------
+# Historical data
+# ---------------------------------------------------------------------------
+class TestFetchHistoricalData:
+    def test_served_from_store_offline(self, tmp_path):
+        raw = make_ohlcv(120)
+        store = bt.CandleStore(str(tmp_path), fetcher=lambda *a, **k: None)
+        store.write("KRW-BTC", "day", raw)
+        df = bt.fetch_historical_data(100, store=store, offline=True)
+        assert len(df) == 100
+        assert "RSI_14" in df.columns
+
+    def test_offline_without_data_raises(self, tmp_path):
+        store = bt.CandleStore(str(tmp_path), fetcher=lambda *a, **k: None)
+        with pytest.raises(ValueError):
+            bt.fetch_historical_data(100, store=store, offline=True)
+
+
+# ---------------------------------------------------------------------------
+# GPT-in-the-loop backtest
+# ---------------------------------------------------------------------------
+def make_candles(days=36, seed=1):
+    daily = make_ohlcv(days, seed=seed)
+    daily.index = pd.date_range("2024-01-01 09:00", periods=days, freq="D")
+    hourly = make_ohlcv(days * 24, seed=seed + 1, sigma=0.01)
+    hourly.index = pd.date_range("2024-01-01 09:00", periods=days * 24, freq="h")
+    return daily, hourly
+
+
+def rsi_model(cycle):
+    rsi = cycle.market_ctx["rsi"]
+    if rsi < 45:
+        return {"decision": "buy", "percentage": 30, "reason": "rsi low"}
+    if rsi > 55:
+        return {"decision": "sell", "percentage": 50, "reason": "rsi high"}
+    return {"decision": "hold", "percentage": 0, "reason": ""}
+
+
+class TestLLMBacktest:
+    @pytest.fixture(autouse=True)
+    def llm_env(self):
+        import llm_backtest as lb
+        self.lb = lb
+        with patch.object(config, "DCA_ENABLED", False):
+            yield
+
+    def test_cycle_times_follow_schedule_after_warmup(self):
+        daily, hourly = make_candles()
+        times = self.lb.cycle_times(daily, hourly, ["09:01", "21:01"])
+        assert times[0] == pd.Timestamp("2024-01-31 09:01")
+        assert times[-1] <= hourly.index[-1] + pd.Timedelta(hours=1)
+        assert all(t.strftime("%H:%M") in ("09:01", "21:01") for t in times)
+
+    def test_cycle_uses_closed_candles_only(self):
+        daily, hourly = make_candles()
+        t = pd.Timestamp("2024-02-02 13:01").to_pydatetime()
+        cycle = self.lb.build_cycle(daily, hourly, t)
+        assert len(cycle.df_daily) == 30 and len(cycle.df_hourly) == 24
+        assert cycle.df_hourly.index[-1] == pd.Timestamp("2024-02-02 12:00")
+        assert cycle.df_daily.index[-1] == pd.Timestamp("2024-02-01 09:00")
+
+        future = hourly.copy()
+        future.loc[future.index > pd.Timestamp("2024-02-02 12:00"), "close"] *= 2
+        assert self.lb.build_cycle(daily, future, t).data_json == cycle.data_json
+
+    def test_daily_cache_matches_uncached(self):
+        daily, hourly = make_candles()
+        cache = {}
+        times = self.lb.cycle_times(daily, hourly, ["09:01", "13:01", "21:01"])
+        cached = [self.lb.build_cycle(daily, hourly, t, cache) for t in times]
+        assert len(cache) < len(times)
+        assert [c.data_json for c in cached] == [
+            self.lb.build_cycle(daily, hourly, t).data_json for t in times]
+
+    def test_stub_runs_production_path(self):
+        daily, hourly = make_candles()
+        engine = self.lb.LLMBacktestEngine(daily, hourly, self.lb.StubModelSource(rsi_model),
+                                           10_000_000, workers=1, schedule=["09:01", "21:01"])
+        engine.run()
+        assert len(engine.decisions) == len(engine.times)
+        assert engine.trades
+        assert any("Regime" in d["reason"] or "filter" in d["reason"]
+                   for d in engine.decisions)  # apply_risk_policy ran
+        metrics = bt.compute_metrics(engine, engine.periods_per_year)
+        assert metrics["total_trades"] == len(engine.trades)
+        assert engine.periods_per_year == pytest.approx(730)
+
+    def test_process_pool_matches_serial(self):
+        daily, hourly = make_candles()
+        times = self.lb.cycle_times(daily, hourly, ["09:01", "21:01"])
+        serial = self.lb.build_cycles(daily, hourly, times, workers=1)
+        pooled = self.lb.build_cycles(daily, hourly, times, workers=2)
+        assert [c.data_json for c in pooled] == [c.data_json for c in serial]
+
+    def test_recorded_source_matches_by_time(self, tmp_path):
+        import sqlite3
+        db = str(tmp_path / "decisions.sqlite")
+        with sqlite3.connect(db) as conn:
+            conn.execute("CREATE TABLE decisions (timestamp TEXT, decision TEXT, "
+                         "percentage REAL, reason TEXT)")
+            conn.execute("INSERT INTO decisions VALUES ('2024-02-02 08:01:30', 'buy', 20, 'x')")
+        source = self.lb.RecordedDecisionSource(db)
+        cycle = lambda ts: self.lb.Cycle(pd.Timestamp(ts).to_pydatetime(), 0, "", {}, None, None)
+        assert source.decide(cycle("2024-02-02 08:00")) is None
+        assert '"buy"' in source.decide(cycle("2024-02-02 09:01"))
+        assert source.decide(cycle("2024-02-02 11:01")) is None
+
+
+# ---------------------------------------------------------------------------
+# Fill simulation
+# ---------------------------------------------------------------------------
+def make_book(mid=100_000_000, levels=5, size=0.1, spread=10_000, step=10_000):
+    return {"timestamp": 0, "orderbook_units": [
+        {"ask_price": mid + spread / 2 + i * step, "ask_size": size,
+         "bid_price": mid - spread / 2 - i * step, "bid_size": size}
+        for i in range(levels)]}
+
+
+class TestFillSimulation:
+    @pytest.fixture(autouse=True)
+    def _import(self):
+        from trading import fills
+        self.fills = fills
+
+    def test_walk_book_partial(self):
+        units = make_book()["orderbook_units"]
+        qty, notional, remaining = self.fills.walk_book(units, "sell", 0.25)
+        assert qty == pytest.approx(0.25)
+        assert remaining == 0
+        assert notional == pytest.approx(0.1 * 99_995_000 + 0.1 * 99_985_000 + 0.05 * 99_975_000)
+        qty, _, remaining = self.fills.walk_book(units, "sell", 1.0)
+        assert qty == pytest.approx(0.5)
+        assert remaining == pytest.approx(0.5)
+
+    def test_calibrate_recovers_synthetic_parameters(self):
+        depth = self.fills.SyntheticDepth.calibrate([make_book(levels=8)])
+        assert depth.levels == 8
+        assert depth.spread_bps == pytest.approx(1.0)
+        assert depth.level_step_bps == pytest.approx(1.0)
+        assert depth.level_krw == pytest.approx(10_000_000, rel=0.001)
+        with pytest.raises(ValueError):
+            self.fills.SyntheticDepth.calibrate([{"orderbook_units": []}])
+
+    def test_recorded_depth_rescales_and_picks_latest(self):
+        early, late = make_book(), make_book(size=0.5)
+        late["timestamp"] = 1000
+        depth = self.fills.RecordedDepth([late, early])
+        assert depth.snapshot_at(999) is early
+        assert depth.snapshot_at(5000) is late
+        units = depth.book(50_000_000, 5000)
+        assert (units[0]["ask_price"] + units[0]["bid_price"]) / 2 == pytest.approx(50_000_000)
+        assert units[0]["ask_size"] == 0.5
+
+    def test_recorded_depth_skips_unusable_snapshots(self):
+        one_sided = make_book()
+        one_sided["timestamp"] = 1000
+        for unit in one_sided["orderbook_units"]:
+            unit["bid_price"], unit["bid_size"] = 0, 0
+        empty = {"timestamp": 2000, "orderbook_units": []}
+        depth = self.fills.RecordedDepth([make_book(), one_sided, empty])
+        assert len(depth.snapshots) == 1
+        assert depth.book(50_000_000, 5000)[0]["ask_price"] > 50_000_000
+        with pytest.raises(ValueError):
+            self.fills.RecordedDepth([one_sided, empty])
+
+    def test_latency_interpolates_toward_next_bar(self):
+        sim = self.fills.FillSimulator(self.fills.SyntheticDepth(), latency=3600)
+        assert sim.reference_price(100, 110, 86400) == pytest.approx(100 + 10 / 24)
+        assert sim.reference_price(100, None, None) == 100
+        fill = sim.fill("buy", 1_000_000, 100_000_000, None, 110_000_000, 86400)
+        assert fill.slippage_pct > 10 / 24 / 100
+
+    def test_make_fill_simulator(self, tmp_path):
+        assert self.fills.make_fill_simulator("close") is None
+        path = tmp_path / "books.jsonl"
+        path.write_text("\n".join(json.dumps(make_book(levels=n)) for n in (4, 6, 6)))
+        sim = self.fills.make_fill_simulator("synthetic", str(path), latency=0)
+        assert sim.depth.levels == 6 and sim.latency == 0
+        assert isinstance(self.fills.make_fill_simulator("recorded", str(path)).depth,
+                          self.fills.RecordedDepth)
+        with pytest.raises(ValueError):
+            self.fills.make_fill_simulator("recorded")
+
+    def test_large_capital_pays_slippage(self):
+        df = bt.add_indicators(make_ohlcv(seed=1))
+        sim = self.fills.FillSimulator(self.fills.SyntheticDepth(), latency=0)
+        metrics = {}
+        for capital in (10_000_000, 10_000_000_000):
+            engine = bt.BacktestEngine(df, capital, fill_model=sim)
+            engine.run()
+            metrics[capital] = bt.compute_metrics(engine)
+            first = engine.trades[0]
+            assert first["fill_price"] > first["price"]
+        small, large = metrics[10_000_000], metrics[10_000_000_000]
+        assert 0 < small["avg_slippage"] < 0.0001
+        assert large["avg_slippage"] > 10 * small["avg_slippage"]
+        assert large["partial_fills"] > 0 and small["partial_fills"] == 0
+
+    def test_vectorized_engine_uses_fill_model(self):
+        df = bt.add_indicators(make_ohlcv(seed=4))
+        sim = self.fills.FillSimulator(self.fills.SyntheticDepth(levels=2), latency=1)
+        loop = bt.BacktestEngine(df, 5_000_000_000, fill_model=sim)
+        loop.run()
+        vec = bt.VectorizedBacktestEngine(df, 5_000_000_000, fill_model=sim)
+        vec.run()
+        assert vec.trades == loop.trades
+        assert any(t["partial"] for t in loop.trades)
+
+    def test_paper_account_partial_fill(self):
+        import replay
+        sim = self.fills.FillSimulator(self.fills.SyntheticDepth(levels=1, level_krw=1_000_000),
+                                       latency=0)
+        account = replay.PaperAccount(10_000_000, fill_model=sim)
+        account.buy(50, 100_000_000)
+        trade = account.trades[-1]
+        assert trade["partial"]
+        assert trade["amount_krw"] == pytest.approx(1_000_000)
+        assert account.krw == pytest.approx(9_000_000)
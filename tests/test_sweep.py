@@ -0,0 +1,121 @@
+"""Unit tests for sweep.py"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+import numpy as np
+
+with patch.dict(os.environ, {
+    "OPENAI_API_KEY": "test-key",
+    "UPBIT_ACCESS_KEY": "test-access",
+    "UPBIT_SECRET_KEY": "test-secret",
+}):
+    with patch("pyupbit.Upbit"), patch("openai.OpenAI"):
+        import backtest as bt
+        import config
+        import sweep
+
+from tests.test_backtest import make_ohlcv
+
+
+@pytest.fixture(scope="module")
+def history_df():
+    return bt.add_indicators(make_ohlcv(300))
+
+
+class TestParameterSpace:
+    def test_expand_grid(self):
+        combos = sweep.expand_grid({"STOP_LOSS_PCT": [0.03, 0.05],
+                                    "TRAILING_STOP_PCT": [0.02, 0.03, 0.04]})
+        assert len(combos) == 6
+        assert {"STOP_LOSS_PCT": 0.05, "TRAILING_STOP_PCT": 0.04} in combos
+
+    def test_unknown_parameter(self):
+        with pytest.raises(ValueError):
+            sweep.expand_grid({"NOT_A_SETTING": [1]})
+
+    def test_sample_random_is_seeded(self):
+        space = {"STOP_LOSS_PCT": {"min": 0.02, "max": 0.08},
+                 "TRAILING_STOP_SELL_PCT": [50, 70, 100]}
+        a = sweep.sample_random(space, 5, seed=1)
+        assert a == sweep.sample_random(space, 5, seed=1)
+        assert all(0.02 <= c["STOP_LOSS_PCT"] <= 0.08 for c in a)
+
+    def test_config_overrides_restored(self):
+        original = config.STOP_LOSS_PCT
+        with sweep.config_overrides({"STOP_LOSS_PCT": 0.5}):
+            assert config.STOP_LOSS_PCT == 0.5
+        assert config.STOP_LOSS_PCT == original
+
+
+class TestRunSweep:
+    def test_parallel_matches_serial(self, history_df):
+        combos = sweep.expand_grid({"STOP_LOSS_PCT": [0.03, 0.08],
+                                    "TRAILING_STOP_PCT": [0.02, 0.05]})
+        serial = sweep.run_sweep(history_df, combos, workers=1)
+        parallel = sweep.run_sweep(history_df, combos, workers=2)
+        assert serial == parallel
+
+    def test_results_match_direct_run(self, history_df):
+        params = {"STOP_LOSS_PCT": 0.03}
+        [result] = sweep.run_sweep(history_df, [params], workers=1)
+        with patch.object(config, "STOP_LOSS_PCT", 0.03):
+            engine = bt.BacktestEngine(history_df, config.BACKTEST_INITIAL_KRW)
+            engine.run()
+        assert result == {"params": params, **bt.compute_metrics(engine)}
+
+    def test_ranked_table(self, history_df):
+        combos = sweep.expand_grid({"TRAILING_STOP_PCT": [0.02, 0.03, 0.05]})
+        results = sweep.run_sweep(history_df, combos, workers=1, rank_by="total_return")
+        table = sweep.results_to_frame(results)
+        assert list(table["rank"]) == [1, 2, 3]
+        assert table["total_return"].is_monotonic_decreasing
+        assert "TRAILING_STOP_PCT" in table.columns
+
+
+class TestWalkForward:
+    def test_windows_are_contiguous(self):
+        windows = sweep.walk_forward_windows(200, 90, 30)
+        assert windows == [(0, 90, 120), (30, 120, 150), (60, 150, 180)]
+        assert all(b[1] == a[2] for a, b in zip(windows, windows[1:]))
+
+    def test_train_window_must_cover_warmup(self):
+        with pytest.raises(ValueError):
+            sweep.walk_forward_windows(200, 20, 30)
+
+    def test_test_window_starts_trading_at_boundary(self, history_df):
+        combos = [{"STOP_LOSS_PCT": 0.05}]
+        result = sweep.evaluate_window(history_df, (0, 90, 120), combos,
+                                       config.BACKTEST_INITIAL_KRW)
+        curve = result["portfolio_history"]
+        assert curve[0]["timestamp"] == history_df.index[90]
+        assert curve[-1]["timestamp"] == history_df.index[119]
+
+    def test_parallel_matches_serial_and_stitches(self, history_df):
+        combos = sweep.expand_grid({"STOP_LOSS_PCT": [0.03, 0.08],
+                                    "TRAILING_STOP_PCT": [0.02, 0.05]})
+        serial = sweep.walk_forward(history_df, combos, 90, 30, workers=1)
+        parallel = sweep.walk_forward(history_df, combos, 90, 30, workers=2)
+        assert serial["metrics"] == parallel["metrics"]
+        assert len(serial["windows"]) == 7
+        assert len(serial["equity"]) == 7 * 30
+        timestamps = [h["timestamp"] for h in serial["equity"]]
+        assert timestamps == sorted(timestamps)
+        oos = [w["test_metrics"]["total_return"] for w in serial["windows"]]
+        compounded = np.prod([1 + r for r in oos]) - 1
+        assert serial["metrics"]["total_return"] == pytest.approx(compounded, rel=1e-9)
+
+    def test_walk_forward_uses_fill_model(self):
+        from trading.fills import FillSimulator, SyntheticDepth
+        df = bt.add_indicators(make_ohlcv(300, seed=5))
+        sim = FillSimulator(SyntheticDepth(levels=2), latency=0)
+        combos = [{"STOP_LOSS_PCT": 0.05}]
+        serial = sweep.walk_forward(df, combos, 90, 30, 5_000_000_000, workers=1,
+                                    fill_model=sim)
+        parallel = sweep.walk_forward(df, combos, 90, 30, 5_000_000_000, workers=2,
+                                      fill_model=sim)
+        assert serial["metrics"] == parallel["metrics"]
+        assert serial["trades"] and all("fill_price" in t for t in serial["trades"])
+        close = sweep.walk_forward(df, combos, 90, 30, 5_000_000_000, workers=1)
+        assert serial["metrics"]["total_return"] < close["metrics"]["total_return"]
@@ -5,19 +5,39 @@ from trading.database import (
     initialize_db, migrate_db, save_decision_to_db,
     fetch_last_decisions, get_last_decision_time,
     get_high_watermark, compute_high_watermark,
+    DecisionRepository, get_repository, get_position_state,
 )
-from trading.indicators import add_indicators, detect_support_resistance
+from trading.position import PositionState
+from trading.indicators import (
+    add_indicators, detect_support_resistance, IndicatorState, stream_indicators,
+)
+from trading.candles import CandleStore
 from trading.market import (
     detect_market_regime, build_market_context,
     fetch_and_prepare_data, generate_chart_image, get_current_status,
 )
 from trading.external import get_news_data, fetch_fear_and_greed_index
-from trading.orderbook import analyze_orderbook_depth
+from trading.orderbook import Orderbook, analyze_orderbook_depth
+from trading.orderbook_store import OrderbookStore, OrderbookRecorder
+from trading.fills import FillSimulator, SyntheticDepth, RecordedDepth, make_fill_simulator
 from trading.decision import (
     normalize_decision, apply_volatility_adjustment,
     apply_regime_adjustment, apply_tiered_take_profit,
     apply_risk_policy, check_position_risk,
 )
-from trading.dca import load_dca_state, save_dca_state, apply_dca, execute_dca_tranche, check_pending_dca
-from trading.execution import execute_buy, execute_sell
-from trading.gpt import get_instructions, analyze_data_with_gpt4
+from trading.risk import RiskParams, evaluate as evaluate_risk
+from trading.dca import (
+    apply_dca, execute_dca_tranche, check_pending_dca,
+    active_dca_plans, create_dca_plan, cancel_dca_plans, next_dca_due,
+)
+from trading.account import AccountCache, get_account
+from trading.orders import OrderTracker, track_order
+from trading.execution import execute_buy, execute_sell, OrderSlicer
+from trading.gpt import get_instructions, analyze_data_with_gpt4, analyze_async, cancel_inflight
+from trading.gather import gather_sources
+from trading.transport import Transport, get_transport, install_pyupbit
+from trading.cache import TTLCache
+from trading.charts import get_chart, start_renderer, shutdown_renderer
+from trading.prompt import PromptBuilder, count_tokens
+from trading.llm_cache import ResponseStore, get_store, request_key
+from trading.risk_monitor import RiskMonitor, Tick, replay_feed, candles_to_ticks
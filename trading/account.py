@@ -0,0 +1,115 @@
+"""Cached account state: balances and the orders placed through it.
+
+Private Upbit endpoints have a much tighter quota than quotations, and a
+cycle used to read balances several times (status, then each order).
+``AccountCache`` serves balances from a single ``get_balances`` call until
+``ACCOUNT_CACHE_TTL_SECONDS`` pass.  Placing an order moves its reserved
+KRW/BTC to ``locked`` locally, so the next read needs no API call; a fill
+observed through ``get_order`` invalidates the cache, since only the
+exchange knows the executed amounts net of fees.
+"""
+
+import logging
+import threading
+import time
+
+import config
+from trading.utils import safe_float
+
+logger = logging.getLogger("autotrade")
+
+
+class AccountCache:
+    def __init__(self, client, ttl=None, clock=time.monotonic):
+        self.client = client
+        self.ttl = config.ACCOUNT_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.orders = {}  # uuid -> latest order dict seen
+        self._balances = {}
+        self._expires = 0.0
+        self.stats = {"refreshes": 0, "hits": 0, "local_updates": 0, "invalidations": 0}
+
+    # -- reads -------------------------------------------------------------
+    def refresh(self):
+        """Reload every balance with one ``get_balances`` call."""
+        rows = self.client.get_balances()
+        if not isinstance(rows, list):
+            raise ValueError(f"Unexpected balances response: {rows}")
+        balances = {}
+        for b in rows:
+            balances[b["currency"]] = {
+                "balance": safe_float(b.get("balance")),
+                "locked": safe_float(b.get("locked")),
+                "avg_buy_price": safe_float(b.get("avg_buy_price")),
+            }
+        with self.lock:
+            self._balances = balances
+            self._expires = self.clock() + self.ttl
+            self.stats["refreshes"] += 1
+
+    def _fresh(self):
+        with self.lock:
+            if self.clock() >= self._expires:
+                self.refresh()
+            else:
+                self.stats["hits"] += 1
+            return self._balances
+
+    def balance(self, currency):
+        """Free (unlocked) balance of ``currency``."""
+        return self._fresh().get(currency, {}).get("balance", 0.0)
+
+    def avg_buy_price(self, currency):
+        return self._fresh().get(currency, {}).get("avg_buy_price", 0.0)
+
+    def snapshot(self):
+        """``{currency: {balance, locked, avg_buy_price}}``."""
+        return {c: dict(v) for c, v in self._fresh().items()}
+
+    # -- updates -----------------------------------------------------------
+    def invalidate(self):
+        with self.lock:
+            self._expires = 0.0
+            self.stats["invalidations"] += 1
+
+    def on_order(self, result):
+        """Reserve an order's funds locally from the exchange's order response."""
+        if not isinstance(result, dict) or not result.get("uuid"):
+            return
+        with self.lock:
+            self.orders[result["uuid"]] = result
+            if self.clock() >= self._expires:
+                return  # next read reloads anyway
+            currency = "KRW" if result.get("side") == "bid" else "BTC"
+            locked = safe_float(result.get("locked"))
+            if not locked:  # market buys lock price + fee, market sells the volume
+                locked = (safe_float(result.get("price")) + safe_float(result.get("reserved_fee"))
+                          if currency == "KRW" else safe_float(result.get("volume")))
+            entry = self._balances.setdefault(
+                currency, {"balance": 0.0, "locked": 0.0, "avg_buy_price": 0.0})
+            entry["balance"] = max(0.0, entry["balance"] - locked)
+            entry["locked"] += locked
+            self.stats["local_updates"] += 1
+
+    def on_fill(self, order):
+        """Record an order seen with executions and drop the cached balances."""
+        if isinstance(order, dict) and order.get("uuid"):
+            with self.lock:
+                self.orders[order["uuid"]] = order
+        self.invalidate()
+
+
+_account = None
+
+
+def set_upbit(client):
+    """Bind the account cache to an ``pyupbit.Upbit`` client (None disables it)."""
+    global _account
+    _account = AccountCache(client) if client is not None else None
+
+
+def get_account():
+    if _account is None:
+        raise RuntimeError("Account cache not initialized (set_upbit)")
+    return _account
@@ -0,0 +1,131 @@
+"""TTL response cache with LRU eviction, disk persistence and stale-while-revalidate."""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+logger = logging.getLogger("autotrade")
+
+
+class TTLCache:
+    """Per-source TTL cache for slow-changing feeds.
+
+    ``get_or_fetch`` returns a fresh entry straight from memory.  Once an
+    entry is past its TTL but within the source's max-stale window, the last
+    good value is returned immediately and a single background refresh is
+    started.  Past max-stale (or on a miss) the fetch runs synchronously.
+    Failed fetches are never cached.  Entries are evicted least-recently-used
+    beyond ``max_entries`` and, when ``path`` is set, persisted as JSON so a
+    restart does not refetch.
+    """
+
+    def __init__(self, ttls=None, max_stale=None, max_entries=None, path=None,
+                 clock=time.time):
+        self.ttls = ttls if ttls is not None else config.FEED_CACHE_TTLS
+        self.max_stale = max_stale if max_stale is not None else config.FEED_CACHE_MAX_STALE
+        self.max_entries = max_entries or config.FEED_CACHE_MAX_ENTRIES
+        self.path = path
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._loaded = False
+        self._refreshing = set()
+        self._lock = threading.RLock()
+
+    # -- persistence -------------------------------------------------------
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r") as f:
+                stored = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        except Exception as e:
+            logger.error(f"Error loading feed cache: {e}")
+            return
+        for key, entry in stored.items():
+            self._entries[key] = entry
+        self._evict()
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.error(f"Error saving feed cache: {e}")
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # -- public API --------------------------------------------------------
+    def get(self, key):
+        """Return ``(value, age_seconds)`` for a cached key, or None."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry["value"], self.clock() - entry["stored_at"]
+
+    def set(self, source, key, value):
+        with self._lock:
+            self._load()
+            self._entries[key] = {"source": source, "value": value,
+                                  "stored_at": self.clock()}
+            self._entries.move_to_end(key)
+            self._evict()
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._loaded = True
+            self._save()
+
+    def get_or_fetch(self, source, key, fetch):
+        """Return a cached value for ``key`` or call ``fetch()`` to refresh it."""
+        ttl = self.ttls.get(source, 0)
+        max_stale = self.max_stale.get(source, 0)
+        cached = self.get(key)
+        if cached is not None:
+            value, age = cached
+            if age < ttl:
+                return value
+            if age < ttl + max_stale:
+                self._refresh_in_background(source, key, fetch)
+                return value
+
+        value = fetch()
+        self.set(source, key, value)
+        return value
+
+    def _refresh_in_background(self, source, key, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(source, key, fetch())
+            except Exception as e:
+                logger.warning(f"Background refresh of '{key}' failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"refresh-{key}", daemon=True).start()
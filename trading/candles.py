@@ -0,0 +1,226 @@
+"""Persistent on-disk OHLCV candle store with incremental sync."""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyupbit
+
+import config
+
+logger = logging.getLogger("autotrade")
+
+COLUMNS = ("open", "high", "low", "close", "volume", "value")
+PAGE_SIZE = 200  # pyupbit max candles per call
+
+INTERVAL_STEPS = {
+    "day": timedelta(days=1),
+    "days": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "weeks": timedelta(weeks=1),
+    "minute1": timedelta(minutes=1),
+    "minute3": timedelta(minutes=3),
+    "minute5": timedelta(minutes=5),
+    "minute10": timedelta(minutes=10),
+    "minute15": timedelta(minutes=15),
+    "minute30": timedelta(minutes=30),
+    "minute60": timedelta(minutes=60),
+    "minute240": timedelta(minutes=240),
+}
+
+
+def interval_step(interval):
+    """Return the candle duration for a pyupbit interval name."""
+    try:
+        return INTERVAL_STEPS[interval]
+    except KeyError:
+        raise ValueError(f"Unsupported candle interval: {interval}")
+
+
+def _fetch_range(fetcher, market, interval, start, to=None):
+    """Page backwards from ``to`` until a candle at or before ``start`` is seen.
+
+    Returns ``(frame, exhausted)`` where ``exhausted`` is True when the
+    upstream ran out of history before reaching ``start``.
+    """
+    frames = []
+    cursor = to
+    exhausted = False
+    while True:
+        df = fetcher(market, interval=interval, count=PAGE_SIZE, to=cursor)
+        if df is None or df.empty:
+            exhausted = True
+            break
+        frames.append(df)
+        first = df.index[0]
+        if start is not None and first <= start:
+            break
+        if len(df) < PAGE_SIZE:
+            exhausted = True
+            break
+        next_cursor = first.strftime("%Y-%m-%d %H:%M:%S")
+        if next_cursor == cursor:
+            break
+        cursor = next_cursor
+    if not frames:
+        return None, exhausted
+    return pd.concat(frames), exhausted
+
+
+class CandleStore:
+    """Candles per market/interval stored as a memory-mappable NPY file.
+
+    Layout: ``<root>/<market>/<interval>.npy`` holds a structured array of
+    ``timestamp`` (int64 ns) plus the OHLCV columns, sorted by time and
+    deduplicated.  ``<interval>.json`` records the covered time range so
+    sync only requests the missing head or tail from the exchange.
+    """
+
+    def __init__(self, root=None, fetcher=None):
+        self.root = root or config.CANDLE_STORE_DIR
+        self.fetcher = fetcher or pyupbit.get_ohlcv
+
+    # -- paths -------------------------------------------------------------
+    def _paths(self, market, interval):
+        base = os.path.join(self.root, market)
+        return (os.path.join(base, f"{interval}.npy"),
+                os.path.join(base, f"{interval}.json"))
+
+    def _read_meta(self, market, interval):
+        _, meta_path = self._paths(market, interval)
+        try:
+            with open(meta_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _open(self, market, interval):
+        data_path, _ = self._paths(market, interval)
+        if not os.path.exists(data_path):
+            return None
+        return np.load(data_path, mmap_mode="r")
+
+    # -- reads -------------------------------------------------------------
+    def coverage(self, market, interval):
+        """Return ``(start, end)`` timestamps held for a market, or None."""
+        meta = self._read_meta(market, interval)
+        if not meta or meta.get("start") is None:
+            return None
+        return pd.Timestamp(meta["start"]), pd.Timestamp(meta["end"])
+
+    def count(self, market, interval):
+        """Return the number of stored candles."""
+        data = self._open(market, interval)
+        return 0 if data is None else len(data)
+
+    def load(self, market, interval, start=None, end=None):
+        """Return candles in ``[start, end]`` without reading the whole file."""
+        data = self._open(market, interval)
+        if data is None or len(data) == 0:
+            return pd.DataFrame(columns=list(COLUMNS))
+        ts = data["timestamp"]
+        lo = 0 if start is None else int(np.searchsorted(ts, pd.Timestamp(start).value, "left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, pd.Timestamp(end).value, "right"))
+        return self._to_frame(data[lo:hi])
+
+    def tail(self, market, interval, count):
+        """Return the most recent ``count`` candles."""
+        data = self._open(market, interval)
+        if data is None or len(data) == 0 or count <= 0:
+            return pd.DataFrame(columns=list(COLUMNS))
+        return self._to_frame(data[-count:])
+
+    @staticmethod
+    def _to_frame(records):
+        records = np.array(records)
+        index = pd.DatetimeIndex(records["timestamp"].astype("datetime64[ns]"))
+        columns = [c for c in records.dtype.names if c != "timestamp"]
+        return pd.DataFrame({c: records[c] for c in columns}, index=index)
+
+    # -- writes ------------------------------------------------------------
+    def write(self, market, interval, df, start=None, end=None, head_exhausted=None):
+        """Merge ``df`` into the store, replacing overlapping candles.
+
+        ``start``/``end`` extend the recorded coverage beyond the candles
+        themselves (e.g. a fetched range that contained no trades).
+        """
+        existing = self.load(market, interval)
+        if df is not None and not df.empty:
+            df = df[[c for c in COLUMNS if c in df.columns]].astype(float)
+            df.index = pd.DatetimeIndex(df.index).as_unit("ns")
+            merged = pd.concat([existing, df]) if not existing.empty else df
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        else:
+            merged = existing
+
+        columns = [c for c in COLUMNS if c in merged.columns]
+        dtype = [("timestamp", "<i8")] + [(c, "<f8") for c in columns]
+        records = np.empty(len(merged), dtype=dtype)
+        records["timestamp"] = pd.DatetimeIndex(merged.index).as_unit("ns").asi8
+        for c in columns:
+            records[c] = merged[c].to_numpy(dtype=float)
+
+        meta = self._read_meta(market, interval) or {}
+        bounds = [pd.Timestamp(t) for t in (meta.get("start"), meta.get("end"), start, end)
+                  if t is not None]
+        if len(merged):
+            bounds += [merged.index[0], merged.index[-1]]
+        meta.update({
+            "start": min(bounds).isoformat() if bounds else None,
+            "end": max(bounds).isoformat() if bounds else None,
+            "rows": len(records),
+            "columns": columns,
+            "updated_at": datetime.now().isoformat(),
+        })
+        if head_exhausted is not None:
+            meta["head_exhausted"] = head_exhausted
+
+        data_path, meta_path = self._paths(market, interval)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        tmp = data_path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, records)
+        os.replace(tmp, data_path)
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+        return len(records)
+
+    def sync(self, market, interval, start, end=None):
+        """Fetch only the candles missing from ``[start, end]`` (end=now).
+
+        Returns the number of rows added to the store.
+        """
+        start = pd.Timestamp(start)
+        before = self.count(market, interval)
+        covered = self.coverage(market, interval)
+        meta = self._read_meta(market, interval) or {}
+        to = None if end is None else pd.Timestamp(end).strftime("%Y-%m-%d %H:%M:%S")
+
+        if covered is None:
+            df, exhausted = _fetch_range(self.fetcher, market, interval, start, to)
+            self.write(market, interval, df, start=None if exhausted else start,
+                       head_exhausted=exhausted)
+            return self.count(market, interval) - before
+
+        have_start, have_end = covered
+        # Tail: re-fetch from the last stored candle, which may have been open
+        tail_needed = end is None or pd.Timestamp(end) > have_end
+        if tail_needed:
+            df, _ = _fetch_range(self.fetcher, market, interval, have_end, to)
+            self.write(market, interval, df)
+
+        # Head: older history than we have, unless the listing date was reached
+        if start < have_start and not meta.get("head_exhausted"):
+            head_to = have_start.strftime("%Y-%m-%d %H:%M:%S")
+            df, exhausted = _fetch_range(self.fetcher, market, interval, start, head_to)
+            self.write(market, interval, df, start=None if exhausted else start,
+                       head_exhausted=exhausted)
+
+        added = self.count(market, interval) - before
+        logger.info(f"Candle store sync {market}/{interval}: +{added} rows")
+        return added
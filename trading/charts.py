@@ -0,0 +1,188 @@
+"""Chart rendering in a pre-warmed worker process, with content-hash caching.
+
+Rendering is CPU-bound matplotlib work, so it runs in a single background
+process whose backend and fonts are loaded once at start-up.  Images are
+cached by a hash of the plotted data and the active preset: an unchanged
+frame is never re-rendered.  Until ``start_renderer`` is called (tests,
+one-off scripts) charts are rendered in-process.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import pandas as pd
+
+import config
+
+logger = logging.getLogger("autotrade")
+
+CHART_COLUMNS = [
+    "open", "high", "low", "close", "volume",
+    "Upper_Band", "Lower_Band", "Middle_Band", "SMA_10", "EMA_10",
+    "MACD", "Signal_Line", "MACD_Histogram", "RSI_14",
+]
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg"}
+
+
+def get_preset(name=None):
+    """Return the render preset ``name`` (default ``config.CHART_PRESET``)."""
+    name = name or config.CHART_PRESET
+    try:
+        return config.CHART_PRESETS[name]
+    except KeyError:
+        raise ValueError(f"Unknown chart preset: {name}") from None
+
+
+def image_mime(preset=None):
+    return MIME_TYPES[get_preset(preset)["format"]]
+
+
+def chart_key(df, preset):
+    """Hash of the plotted columns, index and render settings."""
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df[CHART_COLUMNS], index=True).values.tobytes())
+    digest.update(json.dumps(preset, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def render_chart(df, preset):
+    """Render the hourly candlestick/BB/MACD/RSI chart and return image bytes."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import mplfinance as mpf
+
+    df = df.copy()
+    df.index = pd.to_datetime(df.index)
+
+    hist = df["MACD_Histogram"]
+    rsi_70 = pd.Series(70.0, index=df.index)
+    rsi_30 = pd.Series(30.0, index=df.index)
+    hist_colors = ["#26a69a" if v >= 0 else "#ef5350" for v in hist.fillna(0)]
+
+    apds = [
+        mpf.make_addplot(df["Upper_Band"], color="steelblue", linestyle="dashed", width=0.7),
+        mpf.make_addplot(df["Lower_Band"], color="steelblue", linestyle="dashed", width=0.7),
+        mpf.make_addplot(df["Middle_Band"], color="steelblue", width=0.5, alpha=0.5),
+        mpf.make_addplot(df["SMA_10"], color="orange", width=0.8),
+        mpf.make_addplot(df["EMA_10"], color="cyan", width=0.8),
+        mpf.make_addplot(df["MACD"], panel=2, color="blue", ylabel="MACD"),
+        mpf.make_addplot(df["Signal_Line"], panel=2, color="orange"),
+        mpf.make_addplot(hist, panel=2, type="bar", color=hist_colors),
+        mpf.make_addplot(df["RSI_14"], panel=3, color="purple", ylabel="RSI"),
+        mpf.make_addplot(rsi_70, panel=3, color="red", linestyle="--", width=0.5, alpha=0.5),
+        mpf.make_addplot(rsi_30, panel=3, color="green", linestyle="--", width=0.5, alpha=0.5),
+    ]
+
+    fig, _ = mpf.plot(
+        df, type="candle", style="charles",
+        addplot=apds, volume=True,
+        title="KRW-BTC 1H Chart",
+        figratio=(16, 10), figscale=preset["figscale"],
+        panel_ratios=(4, 1, 1, 1),
+        returnfig=True,
+    )
+
+    buf = BytesIO()
+    save_kwargs = {}
+    if preset["format"] == "jpeg":
+        save_kwargs["pil_kwargs"] = {"quality": preset.get("quality", 75), "optimize": True}
+    else:
+        save_kwargs["pil_kwargs"] = {"optimize": True}
+    fig.savefig(buf, format=preset["format"], dpi=preset["dpi"],
+                bbox_inches="tight", **save_kwargs)
+    plt.close(fig)
+    return buf.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------------------
+def _warm_worker():
+    """Load the backend, fonts and mplfinance styles once per worker."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import mplfinance  # noqa: F401
+    fig = plt.figure()
+    fig.text(0.5, 0.5, "warm-up")
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _ping():
+    return os.getpid()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def start_renderer():
+    """Start the render worker and wait until it is warmed up."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=1, initializer=_warm_worker)
+            pid = _pool.submit(_ping).result()
+            logger.info(f"Chart renderer ready (pid {pid})")
+    return _pool
+
+
+def shutdown_renderer():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _render(df, preset):
+    pool = _pool
+    if pool is None:
+        return render_chart(df, preset)
+    try:
+        return pool.submit(render_chart, df, preset).result()
+    except BrokenProcessPool:
+        logger.warning("Chart renderer crashed; restarting")
+        shutdown_renderer()
+        start_renderer()
+        return render_chart(df, preset)
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def get_chart(df, preset_name=None):
+    """Return image bytes for ``df``, rendering only on a cache miss."""
+    preset = get_preset(preset_name)
+    key = chart_key(df, preset)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            logger.info("Chart served from cache")
+            return _cache[key]
+
+    image = _render(df[CHART_COLUMNS], preset)
+
+    with _cache_lock:
+        _cache[key] = image
+        while len(_cache) > config.CHART_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return image
@@ -1,21 +1,120 @@
-"""Database operations for persisting trading decisions."""
+"""Database operations for persisting trading decisions.
+
+All access goes through a ``DecisionRepository`` that owns one long-lived
+connection per database file, opened in WAL mode so the dashboards can read
+while the bot writes.  The module-level functions keep their original
+signatures and delegate to the shared repository for ``db_path``.
+
+The high watermark and last decision time are served from an in-memory
+``PositionState`` that is rehydrated from the table on first use and updated
+by every save (write-through), so risk checks never touch disk.  Active DCA
+plans are cached the same way; each tranche is a compare-and-set on the
+plan's row, so a crash or a second caller can never run it twice.
+"""
 
 import json
 import logging
 import sqlite3
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 
 import config
 from trading.utils import safe_float
+from trading.position import PositionState
+from trading.prompt import encode_records
 
 logger = logging.getLogger("autotrade")
 
+PRAGMAS = {
+    "journal_mode": "WAL",       # readers never block the writer
+    "synchronous": "NORMAL",     # durable at checkpoints; safe with WAL
+    "busy_timeout": 5000,        # ms to wait on a locked database
+    "temp_store": "MEMORY",
+    "cache_size": -8000,         # KiB
+}
 
-def initialize_db(db_path=None):
-    if db_path is None:
-        db_path = config.DB_PATH
-    with sqlite3.connect(db_path) as conn:
-        conn.execute('''
+ORDERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS orders (
+        uuid TEXT PRIMARY KEY,
+        decision_id INTEGER REFERENCES decisions(id),
+        side TEXT,
+        state TEXT,
+        executed_volume REAL,
+        funds REAL,
+        avg_price REAL,
+        paid_fee REAL,
+        created_at DATETIME,
+        updated_at DATETIME
+    )
+'''
+
+DCA_PLANS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS dca_plans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT,                -- active, done or cancelled
+        percentage REAL,            -- of the KRW balance, over all tranches
+        splits INTEGER,
+        tranches_done INTEGER,
+        interval_minutes REAL,
+        next_due DATETIME,
+        created_at DATETIME,
+        updated_at DATETIME
+    )
+'''
+
+DCA_PLAN_FIELDS = ("id", "percentage", "splits", "tranches_done", "interval_minutes",
+                   "next_due", "created_at")
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Order states that will not change any more
+TERMINAL_ORDER_STATES = ("done", "cancel", "timeout")
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_decisions_timestamp ON decisions(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_decision ON orders(decision_id)",
+    "CREATE INDEX IF NOT EXISTS idx_dca_plans_due ON dca_plans(status, next_due)",
+    # Covers "latest non-null high_watermark" without scanning older rows
+    "CREATE INDEX IF NOT EXISTS idx_decisions_high_watermark "
+    "ON decisions(timestamp, high_watermark) WHERE high_watermark IS NOT NULL",
+)
+
+
+class DecisionRepository:
+    """Owns a single connection to the decisions database."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        for name, value in PRAGMAS.items():
+            self.conn.execute(f"PRAGMA {name}={value}")
+        self._position = None
+        self._dca_plans = None  # id -> active plan dict
+
+    @property
+    def position(self):
+        """The in-memory position state, loaded from the table on first use."""
+        with self.lock:
+            if self._position is None:
+                self._position = PositionState.rehydrate(self)
+            return self._position
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self.lock:
+            with self.conn:
+                self.conn.execute(sql, params)
+
+    def initialize(self):
+        self._write('''
             CREATE TABLE IF NOT EXISTS decisions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp DATETIME,
@@ -28,25 +127,270 @@ def initialize_db(db_path=None):
                 btc_krw_price REAL
             )
         ''')
-        conn.commit()
 
+    def migrate(self):
+        existing = {row[1] for row in self._execute("PRAGMA table_info(decisions)")}
+        new_columns = {
+            "high_watermark": "REAL", "market_context": "TEXT",
+            # Reconciled from the orders table once the exchange reports fills
+            "fill_status": "TEXT", "executed_volume": "REAL",
+            "executed_avg_price": "REAL", "paid_fee": "REAL",
+        }
+        with self.lock, self.conn:
+            self.conn.execute(ORDERS_TABLE)
+            self.conn.execute(DCA_PLANS_TABLE)
+            for col, col_type in new_columns.items():
+                if col not in existing:
+                    self.conn.execute(f"ALTER TABLE decisions ADD COLUMN {col} {col_type}")
+                    logger.info(f"Migrated DB: added column '{col}'")
+            for sql in INDEXES:
+                self.conn.execute(sql)
 
-def migrate_db(db_path=None):
+    def save_decision(self, row, high_watermark=None, now=None):
+        """Insert a decision row, write it through to the position state and
+        return its id."""
+        now = (now or datetime.now()).replace(microsecond=0)
+        with self.lock:
+            position = self.position
+            with self.conn:
+                cursor = self.conn.execute('''
+                    INSERT INTO decisions
+                        (timestamp, decision, percentage, reason, btc_balance, krw_balance,
+                         btc_avg_buy_price, btc_krw_price, high_watermark, market_context)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (now.strftime("%Y-%m-%d %H:%M:%S"), *row))
+            position.record(now, high_watermark)
+            return cursor.lastrowid
+
+    # -- orders ------------------------------------------------------------
+    def save_order(self, uuid, side=None, state="wait", executed_volume=0.0, funds=0.0,
+                   paid_fee=0.0):
+        """Insert or update an order's execution state; returns its decision id."""
+        now = datetime.now().replace(microsecond=0).strftime("%Y-%m-%d %H:%M:%S")
+        avg_price = funds / executed_volume if executed_volume else None
+        with self.lock:
+            self._write('''
+                INSERT INTO orders (uuid, side, state, executed_volume, funds, avg_price,
+                                    paid_fee, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(uuid) DO UPDATE SET
+                    side = COALESCE(excluded.side, side), state = excluded.state,
+                    executed_volume = excluded.executed_volume, funds = excluded.funds,
+                    avg_price = excluded.avg_price, paid_fee = excluded.paid_fee,
+                    updated_at = excluded.updated_at
+            ''', (uuid, side, state, executed_volume, funds, avg_price, paid_fee, now, now))
+            rows = self._execute("SELECT decision_id FROM orders WHERE uuid = ?", (uuid,))
+            return rows[0][0] if rows else None
+
+    def pending_orders(self):
+        marks = ",".join("?" * len(TERMINAL_ORDER_STATES))
+        return [r[0] for r in self._execute(
+            f"SELECT uuid FROM orders WHERE state NOT IN ({marks}) ORDER BY created_at",
+            TERMINAL_ORDER_STATES)]
+
+    def link_orders(self, decision_id, uuids):
+        """Attach placed orders to their decision and reconcile it."""
+        with self.lock:
+            for uuid in uuids:
+                self._write("INSERT OR IGNORE INTO orders (uuid, state, created_at) "
+                            "VALUES (?, 'wait', datetime('now', 'localtime'))", (uuid,))
+                self._write("UPDATE orders SET decision_id = ? WHERE uuid = ?",
+                            (decision_id, uuid))
+            self.reconcile(decision_id)
+
+    def reconcile(self, decision_id):
+        """Roll a decision's orders up into its fill columns."""
+        marks = ",".join("?" * len(TERMINAL_ORDER_STATES))
+        with self.lock:
+            rows = self._execute(f'''
+                SELECT COUNT(*), SUM(state NOT IN ({marks})), SUM(executed_volume),
+                       SUM(funds), SUM(paid_fee)
+                FROM orders WHERE decision_id = ?
+            ''', (*TERMINAL_ORDER_STATES, decision_id))
+            count, pending, volume, funds, fee = rows[0]
+            if not count:
+                return None
+            volume, funds, fee = safe_float(volume), safe_float(funds), safe_float(fee)
+            if pending:
+                status = "pending"
+            else:
+                status = "filled" if volume > 0 else "unfilled"
+            self._write('''
+                UPDATE decisions SET fill_status = ?, executed_volume = ?,
+                       executed_avg_price = ?, paid_fee = ?
+                WHERE id = ?
+            ''', (status, volume, funds / volume if volume else None, fee, decision_id))
+            return status
+
+    # -- DCA plans ---------------------------------------------------------
+
+    def _active_plans(self):
+        if self._dca_plans is None:
+            rows = self._execute(f'''
+                SELECT {", ".join(DCA_PLAN_FIELDS)} FROM dca_plans
+                WHERE status = 'active' ORDER BY id
+            ''')
+            self._dca_plans = {}
+            for row in rows:
+                plan = dict(zip(DCA_PLAN_FIELDS, row))
+                for key in ("next_due", "created_at"):
+                    plan[key] = datetime.strptime(plan[key], TIME_FORMAT)
+                self._dca_plans[plan["id"]] = plan
+        return self._dca_plans
+
+    def dca_plans(self):
+        """Active DCA plans (copies), oldest first; served from memory."""
+        with self.lock:
+            return [dict(p) for p in self._active_plans().values()]
+
+    def create_dca_plan(self, percentage, splits, interval_minutes, next_due,
+                        tranches_done=0, now=None):
+        """Insert an active plan; returns it as a dict."""
+        now = (now or datetime.now()).replace(microsecond=0)
+        next_due = next_due.replace(microsecond=0)
+        with self.lock:
+            plans = self._active_plans()
+            with self.conn:
+                cursor = self.conn.execute('''
+                    INSERT INTO dca_plans (status, percentage, splits, tranches_done,
+                                           interval_minutes, next_due, created_at, updated_at)
+                    VALUES ('active', ?, ?, ?, ?, ?, ?, ?)
+                ''', (percentage, splits, tranches_done, interval_minutes,
+                      next_due.strftime(TIME_FORMAT), now.strftime(TIME_FORMAT),
+                      now.strftime(TIME_FORMAT)))
+            plan = dict(zip(DCA_PLAN_FIELDS, (cursor.lastrowid, percentage, splits,
+                                              tranches_done, interval_minutes, next_due, now)))
+            plans[plan["id"]] = plan
+            return dict(plan)
+
+    def advance_dca_plan(self, plan_id, tranches_done, now=None):
+        """Claim tranche ``tranches_done + 1`` of a plan.
+
+        Succeeds only if the plan is still active at ``tranches_done``; the
+        next tranche falls due one interval after ``now``.  Returns
+        the updated plan (``status`` "active" or "done") or None.
+        """
+        now = (now or datetime.now()).replace(microsecond=0)
+        with self.lock:
+            plans = self._active_plans()
+            plan = plans.get(plan_id)
+            if plan is None or plan["tranches_done"] != tranches_done:
+                return None
+            next_due = now + timedelta(minutes=plan["interval_minutes"])
+            done = tranches_done + 1 >= plan["splits"]
+            with self.conn:
+                cursor = self.conn.execute('''
+                    UPDATE dca_plans SET tranches_done = tranches_done + 1, next_due = ?,
+                           status = ?, updated_at = ?
+                    WHERE id = ? AND status = 'active' AND tranches_done = ?
+                ''', (next_due.strftime(TIME_FORMAT), "done" if done else "active",
+                      now.strftime(TIME_FORMAT), plan_id, tranches_done))
+            if cursor.rowcount != 1:
+                self._dca_plans = None  # changed underneath us; reload
+                return None
+            plan.update(tranches_done=tranches_done + 1, next_due=next_due)
+            if done:
+                del plans[plan_id]
+            return dict(plan, status="done" if done else "active")
+
+    def postpone_dca_plan(self, plan_id, tranches_done, now=None):
+        """Push a plan's pending tranche one interval past ``now`` without
+        counting it.  Same compare-and-set as ``advance_dca_plan``; returns
+        the updated plan or None.
+        """
+        now = (now or datetime.now()).replace(microsecond=0)
+        with self.lock:
+            plan = self._active_plans().get(plan_id)
+            if plan is None or plan["tranches_done"] != tranches_done:
+                return None
+            next_due = now + timedelta(minutes=plan["interval_minutes"])
+            with self.conn:
+                cursor = self.conn.execute('''
+                    UPDATE dca_plans SET next_due = ?, updated_at = ?
+                    WHERE id = ? AND status = 'active' AND tranches_done = ?
+                ''', (next_due.strftime(TIME_FORMAT), now.strftime(TIME_FORMAT),
+                      plan_id, tranches_done))
+            if cursor.rowcount != 1:
+                self._dca_plans = None  # changed underneath us; reload
+                return None
+            plan["next_due"] = next_due
+            return dict(plan, status="active")
+
+    def cancel_dca_plans(self, plan_id=None):
+        """Cancel one active plan (or all of them); returns how many."""
+        now = datetime.now().replace(microsecond=0).strftime(TIME_FORMAT)
+        with self.lock:
+            plans = self._active_plans()
+            ids = [plan_id] if plan_id is not None else list(plans)
+            cancelled = 0
+            with self.conn:
+                for i in ids:
+                    cancelled += self.conn.execute(
+                        "UPDATE dca_plans SET status = 'cancelled', updated_at = ? "
+                        "WHERE id = ? AND status = 'active'", (now, i)).rowcount
+            for i in ids:
+                plans.pop(i, None)
+            return cancelled
+
+    def last_decisions(self, num):
+        return self._execute('''
+            SELECT timestamp, decision, percentage, reason,
+                   btc_balance, krw_balance, btc_avg_buy_price
+            FROM decisions ORDER BY timestamp DESC LIMIT ?
+        ''', (num,))
+
+    def last_decision_time(self):
+        rows = self._execute("SELECT timestamp FROM decisions ORDER BY timestamp DESC LIMIT 1")
+        if not rows:
+            return None
+        return datetime.strptime(rows[0][0], "%Y-%m-%d %H:%M:%S")
+
+    def high_watermark(self):
+        rows = self._execute(
+            "SELECT high_watermark FROM decisions "
+            "WHERE high_watermark IS NOT NULL "
+            "ORDER BY timestamp DESC LIMIT 1"
+        )
+        return safe_float(rows[0][0]) if rows else 0.0
+
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(db_path=None):
+    """Return the shared repository for ``db_path`` (default ``config.DB_PATH``)."""
     if db_path is None:
         db_path = config.DB_PATH
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(decisions)")
-        existing = {row[1] for row in cursor.fetchall()}
-        new_columns = {"high_watermark": "REAL", "market_context": "TEXT"}
-        for col, col_type in new_columns.items():
-            if col not in existing:
-                cursor.execute(f"ALTER TABLE decisions ADD COLUMN {col} {col_type}")
-                logger.info(f"Migrated DB: added column '{col}'")
-        conn.commit()
-
-
-def save_decision_to_db(decision, current_status):
+    with _repositories_lock:
+        repo = _repositories.get(db_path)
+        if repo is None:
+            repo = _repositories[db_path] = DecisionRepository(db_path)
+        return repo
+
+
+def close_repositories():
+    with _repositories_lock:
+        for repo in _repositories.values():
+            repo.close()
+        _repositories.clear()
+
+
+def initialize_db(db_path=None):
+    get_repository(db_path).initialize()
+
+
+def migrate_db(db_path=None):
+    get_repository(db_path).migrate()
+
+
+def save_decision_to_db(decision, current_status, order_uuids=None, now=None):
+    """Persist a decision with its pre-trade status; returns the row id or None.
+
+    ``order_uuids`` are the orders placed for it; their fills are reconciled
+    into the row as the order tracker observes them.  ``now`` overrides the
+    row timestamp (replays).
+    """
     try:
         status = json.loads(current_status) if isinstance(current_status, str) else current_status
         orderbook = status.get("orderbook", {})
@@ -63,81 +407,64 @@ def save_decision_to_db(decision, current_status):
                 hw = 0.0
                 logger.info("Position fully closed — high watermark reset to 0")
 
-        with sqlite3.connect(config.DB_PATH) as conn:
-            conn.execute('''
-                INSERT INTO decisions
-                    (timestamp, decision, percentage, reason, btc_balance, krw_balance,
-                     btc_avg_buy_price, btc_krw_price, high_watermark, market_context)
-                VALUES (datetime('now','localtime'), ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                decision.get("decision"),
-                decision.get("percentage", 0),
-                decision.get("reason", ""),
-                status.get("btc_balance"),
-                status.get("krw_balance"),
-                status.get("btc_avg_buy_price"),
-                current_price,
-                hw,
-                decision.get("market_context_summary", ""),
-            ))
-            conn.commit()
+        repo = get_repository()
+        decision_id = repo.save_decision((
+            decision.get("decision"),
+            decision.get("percentage", 0),
+            decision.get("reason", ""),
+            status.get("btc_balance"),
+            status.get("krw_balance"),
+            status.get("btc_avg_buy_price"),
+            current_price,
+            hw,
+            decision.get("market_context_summary", ""),
+        ), high_watermark=hw, now=now)
+        uuids = [u for u in (order_uuids or []) if isinstance(u, str)]
+        if uuids:
+            repo.link_orders(decision_id, uuids)
+        return decision_id
     except Exception as e:
         logger.error(f"Error saving decision to DB: {e}")
+        return None
 
 
 def fetch_last_decisions(db_path=None, num=None):
-    if db_path is None:
-        db_path = config.DB_PATH
     if num is None:
         num = config.DEFAULT_DECISIONS_LIMIT
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT timestamp, decision, percentage, reason,
-                   btc_balance, krw_balance, btc_avg_buy_price
-            FROM decisions ORDER BY timestamp DESC LIMIT ?
-        ''', (num,))
-        rows = cursor.fetchall()
+    rows = get_repository(db_path).last_decisions(num)
     if not rows:
         return "No decisions found."
-    out = []
+    fields = ["timestamp", "decision", "percentage", "reason",
+              "btc_balance", "krw_balance", "btc_avg_buy_price"]
+    records = []
     for row in rows:
         ts = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
-        out.append(str({
-            "timestamp": int(ts.timestamp() * 1000),
-            "decision": row[1], "percentage": row[2], "reason": row[3],
-            "btc_balance": row[4], "krw_balance": row[5], "btc_avg_buy_price": row[6],
-        }))
-    return "\n".join(out)
+        record = dict(zip(fields, row))
+        if config.PROMPT_COMPACT:
+            record["timestamp"] = ts.strftime("%Y-%m-%d %H:%M")
+        else:
+            record["timestamp"] = int(ts.timestamp() * 1000)
+        records.append(record)
+    if config.PROMPT_COMPACT:
+        return encode_records(records, fields)
+    return "\n".join(str(r) for r in records)
+
+
+def get_position_state(db_path=None):
+    return get_repository(db_path).position
 
 
 def get_last_decision_time(db_path=None):
-    if db_path is None:
-        db_path = config.DB_PATH
     try:
-        with sqlite3.connect(db_path) as conn:
-            row = conn.execute(
-                "SELECT timestamp FROM decisions ORDER BY timestamp DESC LIMIT 1"
-            ).fetchone()
-            if not row:
-                return None
-            return datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
+        return get_position_state(db_path).last_decision_time
     except Exception as e:
         logger.error(f"Error fetching last decision time: {e}")
         return None
 
 
 def get_high_watermark(db_path=None):
-    if db_path is None:
-        db_path = config.DB_PATH
     try:
-        with sqlite3.connect(db_path) as conn:
-            row = conn.execute(
-                "SELECT high_watermark FROM decisions "
-                "WHERE high_watermark IS NOT NULL "
-                "ORDER BY timestamp DESC LIMIT 1"
-            ).fetchone()
-            return safe_float(row[0]) if row else 0.0
+        return get_position_state(db_path).high_watermark
     except Exception as e:
         logger.error(f"Error fetching high_watermark: {e}")
         return 0.0
@@ -1,84 +1,165 @@
-"""Dollar Cost Averaging (DCA) logic for splitting buy orders."""
+"""Dollar Cost Averaging (DCA) logic for splitting buy orders.
+
+A split buy is a plan row in the decisions database with its own tranche
+count, interval and next due time, so several plans can run side by side
+and survive a restart.  Tranches are claimed with a compare-and-set on the
+row before the order is placed, and the scheduler wakes the DCA job at
+``next_dca_due()`` instead of polling.
+"""
 
 import json
 import logging
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
 
 import config
 from trading.utils import safe_float, append_reason
-from trading.database import compute_high_watermark, save_decision_to_db
+from trading.account import get_account
+from trading.database import compute_high_watermark, get_repository, save_decision_to_db
 from trading.execution import execute_buy
 
 logger = logging.getLogger("autotrade")
 
 
-def load_dca_state():
+# ---------------------------------------------------------------------------
+# Plans
+# ---------------------------------------------------------------------------
+def tranche_percentage(plan):
+    return plan["percentage"] / plan["splits"]
+
+
+def active_dca_plans(db_path=None):
+    """Active plans, oldest first (served from memory)."""
+    return get_repository(db_path).dca_plans()
+
+
+def next_dca_due(db_path=None):
+    """When the earliest pending tranche is due, or None without active plans."""
     try:
-        with open(config.DCA_STATE_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {"active": False, "tranches_remaining": 0,
-                "original_percentage": 0, "last_tranche_time": None}
+        return min((p["next_due"] for p in active_dca_plans(db_path)), default=None)
+    except Exception as e:
+        logger.error(f"Error reading DCA plans: {e}")
+        return None
+
+
+def create_dca_plan(percentage, splits=None, interval_minutes=None, start=None, db_path=None):
+    """Schedule ``percentage`` of the KRW balance in ``splits`` tranches, the
+    first at ``start`` (default now)."""
+    return get_repository(db_path).create_dca_plan(
+        percentage, splits or config.DCA_SPLITS,
+        interval_minutes or config.DCA_INTERVAL_MINUTES, start or datetime.now())
+
 
+def claim_tranche(plan, now=None, db_path=None):
+    """Mark the plan's next tranche as executed; None if it already was."""
+    return get_repository(db_path).advance_dca_plan(plan["id"], plan["tranches_done"], now)
 
-def save_dca_state(state):
+
+def postpone_tranche(plan, now=None, db_path=None):
+    """Move the plan's next tranche one interval later without executing it;
+    None if it was claimed meanwhile."""
+    return get_repository(db_path).postpone_dca_plan(plan["id"], plan["tranches_done"], now)
+
+
+def cancel_dca_plans(db_path=None):
+    """Cancel every active plan; returns how many were active."""
+    return get_repository(db_path).cancel_dca_plans()
+
+
+def import_legacy_dca_state(path=None, db_path=None):
+    """Move an active ``dca_state.json`` (pre-database format) into a plan.
+
+    The file is renamed to ``*.imported`` so the import happens once.
+    Returns the new plan or None.
+    """
+    path = path or config.DCA_STATE_FILE
+    if not os.path.exists(path):
+        return None
     try:
-        with open(config.DCA_STATE_FILE, "w") as f:
-            json.dump(state, f)
+        with open(path, "r") as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable DCA state file {path}: {e}")
+        state = {}
+
+    plan = None
+    remaining = int(state.get("tranches_remaining") or 0)
+    try:
+        if state.get("active") and remaining > 0:
+            last = state.get("last_tranche_time")
+            last = datetime.fromisoformat(last) if last else datetime.now()
+            plan = get_repository(db_path).create_dca_plan(
+                safe_float(state.get("original_percentage")), config.DCA_SPLITS,
+                config.DCA_INTERVAL_MINUTES,
+                last + timedelta(minutes=config.DCA_INTERVAL_MINUTES),
+                tranches_done=max(0, config.DCA_SPLITS - remaining))
+            logger.info(f"Imported DCA state as plan {plan['id']} ({remaining} tranches left)")
+        os.replace(path, path + ".imported")
     except Exception as e:
-        logger.error(f"Error saving DCA state: {e}")
+        logger.error(f"Error importing DCA state: {e}")
+    return plan
 
 
-def apply_dca(decision):
+# ---------------------------------------------------------------------------
+# Decisions and tranches
+# ---------------------------------------------------------------------------
+def apply_dca(decision, now=None):
     """Split buy decisions into multiple tranches via DCA."""
     if not config.DCA_ENABLED:
         return decision
-    if decision.get("decision") != "buy":
-        state = load_dca_state()
-        if state.get("active"):
-            state["active"] = False
-            state["tranches_remaining"] = 0
-            save_dca_state(state)
-            decision["reason"] = append_reason(decision.get("reason", ""), "DCA cancelled")
+    try:
+        repo = get_repository()
+        if decision.get("decision") != "buy":
+            if repo.cancel_dca_plans():
+                decision["reason"] = append_reason(decision.get("reason", ""), "DCA cancelled")
+            return decision
+
+        if len(repo.dca_plans()) >= config.DCA_MAX_ACTIVE_PLANS:
+            return {"decision": "hold", "percentage": 0,
+                    "reason": "DCA already active — pending tranches handled separately",
+                    "_skip_save": True}
+        if config.DCA_SPLITS <= 1:
+            return decision
+
+        # The caller executes tranche 1 now; the plan holds the rest
+        now = now or datetime.now()
+        repo.create_dca_plan(
+            decision["percentage"], config.DCA_SPLITS, config.DCA_INTERVAL_MINUTES,
+            now + timedelta(minutes=config.DCA_INTERVAL_MINUTES), tranches_done=1, now=now)
+    except Exception as e:
+        logger.error(f"DCA plan update failed — executing decision unsplit: {e}")
         return decision
 
-    state = load_dca_state()
-
-    if state.get("active") and state.get("tranches_remaining", 0) > 0:
-        return {"decision": "hold", "percentage": 0,
-                "reason": "DCA already active — pending tranches handled separately",
-                "_skip_save": True}
-
-    tranche_pct = decision["percentage"] / config.DCA_SPLITS
-    state = {
-        "active": True,
-        "tranches_remaining": config.DCA_SPLITS - 1,
-        "original_percentage": decision["percentage"],
-        "last_tranche_time": datetime.now().isoformat(),
-    }
-    save_dca_state(state)
-
-    decision["percentage"] = tranche_pct
+    decision["percentage"] = decision["percentage"] / config.DCA_SPLITS
     decision["reason"] = append_reason(
         decision.get("reason", ""), f"DCA tranche 1/{config.DCA_SPLITS}")
     return decision
 
 
-def execute_dca_tranche():
-    """Execute a pending DCA tranche directly — no GPT call."""
+def _free_krw(fallback):
+    """Free KRW from the account cache, which already reflects orders just placed."""
+    try:
+        return get_account().balance("KRW")
+    except Exception as e:
+        logger.warning(f"KRW balance unavailable — using last known: {e}")
+        return fallback
+
+
+def execute_dca_tranche(plans=None, now=None):
+    """Execute the next tranche of each plan in ``plans`` (default: every plan
+    that is due) directly — no GPT call.
+
+    A tranche below the minimum order is not counted; it is postponed by the
+    plan's interval so the scheduler does not wake for it again right away.
+    """
     from trading.market import get_current_status
 
-    state = load_dca_state()
-    if not state.get("active") or state.get("tranches_remaining", 0) <= 0:
+    now = now or datetime.now()
+    if plans is None:
+        plans = [p for p in active_dca_plans() if p["next_due"] <= now]
+    if not plans:
         return
 
-    last_time = state.get("last_tranche_time")
-    if last_time:
-        elapsed = (datetime.now() - datetime.fromisoformat(last_time)).total_seconds() / 60
-        if elapsed < config.DCA_INTERVAL_MINUTES:
-            logger.info(f"DCA waiting ({elapsed:.0f}m / {config.DCA_INTERVAL_MINUTES}m)")
-            return
-
     try:
         current_status = get_current_status()
         status = json.loads(current_status)
@@ -91,47 +172,48 @@ def execute_dca_tranche():
             pnl = (price - avg) / avg
             if pnl <= -config.STOP_LOSS_PCT:
                 logger.warning(f"DCA cancelled — stop-loss level breached ({pnl:.2%})")
-                state["active"] = False
-                state["tranches_remaining"] = 0
-                save_dca_state(state)
+                cancel_dca_plans()
                 return
     except Exception as e:
         logger.error(f"DCA risk check failed: {e}")
         return
 
-    tranche_pct = state["original_percentage"] / config.DCA_SPLITS
-    state["tranches_remaining"] -= 1
-    state["last_tranche_time"] = datetime.now().isoformat()
-    if state["tranches_remaining"] <= 0:
-        state["active"] = False
-    save_dca_state(state)
-
-    tranche_num = config.DCA_SPLITS - state["tranches_remaining"]
-    reason = f"DCA tranche {tranche_num}/{config.DCA_SPLITS}"
-    logger.info(f"--- Executing {reason} at {tranche_pct:.1f}% ---")
-
-    if krw * (tranche_pct / 100) < config.MIN_ORDER_AMOUNT:
-        logger.warning("DCA tranche below minimum order — skipping")
-        return
-
-    execute_buy(tranche_pct)
-
-    decision = {
-        "decision": "buy",
-        "percentage": tranche_pct,
-        "reason": reason,
-        "market_context_summary": "",
-        "high_watermark": compute_high_watermark(price, avg) if avg > 0 else 0.0,
-    }
-    save_decision_to_db(decision, current_status)
-
-
-def check_pending_dca():
-    """Check and execute pending DCA tranches."""
+    for i, plan in enumerate(plans):
+        if i:  # earlier tranches in this run spent KRW
+            krw = _free_krw(krw)
+        tranche_pct = tranche_percentage(plan)
+        if krw * (tranche_pct / 100) < config.MIN_ORDER_AMOUNT:
+            logger.warning(f"DCA plan {plan['id']} tranche below minimum order — "
+                           f"postponed {plan['interval_minutes']} min")
+            postpone_tranche(plan, now)
+            continue
+
+        claimed = claim_tranche(plan, now)
+        if claimed is None:
+            logger.info(f"DCA plan {plan['id']} tranche already taken — skipping")
+            continue
+        reason = f"DCA tranche {claimed['tranches_done']}/{claimed['splits']}"
+        logger.info(f"--- Executing {reason} (plan {plan['id']}) at {tranche_pct:.1f}% ---")
+
+        order_uuids = execute_buy(tranche_pct)
+
+        decision = {
+            "decision": "buy",
+            "percentage": tranche_pct,
+            "reason": reason,
+            "market_context_summary": "",
+            "high_watermark": compute_high_watermark(price, avg) if avg > 0 else 0.0,
+        }
+        save_decision_to_db(decision, current_status, order_uuids)
+
+
+def check_pending_dca(now=None):
+    """Execute the DCA tranches that are due."""
     if not config.DCA_ENABLED:
         return
-    state = load_dca_state()
-    if not state.get("active") or state.get("tranches_remaining", 0) <= 0:
+    now = now or datetime.now()
+    due = [p for p in active_dca_plans() if p["next_due"] <= now]
+    if not due:
         return
-    logger.info(f"--- DCA check: {state['tranches_remaining']} tranches remaining ---")
-    execute_dca_tranche()
+    logger.info(f"--- DCA check: {len(due)} plan(s) due ---")
+    execute_dca_tranche(due, now)
@@ -1,4 +1,9 @@
-"""Decision logic: normalization, risk policy, and position sizing adjustments."""
+"""Decision logic: normalization, risk policy, and position sizing adjustments.
+
+The thresholds and sizing math live in the vectorized ``trading.risk``
+kernel; this module adapts one live decision to it (parsing the exchange
+status, the cooldown, orderbook slippage and the reason text).
+"""
 
 import json
 import logging
@@ -8,6 +13,8 @@ import config
 from trading.utils import safe_float, clamp_percentage, append_reason
 from trading.database import get_last_decision_time, compute_high_watermark
 from trading.orderbook import analyze_orderbook_depth
+from trading import risk
+from trading.risk import RiskParams
 
 logger = logging.getLogger("autotrade")
 
@@ -37,64 +44,35 @@ def normalize_decision(advice):
 def apply_volatility_adjustment(percentage, market_context):
     """Scale position size based on market volatility."""
     vol = safe_float(market_context.get("volatility"))
-    if vol >= config.HIGH_VOLATILITY_THRESHOLD:
-        return percentage * config.VOLATILITY_REDUCTION
-    if 0 < vol <= config.LOW_VOLATILITY_THRESHOLD:
-        return percentage * config.VOLATILITY_BOOST
-    return percentage
+    return float(percentage * risk.volatility_multiplier(vol, RiskParams.from_config()))
 
 
 def apply_regime_adjustment(decision_type, percentage, market_context):
     """Adjust position size based on market regime (trending/ranging)."""
-    if not config.REGIME_DETECTION_ENABLED:
-        return percentage
-    regime = market_context.get("regime", "unknown")
-    if regime == "unknown":
-        return percentage
-    if regime == "ranging":
-        return percentage * config.REGIME_RANGING_SIZE_MULT
-    if regime == "trending_up":
-        if decision_type == "buy":
-            return percentage * config.REGIME_TRENDING_SIZE_MULT
-        elif decision_type == "sell":
-            return percentage * config.REGIME_COUNTER_TREND_SIZE_MULT
-    elif regime == "trending_down":
-        if decision_type == "sell":
-            return percentage * config.REGIME_TRENDING_SIZE_MULT
-        elif decision_type == "buy":
-            return percentage * config.REGIME_COUNTER_TREND_SIZE_MULT
-    return percentage
+    multiplier = risk.regime_multiplier(
+        risk.ACTION_CODES.get(decision_type, risk.HOLD),
+        market_context.get("regime", "unknown"), RiskParams.from_config())
+    return float(percentage * multiplier)
 
 
 def apply_tiered_take_profit(pnl_pct, momentum):
     """Return a sell decision if a tiered take-profit threshold is met."""
-    for tier in reversed(config.TIERED_TAKE_PROFIT):
-        if pnl_pct >= tier["threshold"]:
-            if tier["condition"] == "always":
-                return {
-                    "decision": "sell",
-                    "percentage": tier["sell_pct"],
-                    "reason": (f"Tiered take-profit at {pnl_pct:.2%} "
-                               f"(tier >= {tier['threshold']:.0%})"),
-                }
-            if tier["condition"] == "momentum_weakening" and momentum < 0:
-                return {
-                    "decision": "sell",
-                    "percentage": tier["sell_pct"],
-                    "reason": f"Tiered take-profit at {pnl_pct:.2%} with weakening momentum",
-                }
-    return None
+    params = RiskParams.from_config()
+    tier = int(risk.take_profit_tier(pnl_pct, momentum, params))
+    if tier < 0:
+        return None
+    threshold, sell_pct, always = params.take_profit[tier]
+    if always:
+        reason = f"Tiered take-profit at {pnl_pct:.2%} (tier >= {threshold:.0%})"
+    else:
+        reason = f"Tiered take-profit at {pnl_pct:.2%} with weakening momentum"
+    return {"decision": "sell", "percentage": sell_pct, "reason": reason}
 
 
 def _compute_dynamic_stop_loss(avg_price, market_context):
     """Compute dynamic stop-loss distance based on ATR when enabled."""
-    if not getattr(config, "DYNAMIC_STOP_LOSS_ENABLED", False):
-        return config.STOP_LOSS_PCT
     atr = safe_float(market_context.get("atr"))
-    if atr <= 0 or avg_price <= 0:
-        return config.STOP_LOSS_PCT
-    atr_stop = (atr * config.DYNAMIC_STOP_LOSS_ATR_MULT) / avg_price
-    return max(config.STOP_LOSS_PCT, atr_stop)
+    return float(risk.stop_distance(avg_price, atr, RiskParams.from_config()))
 
 
 def check_position_risk(current_price, avg_price, momentum=0.0, market_context=None):
@@ -104,72 +82,48 @@ def check_position_risk(current_price, avg_price, momentum=0.0, market_context=N
     """
     if avg_price <= 0 or current_price <= 0:
         return None
+    params = RiskParams.from_config()
+    hw = 0.0
+    if params.trailing_stop and current_price > avg_price:
+        hw = compute_high_watermark(current_price, avg_price)
+    atr = safe_float((market_context or {}).get("atr"))
+    exits = risk.position_exits([current_price], [avg_price], [1.0], [hw],
+                                [momentum], [atr], params)
+    return risk.exit_decision(exits, 0, current_price, params)
 
-    pnl = (current_price - avg_price) / avg_price
 
-    # Dynamic or fixed stop-loss
-    stop_pct = _compute_dynamic_stop_loss(avg_price, market_context or {})
-    if pnl <= -stop_pct:
-        return {
-            "decision": "sell",
-            "percentage": config.STOP_LOSS_SELL_PCT,
-            "reason": f"Stop-loss triggered at {pnl:.2%} (threshold {stop_pct:.2%})",
-        }
+# Reason notes for the sizing flags, in the order they are applied
+_FLAG_NOTES = (
+    (risk.DOWNTREND, "Downtrend filter"),
+    (risk.RSI_OVERBOUGHT, "RSI overbought filter"),
+    (risk.NEGATIVE_MOMENTUM, "Negative momentum filter"),
+    (risk.RSI_DEEP_OVERSOLD, "RSI deep oversold boost ({rsi:.0f})"),
+    (risk.UPTREND, "Uptrend filter"),
+    (risk.RSI_OVERSOLD, "RSI oversold filter"),
+    (risk.POSITIVE_MOMENTUM, "Positive momentum filter"),
+)
 
-    if config.TRAILING_STOP_ENABLED and current_price > avg_price:
-        hw = compute_high_watermark(current_price, avg_price)
-        if hw > 0:
-            drawdown = (hw - current_price) / hw
-            if drawdown >= config.TRAILING_STOP_PCT:
-                return {
-                    "decision": "sell",
-                    "percentage": config.TRAILING_STOP_SELL_PCT,
-                    "reason": (f"Trailing stop: price {current_price:,.0f} "
-                               f"dropped {drawdown:.2%} from high {hw:,.0f}"),
-                    "high_watermark": hw,
-                }
 
-    tp = apply_tiered_take_profit(pnl, momentum)
-    if tp:
-        return tp
+def _filter_reason(reason, flags, rsi):
+    for flag, note in _FLAG_NOTES:
+        if flags & flag:
+            reason = append_reason(reason, note.format(rsi=rsi))
+    return reason
+
 
-    return None
+def _apply_filters(action, pct, reason, trend, rsi, momentum):
+    sizing = risk.direction_filters(action, pct, trend, rsi, momentum, RiskParams.from_config())
+    return float(sizing.percentage), _filter_reason(reason, int(sizing.flags), rsi)
 
 
 def _apply_buy_filters(pct, reason, trend, rsi, momentum):
     """Apply trend/RSI/momentum filters for buy decisions."""
-    if trend == "down":
-        pct *= 0.5
-        reason = append_reason(reason, "Downtrend filter")
-    if rsi >= 70:
-        pct *= 0.4
-        reason = append_reason(reason, "RSI overbought filter")
-    if momentum < 0:
-        pct *= 0.7
-        reason = append_reason(reason, "Negative momentum filter")
-
-    # RSI-based accumulation: boost buys on deep oversold
-    if getattr(config, "RSI_OVERSOLD_ACCUMULATION_ENABLED", False):
-        if rsi > 0 and rsi < getattr(config, "RSI_DEEP_OVERSOLD", 25):
-            boost = getattr(config, "RSI_OVERSOLD_BOOST", 1.5)
-            pct *= boost
-            reason = append_reason(reason, f"RSI deep oversold boost ({rsi:.0f})")
-
-    return pct, reason
+    return _apply_filters(risk.BUY, pct, reason, trend, rsi, momentum)
 
 
 def _apply_sell_filters(pct, reason, trend, rsi, momentum):
     """Apply trend/RSI/momentum filters for sell decisions."""
-    if trend == "up":
-        pct *= 0.6
-        reason = append_reason(reason, "Uptrend filter")
-    if rsi <= 30:
-        pct *= 0.5
-        reason = append_reason(reason, "RSI oversold filter")
-    if momentum > 0:
-        pct *= 0.8
-        reason = append_reason(reason, "Positive momentum filter")
-    return pct, reason
+    return _apply_filters(risk.SELL, pct, reason, trend, rsi, momentum)
 
 
 def _get_cooldown_minutes(market_context):
@@ -181,8 +135,19 @@ def _get_cooldown_minutes(market_context):
     return config.MIN_TRADE_INTERVAL_MINUTES
 
 
-def apply_risk_policy(decision, current_status, market_context):
-    """Apply all risk filters and constraints to a raw decision."""
+_BLOCKED_REASONS = {
+    risk.INSUFFICIENT_KRW: "Insufficient KRW",
+    risk.BELOW_MINIMUM: "Order below minimum",
+    risk.NO_BTC: "No BTC to sell",
+}
+
+
+def apply_risk_policy(decision, current_status, market_context, now=None):
+    """Apply all risk filters and constraints to a raw decision.
+
+    ``now`` is the decision time for the cooldown (default: wall clock);
+    replays and backtests pass the simulated time.
+    """
     try:
         status = json.loads(current_status)
     except Exception:
@@ -206,7 +171,7 @@ def apply_risk_policy(decision, current_status, market_context):
     cooldown_mins = _get_cooldown_minutes(market_context)
     last_time = get_last_decision_time()
     if last_time:
-        mins = (datetime.now() - last_time).total_seconds() / 60
+        mins = ((now or datetime.now()) - last_time).total_seconds() / 60
         if mins < cooldown_mins:
             return {
                 "decision": "hold", "percentage": 0,
@@ -221,42 +186,32 @@ def apply_risk_policy(decision, current_status, market_context):
             return risk_decision
 
     # Orderbook depth for buys
+    slippage = 0.0
     if dv == "buy" and krw_balance > 0 and pct > 0:
-        depth = analyze_orderbook_depth(orderbook, krw_balance * (pct / 100))
-        if depth["slippage_pct"] > config.MAX_SLIPPAGE_PCT:
-            pct *= 0.5
-            reason = append_reason(reason, f"High slippage ({depth['slippage_pct']:.3%})")
-
-    # Trend / RSI / momentum filters
-    if dv == "buy":
-        pct, reason = _apply_buy_filters(pct, reason, trend, rsi, momentum)
-    elif dv == "sell":
-        pct, reason = _apply_sell_filters(pct, reason, trend, rsi, momentum)
+        slippage = analyze_orderbook_depth(orderbook, krw_balance * (pct / 100))["slippage_pct"]
 
+    # Slippage, trend / RSI / momentum filters, volatility, regime, floor
+    params = RiskParams.from_config()
+    action = risk.ACTION_CODES.get(dv, risk.HOLD)
+    regime = market_context.get("regime", "unknown")
+    sizing = risk.size_orders(
+        action, pct, trend, rsi, momentum, safe_float(market_context.get("volatility")),
+        regime, params, slippage)
+    flags = int(sizing.flags)
     if dv in {"buy", "sell"}:
-        pct = apply_volatility_adjustment(pct, market_context)
-        pct = apply_regime_adjustment(dv, pct, market_context)
-        regime = market_context.get("regime", "unknown")
+        pct = float(sizing.percentage)
+        if flags & risk.HIGH_SLIPPAGE:
+            reason = append_reason(reason, f"High slippage ({slippage:.3%})")
+        reason = _filter_reason(reason, flags, rsi)
         if regime != "unknown":
             reason = append_reason(reason, f"Regime: {regime}")
-        max_pct = config.MAX_BUY_PERCENT if dv == "buy" else config.MAX_SELL_PERCENT
-        pct = clamp_percentage(pct, 0, max_pct)
-
-        if dv == "buy" and 0 < pct < config.MIN_BUY_PCT_FLOOR:
-            pct = config.MIN_BUY_PCT_FLOOR
+        if flags & risk.FLOOR_APPLIED:
             reason = append_reason(reason, "Floor applied")
 
     # Minimum order checks
-    if dv == "buy":
-        if krw_balance < config.MIN_ORDER_AMOUNT:
-            return {"decision": "hold", "percentage": 0, "reason": "Insufficient KRW"}
-        if krw_balance * (pct / 100) < config.MIN_ORDER_AMOUNT:
-            return {"decision": "hold", "percentage": 0, "reason": "Order below minimum"}
-    elif dv == "sell":
-        if btc_balance <= 0:
-            return {"decision": "hold", "percentage": 0, "reason": "No BTC to sell"}
-        if current_price * btc_balance * (pct / 100) < config.MIN_ORDER_AMOUNT:
-            return {"decision": "hold", "percentage": 0, "reason": "Order below minimum"}
+    blocked = int(risk.order_checks(action, pct, current_price, btc_balance, krw_balance, params))
+    if blocked != risk.ORDER_OK:
+        return {"decision": "hold", "percentage": 0, "reason": _BLOCKED_REASONS[blocked]}
 
     return {
         "decision": dv,
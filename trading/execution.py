@@ -1,10 +1,30 @@
-"""Trade execution: buy and sell market orders."""
+"""Trade execution: buy and sell market orders.
+
+Orders of at least ``SLICE_MIN_ORDER_KRW`` go through ``OrderSlicer``: the
+parent is split into child market orders spread over ``SLICE_WINDOW_SECONDS``.
+Each child is the TWAP share of what is left, capped (iceberg-style) at the
+depth available within ``SLICE_CHILD_SLIPPAGE_PCT`` of the touch, and the book
+is re-read before every child.  Children shrink so their average price stays
+within ``SLICE_SLIPPAGE_BUDGET_PCT`` of the arrival price; once the touch has
+moved past the budget the slicer stops and reports the unfilled remainder.
+A slice whose capped size is below the minimum order is skipped (the book
+gets until the next slice to refill), and a sub-minimum remainder rides
+with the child before it when the caps allow.  Fills are read from the order
+state the background tracker has already seen, never polled per child.
+``cancel_slicing`` (used by risk exits) stops every slicer in flight before
+its next child, so an exit never waits out the slicing window.
+"""
 
 import logging
+import threading
+import time
 
 import pyupbit
 
 import config
+from trading.account import get_account
+from trading.orderbook import Orderbook
+from trading.orders import track_order
 from trading.utils import safe_float
 
 logger = logging.getLogger("autotrade")
@@ -12,36 +32,248 @@ logger = logging.getLogger("autotrade")
 # Lazy init — set from autotrade_v3 main
 upbit = None
 
+_slicing_cancelled = threading.Event()
+
 
 def set_upbit(upbit_instance):
     global upbit
     upbit = upbit_instance
 
 
+# ---------------------------------------------------------------------------
+# Sliced execution
+# ---------------------------------------------------------------------------
+class UpbitExchange:
+    """The exchange calls the slicer needs, backed by pyupbit and the account cache."""
+
+    def __init__(self, client, account=None):
+        self.client = client
+        self.account = account
+
+    def get_orderbook(self, market):
+        return pyupbit.get_orderbook(ticker=market)
+
+    def buy_market_order(self, market, amount_krw):
+        return self._placed(self.client.buy_market_order(market, amount_krw))
+
+    def sell_market_order(self, market, volume):
+        return self._placed(self.client.sell_market_order(market, volume))
+
+    def known_order(self, uuid):
+        """Latest state of ``uuid`` seen so far (no API call): the placement
+        response, or the executed order once the tracker has confirmed it."""
+        return self.account.orders.get(uuid) if self.account is not None else None
+
+    def _placed(self, result):
+        if self.account is not None:
+            self.account.on_order(result)
+        track_order(result)
+        return result
+
+
+def _order_fill(exchange, uuid):
+    """``(qty, notional)`` executed by an order, or None if not yet known."""
+    if not uuid:
+        return None
+    order = exchange.known_order(uuid)
+    trades = (order or {}).get("trades") or []
+    qty = sum(safe_float(t.get("volume")) for t in trades)
+    notional = sum(safe_float(t.get("funds")) for t in trades)
+    return (qty, notional) if qty > 0 else None
+
+
+class OrderSlicer:
+    """Splits a parent market order into depth-sized child orders over a window."""
+
+    def __init__(self, exchange, market="KRW-BTC", window=None, max_children=None,
+                 child_slippage=None, budget=None, cancel=None, sleep=None):
+        self.exchange = exchange
+        self.market = market
+        self.window = config.SLICE_WINDOW_SECONDS if window is None else window
+        self.max_children = max_children or config.SLICE_MAX_CHILDREN
+        self.child_slippage = (config.SLICE_CHILD_SLIPPAGE_PCT
+                               if child_slippage is None else child_slippage)
+        self.budget = config.SLICE_SLIPPAGE_BUDGET_PCT if budget is None else budget
+        self.cancel = cancel  # threading.Event; set = stop before the next child
+        self.sleep = sleep or (cancel.wait if cancel is not None else time.sleep)
+
+    def _book(self):
+        orderbook = self.exchange.get_orderbook(self.market)
+        if isinstance(orderbook, list):
+            orderbook = orderbook[0] if orderbook else {}
+        return Orderbook.from_dict(orderbook or {})
+
+    def _child_size(self, book, side, remaining, arrival, slices_left):
+        """Size of the next child: 0 when the touch is past the budget, None
+        when the depth caps leave less than the minimum order (skip the slice)."""
+        best = book.best_ask if side == "buy" else book.best_bid
+        if best <= 0:
+            return 0.0
+        limit = arrival * (1 + self.budget) if side == "buy" else arrival * (1 - self.budget)
+        headroom = (limit - best) / best if side == "buy" else (best - limit) / best
+        if headroom <= 0:
+            return 0.0
+        cap = book.capacity(side, headroom)
+        if slices_left > 1:
+            cap = min(cap, book.capacity(side, self.child_slippage))
+        size = min(remaining if slices_left == 1 else remaining / slices_left, cap)
+        min_size = config.MIN_ORDER_AMOUNT if side == "buy" else config.MIN_ORDER_AMOUNT / best
+        if size < min_size:
+            if min(remaining, cap) < min_size:
+                return None
+            size = min_size  # the TWAP share is small, but the depth takes a minimum order
+        if remaining - size < min_size and remaining <= cap:
+            size = remaining  # a sub-minimum remainder could never be sent on its own
+        return size
+
+    def execute(self, side, amount):
+        """Buy ``amount`` KRW or sell ``amount`` BTC; returns an execution report."""
+        book = self._book()
+        arrival = book.best_ask if side == "buy" else book.best_bid
+        report = {"side": side, "requested": amount, "executed": 0.0, "remaining": amount,
+                  "qty": 0.0, "notional": 0.0, "avg_price": 0.0, "arrival_price": arrival,
+                  "slippage_pct": 0.0, "children": [], "status": "filled"}
+        if arrival <= 0:
+            report["status"] = "error"
+            return report
+
+        remaining = amount
+        interval = self.window / self.max_children
+        for i in range(self.max_children):
+            if i:
+                self.sleep(interval)
+            if self.cancel is not None and self.cancel.is_set():
+                report["status"] = "cancelled"
+                break
+            if i:
+                try:
+                    book = self._book()
+                except Exception as e:
+                    logger.error(f"Slicer orderbook read failed: {e}")
+                    report["status"] = "error"
+                    break
+            size = self._child_size(book, side, remaining, arrival, self.max_children - i)
+            if size is None:
+                logger.info(f"Slice {i + 1}: depth below the minimum order — waiting")
+                continue
+            if size <= 0:
+                report["status"] = "budget"
+                break
+
+            quote = book.buy(size) if side == "buy" else book.sell(size)
+            try:
+                if side == "buy":
+                    result = self.exchange.buy_market_order(self.market, size)
+                else:
+                    result = self.exchange.sell_market_order(self.market, size)
+            except Exception as e:
+                logger.error(f"Child order failed: {e}")
+                result = None
+            if not result:
+                report["status"] = "error"
+                break
+
+            report["children"].append({
+                "size": size, "qty": quote.qty, "notional": quote.notional,
+                "uuid": result.get("uuid") if isinstance(result, dict) else None})
+            remaining -= size
+            min_left = (config.MIN_ORDER_AMOUNT if side == "buy"
+                        else config.MIN_ORDER_AMOUNT / arrival)
+            if remaining < min_left:
+                break
+        else:
+            report["status"] = "window"
+
+        # Executions the tracker has confirmed by now replace the book estimates
+        for child in report["children"]:
+            fill = _order_fill(self.exchange, child["uuid"])
+            child["confirmed"] = fill is not None
+            if fill:
+                child["qty"], child["notional"] = fill
+            child["avg_price"] = child["notional"] / child["qty"] if child["qty"] else 0.0
+            report["qty"] += child["qty"]
+            report["notional"] += child["notional"]
+
+        report["executed"] = amount - remaining
+        report["remaining"] = remaining
+        if report["qty"] > 0:
+            report["avg_price"] = report["notional"] / report["qty"]
+            sign = 1 if side == "buy" else -1
+            report["slippage_pct"] = sign * (report["avg_price"] - arrival) / arrival
+        logger.info(f"Sliced {side}: {len(report['children'])} children, "
+                    f"{report['executed']:,.8g}/{amount:,.8g} executed, avg "
+                    f"{report['avg_price']:,.0f} vs arrival {arrival:,.0f} "
+                    f"({report['slippage_pct']:+.3%}), {report['status']}")
+        return report
+
+
+def slice_order(side, amount, urgent=False):
+    """Run ``OrderSlicer`` against Upbit; ``urgent`` sends children back to back."""
+    slicer = OrderSlicer(UpbitExchange(upbit, get_account()), window=0 if urgent else None,
+                         cancel=None if urgent else _slicing_cancelled)
+    return slicer.execute(side, amount)
+
+
+def cancel_slicing():
+    """Stop the sliced orders in flight before their next child."""
+    _slicing_cancelled.set()
+
+
+def resume_slicing():
+    """Let sliced orders run again (once the cancelling exit holds the floor)."""
+    _slicing_cancelled.clear()
+
+
+def _child_uuids(report):
+    return [c["uuid"] for c in report["children"] if c["uuid"]]
+
+
+# ---------------------------------------------------------------------------
+# Entry points: return the UUIDs of the orders placed (fills are confirmed
+# in the background by trading.orders)
+# ---------------------------------------------------------------------------
 def execute_buy(percentage):
     logger.info(f"Executing BUY at {percentage:.1f}% of KRW balance")
     try:
-        krw = safe_float(upbit.get_balance("KRW"))
+        account = get_account()
+        krw = account.balance("KRW")
         amount = krw * (percentage / 100)
         if amount > config.MIN_ORDER_AMOUNT:
+            if config.SLICING_ENABLED and amount >= config.SLICE_MIN_ORDER_KRW:
+                return _child_uuids(slice_order("buy", amount * config.FEE_RATE))
             result = upbit.buy_market_order("KRW-BTC", amount * config.FEE_RATE)
+            account.on_order(result)
             logger.info(f"Buy order result: {result}")
-        else:
-            logger.warning(f"Buy amount {amount:.0f} below minimum")
+            uuid = track_order(result, "bid")
+            return [uuid] if uuid else []
+        logger.warning(f"Buy amount {amount:.0f} below minimum")
     except Exception as e:
         logger.error(f"Buy execution failed: {e}")
+    return []
 
 
-def execute_sell(percentage):
+def execute_sell(percentage, urgent=False, price=None):
+    """Sell ``percentage`` of the BTC balance.
+
+    ``urgent`` (risk exits) skips the slicing window; ``price`` is a recent
+    quote for the minimum-order check (fetched when not given).
+    """
     logger.info(f"Executing SELL at {percentage:.1f}% of BTC balance")
     try:
-        btc = safe_float(upbit.get_balance("BTC"))
+        account = get_account()
+        btc = account.balance("BTC")
         amount = btc * (percentage / 100)
-        price = pyupbit.get_orderbook(ticker="KRW-BTC")["orderbook_units"][0]["ask_price"]
+        if not price:
+            price = pyupbit.get_orderbook(ticker="KRW-BTC")["orderbook_units"][0]["ask_price"]
         if price * amount > config.MIN_ORDER_AMOUNT:
+            if config.SLICING_ENABLED and price * amount >= config.SLICE_MIN_ORDER_KRW:
+                return _child_uuids(slice_order("sell", amount, urgent))
             result = upbit.sell_market_order("KRW-BTC", amount)
+            account.on_order(result)
             logger.info(f"Sell order result: {result}")
-        else:
-            logger.warning(f"Sell amount {price * amount:.0f} below minimum")
+            uuid = track_order(result, "ask")
+            return [uuid] if uuid else []
+        logger.warning(f"Sell amount {price * amount:.0f} below minimum")
     except Exception as e:
         logger.error(f"Sell execution failed: {e}")
+    return []
@@ -1,54 +1,96 @@
-"""External data sources: news, Fear & Greed index."""
+"""External data sources: news, Fear & Greed index.
+
+Both feeds change slowly, so responses go through a shared ``TTLCache``:
+fresh entries skip the network, stale ones are served immediately while a
+background refresh runs, and the cache survives restarts on disk.
+"""
 
 import logging
 import xml.etree.ElementTree as ET
 from datetime import datetime
 
-import requests
-
 import config
+from trading import transport
+from trading.cache import TTLCache
+from trading.prompt import encode_fear_greed, encode_records
 
 logger = logging.getLogger("autotrade")
 
+feed_cache = TTLCache(path=config.FEED_CACHE_PATH)
+
+
+def _cached(source, key, fetch):
+    """Serve ``fetch()`` through the feed cache.
+
+    If the upstream fails and no usable entry exists, the last good value
+    (however old) is returned before giving up.
+    """
+    try:
+        return feed_cache.get_or_fetch(source, key, fetch)
+    except Exception:
+        cached = feed_cache.get(key)
+        if cached is None:
+            raise
+        value, age = cached
+        logger.warning(f"{source} upstream failed; serving value cached {age:.0f}s ago")
+        return value
+
+
+def _fetch_news():
+    url = "https://news.google.com/rss/search?q=bitcoin+btc&hl=en&gl=US&ceid=US:en"
+    resp = transport.get(url, group="news", timeout=config.API_TIMEOUT)
+    resp.raise_for_status()
+
+    root = ET.fromstring(resp.content)
+    items = root.findall(".//item")
+    simplified = []
+    for item in items[:10]:
+        title = item.findtext("title", "No title")
+        source = item.findtext("source", "Unknown")
+        pub_date = item.findtext("pubDate", "")
+        try:
+            ts = int(datetime.strptime(
+                pub_date, "%a, %d %b %Y %H:%M:%S %Z"
+            ).timestamp() * 1000)
+        except (ValueError, TypeError):
+            ts = int(datetime.now().timestamp() * 1000)
+        simplified.append((title, source, ts))
+
+    logger.info(f"Fetched {len(simplified)} news items from Google News")
+    if config.PROMPT_COMPACT:
+        records = [{"title": title, "source": source,
+                    "published": datetime.fromtimestamp(ts / 1000).strftime("%Y-%m-%d %H:%M")}
+                   for title, source, ts in simplified]
+        return encode_records(records, ["title", "source", "published"])
+    return str(simplified)
+
 
 def get_news_data():
     """Fetch BTC news from Google News RSS (no API key required)."""
     try:
-        url = "https://news.google.com/rss/search?q=bitcoin+btc&hl=en&gl=US&ceid=US:en"
-        resp = requests.get(url, timeout=config.API_TIMEOUT)
-        resp.raise_for_status()
-
-        root = ET.fromstring(resp.content)
-        items = root.findall(".//item")
-        simplified = []
-        for item in items[:10]:
-            title = item.findtext("title", "No title")
-            source = item.findtext("source", "Unknown")
-            pub_date = item.findtext("pubDate", "")
-            try:
-                ts = int(datetime.strptime(
-                    pub_date, "%a, %d %b %Y %H:%M:%S %Z"
-                ).timestamp() * 1000)
-            except (ValueError, TypeError):
-                ts = int(datetime.now().timestamp() * 1000)
-            simplified.append((title, source, ts))
-
-        logger.info(f"Fetched {len(simplified)} news items from Google News")
-        return str(simplified)
+        return _cached("news", f"news:{int(config.PROMPT_COMPACT)}", _fetch_news)
     except Exception as e:
         logger.error(f"Error fetching news: {e}")
         return "No news data available."
 
 
-def fetch_fear_and_greed_index(limit=1, date_format=""):
+def _fetch_fear_and_greed(limit, date_format):
     params = {"limit": limit, "format": "json", "date_format": date_format}
+    resp = transport.get(
+        "https://api.alternative.me/fng/", group="fear_greed",
+        params=params, timeout=config.API_TIMEOUT,
+    )
+    resp.raise_for_status()
+    data = resp.json().get("data", [])
+    if config.PROMPT_COMPACT:
+        return encode_fear_greed(data)
+    return "".join(str(d) for d in data)
+
+
+def fetch_fear_and_greed_index(limit=1, date_format=""):
     try:
-        resp = requests.get(
-            "https://api.alternative.me/fng/",
-            params=params, timeout=config.API_TIMEOUT,
-        )
-        resp.raise_for_status()
-        return "".join(str(d) for d in resp.json().get("data", []))
+        return _cached("fear_greed", f"fear_greed:{limit}:{date_format}:{int(config.PROMPT_COMPACT)}",
+                       lambda: _fetch_fear_and_greed(limit, date_format))
     except Exception as e:
         logger.error(f"Error fetching Fear & Greed Index: {e}")
         return "No fear and greed data available."
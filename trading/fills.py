@@ -0,0 +1,197 @@
+"""Fill simulation for backtests: slippage, partial fills and latency.
+
+A market order walks an orderbook (``trading.orderbook.Orderbook``), like
+``analyze_orderbook_depth`` does for live sizing.  The book comes from a
+depth model:
+
+  RecordedDepth  — the latest recorded snapshot at or before the fill time
+                   (from the orderbook recorder's store or a JSONL file),
+                   re-centred on the simulated price (sizes kept in BTC)
+  SyntheticDepth — evenly spaced levels with a fixed KRW notional each;
+                   ``SyntheticDepth.calibrate(snapshots)`` fits spread,
+                   level spacing, notional and level count
+
+Whatever the book cannot absorb is left unfilled.  ``latency`` moves the
+reference price from the signal price toward the next bar's price by
+``latency / bar_seconds`` before the book is walked.
+"""
+
+import bisect
+import json
+import logging
+import os
+from collections import namedtuple
+from statistics import median
+
+import config
+from trading.orderbook import Orderbook
+from trading.orderbook_store import OrderbookStore, to_epoch_ms
+from trading.utils import safe_float
+
+logger = logging.getLogger("autotrade")
+
+# qty: BTC filled; notional: KRW paid (buy) or received (sell), before fees
+Fill = namedtuple("Fill", ["side", "requested", "qty", "notional", "avg_price",
+                           "reference_price", "slippage_pct", "partial"])
+
+
+def walk_book(units, side, amount):
+    """Fill ``amount`` (KRW for a buy, BTC for a sell) against book levels.
+
+    Returns ``(qty_btc, notional_krw, remaining)`` where ``remaining`` is in
+    the units of ``amount``.
+    """
+    book = Orderbook.from_units(units)
+    quote = book.buy(amount) if side == "buy" else book.sell(amount)
+    return quote.qty, quote.notional, quote.remaining
+
+
+def _mid(orderbook):
+    units = orderbook.get("orderbook_units", [])
+    if not units:
+        return 0.0
+    ask, bid = safe_float(units[0].get("ask_price")), safe_float(units[0].get("bid_price"))
+    return (ask + bid) / 2 if ask > 0 and bid > 0 else max(ask, bid)
+
+
+# ---------------------------------------------------------------------------
+# Depth models: book(price, timestamp) -> orderbook_units
+# ---------------------------------------------------------------------------
+class SyntheticDepth:
+    """Symmetric book: ``levels`` per side, ``level_krw`` notional per level."""
+
+    def __init__(self, spread_bps=None, level_step_bps=None, level_krw=None, levels=None):
+        defaults = config.FILL_SYNTHETIC_DEPTH
+        self.spread_bps = defaults["spread_bps"] if spread_bps is None else spread_bps
+        self.level_step_bps = defaults["level_step_bps"] if level_step_bps is None else level_step_bps
+        self.level_krw = defaults["level_krw"] if level_krw is None else level_krw
+        self.levels = defaults["levels"] if levels is None else levels
+
+    def book(self, price, timestamp=None):
+        units = []
+        for i in range(self.levels):
+            offset = (self.spread_bps / 2 + i * self.level_step_bps) / 10_000
+            ask, bid = price * (1 + offset), price * (1 - offset)
+            units.append({"ask_price": ask, "ask_size": self.level_krw / ask,
+                          "bid_price": bid, "bid_size": self.level_krw / bid})
+        return units
+
+    @classmethod
+    def calibrate(cls, snapshots):
+        """Fit the model to recorded orderbooks (medians across snapshots)."""
+        spreads, steps, notionals, counts = [], [], [], []
+        for ob in snapshots:
+            units = ob.get("orderbook_units", [])
+            mid = _mid(ob)
+            if not units or mid <= 0:
+                continue
+            counts.append(len(units))
+            asks = [safe_float(u.get("ask_price")) for u in units]
+            bids = [safe_float(u.get("bid_price")) for u in units]
+            spreads.append((asks[0] - bids[0]) / mid * 10_000)
+            for side in (asks, bids):
+                steps.extend(abs(b - a) / mid * 10_000 for a, b in zip(side, side[1:]))
+            for u in units:
+                notionals.append(safe_float(u.get("ask_price")) * safe_float(u.get("ask_size")))
+                notionals.append(safe_float(u.get("bid_price")) * safe_float(u.get("bid_size")))
+        if not counts:
+            raise ValueError("No usable orderbook snapshots to calibrate from")
+        return cls(spread_bps=median(spreads), level_step_bps=median(steps) if steps else 0.0,
+                   level_krw=median(notionals), levels=int(median(counts)))
+
+    def __repr__(self):
+        return (f"SyntheticDepth(spread={self.spread_bps:.2f}bps, "
+                f"step={self.level_step_bps:.2f}bps, level={self.level_krw:,.0f} KRW, "
+                f"levels={self.levels})")
+
+
+def _two_sided(orderbook):
+    units = orderbook.get("orderbook_units") or []
+    return bool(units) and safe_float(units[0].get("ask_price")) > 0 \
+        and safe_float(units[0].get("bid_price")) > 0
+
+
+class RecordedDepth:
+    """Replays recorded snapshots, scaled to the simulated price.
+
+    Empty and one-sided snapshots have no mid to re-centre on and are skipped.
+    """
+
+    def __init__(self, snapshots):
+        snapshots = list(snapshots)
+        usable = sorted((s for s in snapshots if _two_sided(s)), key=lambda s: s["timestamp"])
+        if len(usable) < len(snapshots):
+            logger.warning(f"Skipped {len(snapshots) - len(usable)} empty or one-sided "
+                           f"orderbook snapshot(s)")
+        snapshots = usable
+        if not snapshots:
+            raise ValueError("RecordedDepth needs at least one two-sided snapshot")
+        self.snapshots = snapshots
+        self.times = [s["timestamp"] for s in snapshots]
+
+    def snapshot_at(self, timestamp=None):
+        if timestamp is None:
+            return self.snapshots[-1]
+        k = bisect.bisect_right(self.times, to_epoch_ms(timestamp)) - 1
+        return self.snapshots[max(k, 0)]
+
+    def book(self, price, timestamp=None):
+        snap = self.snapshot_at(timestamp)
+        scale = price / _mid(snap)
+        return [{**u,
+                 "ask_price": safe_float(u.get("ask_price")) * scale,
+                 "bid_price": safe_float(u.get("bid_price")) * scale}
+                for u in snap["orderbook_units"]]
+
+
+def load_snapshots(path, market=None, start=None, end=None):
+    """Orderbook snapshots from an ``OrderbookStore`` directory or a JSON-lines
+    file (one pyupbit orderbook per line)."""
+    if os.path.isdir(path):
+        return OrderbookStore(path).snapshots(market or config.ORDERBOOK_RECORD_MARKET,
+                                              start, end)
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ---------------------------------------------------------------------------
+# Simulator
+# ---------------------------------------------------------------------------
+class FillSimulator:
+    def __init__(self, depth, latency=None):
+        self.depth = depth
+        self.latency = config.FILL_LATENCY_SECONDS if latency is None else latency
+
+    def reference_price(self, price, next_price=None, bar_seconds=None):
+        """Price the order meets after ``latency``, interpolated toward the next bar."""
+        if not next_price or not bar_seconds or self.latency <= 0:
+            return price
+        return price + (next_price - price) * min(1.0, self.latency / bar_seconds)
+
+    def fill(self, side, amount, price, timestamp=None, next_price=None, bar_seconds=None):
+        """Simulate a market order; ``amount`` is KRW for a buy, BTC for a sell."""
+        ref = self.reference_price(price, next_price, bar_seconds)
+        qty, notional, remaining = walk_book(self.depth.book(ref, timestamp), side, amount)
+        avg = notional / qty if qty > 0 else ref
+        slippage = (avg - price) / price if side == "buy" else (price - avg) / price
+        return Fill(side, amount, qty, notional, avg, ref, slippage, remaining > 0)
+
+
+def make_fill_simulator(model=None, snapshots_path=None, latency=None):
+    """Build the simulator selected by ``FILL_MODEL`` (None for close-price fills)."""
+    model = model or config.FILL_MODEL
+    if model == "close":
+        return None
+    if model == "synthetic":
+        if snapshots_path:
+            depth = SyntheticDepth.calibrate(load_snapshots(snapshots_path))
+            logger.info(f"Calibrated {depth}")
+        else:
+            depth = SyntheticDepth()
+    elif model == "recorded":
+        if not snapshots_path:
+            raise ValueError("The recorded fill model needs orderbook snapshots")
+        depth = RecordedDepth(load_snapshots(snapshots_path))
+    else:
+        raise ValueError(f"Unknown fill model: {model}")
+    return FillSimulator(depth, latency)
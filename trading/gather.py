@@ -0,0 +1,89 @@
+"""Concurrent gathering of the independent inputs for a decision cycle."""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+
+logger = logging.getLogger("autotrade")
+
+
+def _timed(fn, *args):
+    """Run ``fn`` and return ``(ok, value_or_exception, elapsed_seconds)``."""
+    start = time.monotonic()
+    try:
+        return True, fn(*args), time.monotonic() - start
+    except Exception as e:
+        return False, e, time.monotonic() - start
+
+
+def gather_sources(sources, timeouts=None, max_workers=None):
+    """Run data sources concurrently with per-source deadlines.
+
+    ``sources`` maps a name to a spec dict:
+      fn       — callable; receives the parent's value when ``after`` is set
+      after    — name of a source whose result this one needs (optional)
+      fallback — value used when the source fails or times out (optional)
+
+    Returns ``{"values", "latency", "errors"}``.  A failed or timed-out
+    source gets its fallback value and an entry in ``errors``; sources
+    depending on it are skipped the same way.  Timed-out work is abandoned
+    rather than waited for.
+    """
+    timeouts = timeouts or {}
+    values, latency, errors = {}, {}, {}
+    children = {}
+    for name, spec in sources.items():
+        if spec.get("after"):
+            children.setdefault(spec["after"], []).append(name)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers or len(sources),
+                              thread_name_prefix="gather")
+    pending, started, deadlines = {}, {}, {}
+
+    def submit(name, *args):
+        started[name] = time.monotonic()
+        deadlines[name] = started[name] + timeouts.get(name, config.API_TIMEOUT)
+        pending[pool.submit(_timed, sources[name]["fn"], *args)] = name
+
+    def fail(name, message):
+        errors[name] = message
+        values[name] = sources[name].get("fallback")
+        for child in children.get(name, []):
+            fail(child, f"skipped: {name} unavailable")
+
+    try:
+        for name, spec in sources.items():
+            if not spec.get("after"):
+                submit(name)
+
+        while pending:
+            wait_for = max(0.0, min(deadlines[n] for n in pending.values()) - time.monotonic())
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                ok, value, elapsed = future.result()
+                latency[name] = elapsed
+                if ok:
+                    values[name] = value
+                    for child in children.get(name, []):
+                        submit(child, value)
+                else:
+                    fail(name, f"{type(value).__name__}: {value}")
+
+            now = time.monotonic()
+            for future, name in list(pending.items()):
+                if now >= deadlines[name]:
+                    future.cancel()
+                    del pending[future]
+                    latency[name] = now - started[name]
+                    fail(name, f"timed out after {latency[name]:.1f}s")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    logger.info("Input latency: " + ", ".join(
+        f"{n}={latency[n] * 1000:.0f}ms" for n in sources if n in latency))
+    for name, message in errors.items():
+        logger.warning(f"Source '{name}' degraded: {message}")
+    return {"values": values, "latency": latency, "errors": errors}
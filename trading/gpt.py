@@ -1,13 +1,34 @@
-"""GPT/LLM analysis integration."""
+"""GPT/LLM analysis integration.
 
+With an async client configured, analysis requests are streamed so
+time-to-first-byte can be recorded, bounded by ``GPT_DEADLINE_SECONDS``, and
+optionally hedged: if the primary request is slower than the recent latency
+percentile, a second request (or a fallback model) is fired and whichever
+finishes first wins.  In-flight requests can be cancelled from any thread.
+
+Requests and responses are recorded in the content-addressed LLM cache; in
+replay mode the cached response is returned and the API is never called.
+"""
+
+import asyncio
+import concurrent.futures
 import logging
+import threading
+import time
+from collections import deque
 
 import config
+from trading.charts import get_preset, image_mime
+from trading.llm_cache import get_store, request_key
+from trading.prompt import (
+    PromptBuilder, count_tokens, encode_status, shrink_frames, shrink_rows,
+)
 
 logger = logging.getLogger("autotrade")
 
 # Lazy init — set from autotrade_v3 main
 client = None
+async_client = None
 
 
 def set_client(openai_client):
@@ -15,6 +36,11 @@ def set_client(openai_client):
     client = openai_client
 
 
+def set_async_client(openai_async_client):
+    global async_client
+    async_client = openai_async_client
+
+
 def get_instructions(file_path):
     try:
         with open(file_path, "r", encoding="utf-8") as f:
@@ -26,12 +52,8 @@ def get_instructions(file_path):
     return None
 
 
-def analyze_data_with_gpt4(news_data, data_json, last_decisions,
-                           fear_and_greed, current_status, chart_base64):
-    instructions = get_instructions("instructions_v3.md")
-    if not instructions:
-        return None
-
+def build_messages(instructions, news_data, data_json, last_decisions,
+                   fear_and_greed, current_status, chart_base64):
     messages = [
         {"role": "system", "content": instructions},
         {"role": "user", "content": news_data},
@@ -45,17 +67,239 @@ def analyze_data_with_gpt4(news_data, data_json, last_decisions,
             "role": "user",
             "content": [
                 {"type": "image_url",
-                 "image_url": {"url": f"data:image/png;base64,{chart_base64}"}},
+                 "image_url": {"url": f"data:{image_mime()};base64,{chart_base64}",
+                               "detail": get_preset().get("detail", "auto")}},
             ],
         })
+    return messages
+
+
+def fit_prompt(instructions, news_data, data_json, last_decisions,
+               fear_and_greed, current_status):
+    """Compact the text sections into ``PROMPT_TOKEN_BUDGET`` and log their sizes.
+
+    Market data is trimmed last; news goes first.  Returns the sections in
+    ``build_messages`` order.
+    """
+    if config.PROMPT_COMPACT:
+        try:
+            current_status = encode_status(current_status)
+        except Exception as e:
+            logger.error(f"Error compacting current status: {e}")
+    builder = PromptBuilder(config.PROMPT_TOKEN_BUDGET - count_tokens(instructions))
+    builder.add("news", news_data, priority=3, shrink=shrink_rows)
+    builder.add("market_data", data_json, priority=1, shrink=shrink_frames)
+    builder.add("last_decisions", last_decisions, priority=2, shrink=shrink_rows)
+    builder.add("fear_greed", fear_and_greed, priority=2, shrink=shrink_rows)
+    builder.add("current_status", current_status)
+    sections, report = builder.build()
+    report = {"instructions": count_tokens(instructions), **report}
+    report["total"] += report["instructions"]
+    logger.info("Prompt tokens: " + ", ".join(f"{k}={v}" for k, v in report.items()))
+    return sections
+
+
+# ---------------------------------------------------------------------------
+# Latency tracking
+# ---------------------------------------------------------------------------
+class LatencyTracker:
+    """Rolling window of completed-call latencies, plus a per-call log."""
+
+    def __init__(self, window=None):
+        self.window = window or config.GPT_LATENCY_WINDOW
+        self.totals = deque(maxlen=self.window)
+        self.calls = deque(maxlen=self.window)
+        self.lock = threading.Lock()
+
+    def record(self, model, ttfb, total, outcome, hedge=False):
+        entry = {"model": model, "ttfb": ttfb, "total": total,
+                 "outcome": outcome, "hedge": hedge}
+        with self.lock:
+            self.calls.append(entry)
+            if outcome == "ok":
+                self.totals.append(total)
+        ttfb_s = f"{ttfb:.2f}s" if ttfb is not None else "-"
+        logger.info(f"GPT call {model}{' (hedge)' if hedge else ''}: {outcome}, "
+                    f"ttfb={ttfb_s} total={total:.2f}s")
+        return entry
+
+    @staticmethod
+    def _rank(data, pct):
+        if not data:
+            return None
+        k = min(len(data) - 1, max(0, round(pct / 100 * (len(data) - 1))))
+        return data[k]
+
+    def percentile(self, pct):
+        with self.lock:
+            data = sorted(self.totals)
+        return self._rank(data, pct)
+
+    def hedge_delay(self):
+        """Seconds to wait on the primary before firing the hedge."""
+        with self.lock:  # count and percentile from one snapshot
+            data = sorted(self.totals)
+        if len(data) < config.GPT_HEDGE_MIN_SAMPLES:
+            return config.GPT_HEDGE_DELAY_SECONDS
+        return self._rank(data, config.GPT_HEDGE_PERCENTILE)
+
+
+latency = LatencyTracker()
+
+
+# ---------------------------------------------------------------------------
+# Async path
+# ---------------------------------------------------------------------------
+_inflight = set()  # (loop, task)
+_inflight_lock = threading.Lock()
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    """Event loop thread the async client lives on (its pool is bound to one loop)."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="gpt-loop", daemon=True).start()
+        return _loop
+
+
+def cancel_inflight():
+    """Cancel every in-flight analysis request (safe from any thread)."""
+    with _inflight_lock:
+        pending = list(_inflight)
+    for loop, task in pending:
+        loop.call_soon_threadsafe(task.cancel)
+    if pending:
+        logger.info(f"Cancelled {len(pending)} in-flight GPT request(s)")
 
+
+async def _request(model, messages, hedge=False):
+    """Stream one completion, recording time-to-first-byte and total latency.
+
+    Returns ``(model, response)``.
+    """
+    started = time.monotonic()
+    ttfb = None
+    parts = []
     try:
-        resp = client.chat.completions.create(
-            model=config.OPENAI_MODEL,
+        stream = await async_client.chat.completions.create(
+            model=model,
             messages=messages,
             response_format={"type": "json_object"},
+            stream=True,
         )
-        return resp.choices[0].message.content
+        async for chunk in stream:
+            if ttfb is None:
+                ttfb = time.monotonic() - started
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+    except asyncio.CancelledError:
+        latency.record(model, ttfb, time.monotonic() - started, "cancelled", hedge)
+        raise
+    except Exception:
+        latency.record(model, ttfb, time.monotonic() - started, "error", hedge)
+        raise
+    latency.record(model, ttfb, time.monotonic() - started, "ok", hedge)
+    return model, "".join(parts)
+
+
+async def _hedged(messages, hedge):
+    primary = asyncio.create_task(_request(config.OPENAI_MODEL, messages))
+    tasks = {primary}
+    try:
+        if hedge:
+            done, _ = await asyncio.wait(tasks, timeout=latency.hedge_delay())
+            if not done:
+                model = config.GPT_HEDGE_MODEL or config.OPENAI_MODEL
+                logger.warning(f"GPT primary slow; hedging with {model}")
+                tasks.add(asyncio.create_task(_request(model, messages, hedge=True)))
+
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _analyze(messages, deadline=None, hedge=None):
+    """``(model, response)`` of a (possibly hedged) request under a hard deadline."""
+    deadline = config.GPT_DEADLINE_SECONDS if deadline is None else deadline
+    hedge = config.GPT_HEDGE_ENABLED if hedge is None else hedge
+    entry = (asyncio.get_running_loop(), asyncio.current_task())
+    with _inflight_lock:
+        _inflight.add(entry)
+    try:
+        return await asyncio.wait_for(_hedged(messages, hedge), deadline)
+    finally:
+        with _inflight_lock:
+            _inflight.discard(entry)
+
+
+async def analyze_async(messages, deadline=None, hedge=None):
+    """Run a (possibly hedged) analysis request under a hard deadline."""
+    _, response = await _analyze(messages, deadline, hedge)
+    return response
+
+
+def _store_response(key, model, messages, response, elapsed):
+    """Record ``response`` under the request ``key``; ``model`` is the one that
+    answered (the hedge model when it won the race)."""
+    if config.LLM_CACHE_MODE != "record" or not response:
+        return
+    try:
+        get_store().put(key, model, messages, response, latency=elapsed)
+    except Exception as e:
+        logger.error(f"Error storing LLM response: {e}")
+
+
+def analyze_data_with_gpt4(news_data, data_json, last_decisions,
+                           fear_and_greed, current_status, chart_base64):
+    instructions = get_instructions("instructions_v3.md")
+    if not instructions:
+        return None
+
+    sections = fit_prompt(instructions, news_data, data_json, last_decisions,
+                          fear_and_greed, current_status)
+    messages = build_messages(instructions, *sections, chart_base64)
+    key = request_key(config.OPENAI_MODEL, messages)
+
+    if config.LLM_CACHE_MODE == "replay":
+        record = get_store().get(key)
+        if record is None:
+            logger.warning(f"LLM cache miss in replay mode: {key[:12]}")
+            return None
+        return record["response"]
+
+    try:
+        started = time.monotonic()
+        if async_client is not None and config.GPT_ASYNC_ENABLED:
+            future = asyncio.run_coroutine_threadsafe(_analyze(messages), _get_loop())
+            model, response = future.result()
+        else:
+            resp = client.chat.completions.create(
+                model=config.OPENAI_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"},
+                timeout=config.GPT_DEADLINE_SECONDS,
+            )
+            model, response = config.OPENAI_MODEL, resp.choices[0].message.content
+        _store_response(key, model, messages, response, time.monotonic() - started)
+        return response
+    except asyncio.TimeoutError:
+        logger.error(f"GPT analysis exceeded {config.GPT_DEADLINE_SECONDS}s deadline")
+        return None
+    except (asyncio.CancelledError, concurrent.futures.CancelledError):
+        logger.warning("GPT analysis cancelled")
+        return None
     except Exception as e:
         logger.error(f"GPT analysis error: {e}")
         return None
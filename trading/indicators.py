@@ -1,7 +1,11 @@
 """Technical indicator calculation and support/resistance detection."""
 
 import logging
+import math
+import sys
+from collections import deque
 
+import pandas as pd
 import pandas_ta as ta
 
 import config
@@ -64,3 +68,248 @@ def detect_support_resistance(df, window=10):
             "nearest_resistance": None, "nearest_support": None,
             "resistance_levels": [], "support_levels": [],
         }
+
+
+# ---------------------------------------------------------------------------
+# Incremental (streaming) indicators
+# ---------------------------------------------------------------------------
+_NAN = float("nan")
+_EPSILON = sys.float_info.epsilon
+
+
+def _ewm(prev, value, alpha):
+    """One step of pandas ``ewm(adjust=False)``; None means not started."""
+    if prev is None:
+        return value
+    return (1 - alpha) * prev + alpha * value
+
+
+def _mean(values):
+    return sum(values) / len(values)
+
+
+def _std(values):
+    mean = _mean(values)
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+
+
+def _ratio(num, den):
+    return num / den if den else _NAN
+
+
+class IndicatorState:
+    """Incremental counterpart of ``add_indicators``.
+
+    Feed candles one at a time with ``update``; each call costs O(1) (only
+    fixed-size windows are kept) and returns that candle's indicator values,
+    matching ``add_indicators`` within floating-point tolerance.  The state
+    round-trips through ``snapshot``/``restore`` as a JSON-friendly dict, so
+    a live bot can keep it warm between cycles.
+    """
+
+    SMA_LENGTH = 10
+    EMA_LENGTH = 10
+    RSI_LENGTH = 14
+    STOCH_K, STOCH_D, STOCH_SMOOTH = 14, 3, 3
+    MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+    BB_LENGTH = 20
+    ATR_LENGTH = 14
+    ADXR_LENGTH = 2
+
+    _WINDOWS = ("closes", "highs", "lows", "stoch_raw", "stoch_k",
+                "tr_seed", "adx_hist")
+
+    def __init__(self, adx_length=None):
+        self.adx_length = adx_length or config.ADX_LENGTH
+        self.count = 0
+        self.prev_high = self.prev_low = self.prev_close = None
+        self.closes = deque(maxlen=max(self.BB_LENGTH, self.SMA_LENGTH))
+        self.highs = deque(maxlen=self.STOCH_K)
+        self.lows = deque(maxlen=self.STOCH_K)
+        self.stoch_raw = deque(maxlen=self.STOCH_SMOOTH)
+        self.stoch_k = deque(maxlen=self.STOCH_D)
+        self.tr_seed = deque(maxlen=max(self.ATR_LENGTH, self.adx_length))
+        self.adx_hist = deque(maxlen=self.ADXR_LENGTH + 1)
+        self.ema = None
+        self.rsi_gain = self.rsi_loss = None
+        self.macd_fast = self.macd_slow = self.macd_signal = None
+        self.atr = None
+        self.adx_atr = None
+        self.dm_pos = self.dm_neg = None
+        self.adx = None
+        self.cum_pv = self.cum_vol = 0.0
+
+    @property
+    def columns(self):
+        k = f"_{self.STOCH_K}_{self.STOCH_D}_{self.STOCH_SMOOTH}"
+        n = self.adx_length
+        return [
+            "SMA_10", "EMA_10", "RSI_14",
+            f"STOCHk{k}", f"STOCHd{k}", f"STOCHh{k}",
+            "MACD", "Signal_Line", "MACD_Histogram",
+            "Middle_Band", "Upper_Band", "Lower_Band",
+            "ATR_14", "VWAP",
+            f"ADX_{n}", f"ADXR_{n}_{self.ADXR_LENGTH}", f"DMP_{n}", f"DMN_{n}",
+        ]
+
+    def update(self, candle):
+        """Consume one OHLCV candle (mapping or Series) and return its indicators."""
+        high = float(candle["high"])
+        low = float(candle["low"])
+        close = float(candle["close"])
+        volume = float(candle["volume"])
+        t = self.count
+        row = dict.fromkeys(self.columns, _NAN)
+
+        self.closes.append(close)
+        self.highs.append(high)
+        self.lows.append(low)
+        closes = list(self.closes)
+
+        # SMA / EMA (EMA seeded with the SMA of the first window)
+        if t >= self.SMA_LENGTH - 1:
+            row["SMA_10"] = _mean(closes[-self.SMA_LENGTH:])
+        if t == self.EMA_LENGTH - 1:
+            self.ema = _mean(closes[-self.EMA_LENGTH:])
+        elif t >= self.EMA_LENGTH:
+            self.ema = _ewm(self.ema, close, 2 / (self.EMA_LENGTH + 1))
+        if self.ema is not None:
+            row["EMA_10"] = self.ema
+
+        # RSI (Wilder smoothing of gains/losses)
+        if self.prev_close is not None:
+            diff = close - self.prev_close
+            alpha = 1 / self.RSI_LENGTH
+            self.rsi_gain = _ewm(self.rsi_gain, max(diff, 0.0), alpha)
+            self.rsi_loss = _ewm(self.rsi_loss, min(diff, 0.0), alpha)
+            row["RSI_14"] = _ratio(100 * self.rsi_gain,
+                                   self.rsi_gain + abs(self.rsi_loss))
+
+        # Stochastic
+        if t >= self.STOCH_K - 1:
+            ll, hh = min(self.lows), max(self.highs)
+            self.stoch_raw.append(100 * (close - ll) / ((hh - ll) or _EPSILON))
+            if len(self.stoch_raw) == self.STOCH_SMOOTH:
+                k_value = _mean(self.stoch_raw)
+                self.stoch_k.append(k_value)
+                row[self.columns[3]] = k_value
+                if len(self.stoch_k) == self.STOCH_D:
+                    d_value = _mean(self.stoch_k)
+                    row[self.columns[4]] = d_value
+                    row[self.columns[5]] = k_value - d_value
+
+        # MACD
+        self.macd_fast = _ewm(self.macd_fast, close, 2 / (self.MACD_FAST + 1))
+        self.macd_slow = _ewm(self.macd_slow, close, 2 / (self.MACD_SLOW + 1))
+        macd = self.macd_fast - self.macd_slow
+        self.macd_signal = _ewm(self.macd_signal, macd, 2 / (self.MACD_SIGNAL + 1))
+        row["MACD"] = macd
+        row["Signal_Line"] = self.macd_signal
+        row["MACD_Histogram"] = macd - self.macd_signal
+
+        # Bollinger Bands
+        if t >= self.BB_LENGTH - 1:
+            window = closes[-self.BB_LENGTH:]
+            mid, std = _mean(window), _std(window)
+            row["Middle_Band"] = mid
+            row["Upper_Band"] = mid + std * 2
+            row["Lower_Band"] = mid - std * 2
+
+        # True range: the first bar uses high-low for ATR but is NaN for ADX
+        if self.prev_close is None:
+            tr = high - low
+        else:
+            pc = self.prev_close
+            tr = max(high - low, abs(high - pc), abs(pc - low))
+        if t < self.tr_seed.maxlen:
+            self.tr_seed.append(tr)
+
+        # ATR (Wilder, seeded with the SMA of the first window)
+        if t == self.ATR_LENGTH - 1:
+            self.atr = _mean(list(self.tr_seed)[:self.ATR_LENGTH])
+        elif t >= self.ATR_LENGTH:
+            self.atr = _ewm(self.atr, tr, 1 / self.ATR_LENGTH)
+        if self.atr is not None:
+            row["ATR_14"] = self.atr
+
+        # VWAP
+        self.cum_pv += (high + low + close) / 3 * volume
+        self.cum_vol += volume
+        row["VWAP"] = _ratio(self.cum_pv, self.cum_vol)
+
+        # ADX / DMI
+        n = self.adx_length
+        if self.prev_high is not None:
+            up = high - self.prev_high
+            dn = self.prev_low - low
+            pos = up if (up > dn and up > 0) else 0.0
+            neg = dn if (dn > up and dn > 0) else 0.0
+            pos = 0.0 if abs(pos) < _EPSILON else pos
+            neg = 0.0 if abs(neg) < _EPSILON else neg
+            self.dm_pos = _ewm(self.dm_pos, pos, 1 / n)
+            self.dm_neg = _ewm(self.dm_neg, neg, 1 / n)
+        if t == n - 1:
+            self.adx_atr = _mean(list(self.tr_seed)[1:n])
+        elif t >= n:
+            self.adx_atr = _ewm(self.adx_atr, tr, 1 / n)
+        if self.adx_atr is not None and self.dm_pos is not None:
+            scale = 100 / self.adx_atr
+            dmp, dmn = scale * self.dm_pos, scale * self.dm_neg
+            dx = _ratio(100 * abs(dmp - dmn), dmp + dmn)
+            if not math.isnan(dx):
+                self.adx = _ewm(self.adx, dx, 1 / n)
+            self.adx_hist.append(self.adx if self.adx is not None else _NAN)
+            row[f"DMP_{n}"] = dmp
+            row[f"DMN_{n}"] = dmn
+            if self.adx is not None:
+                row[f"ADX_{n}"] = self.adx
+            if len(self.adx_hist) > self.ADXR_LENGTH:
+                row[f"ADXR_{n}_{self.ADXR_LENGTH}"] = 0.5 * (self.adx_hist[-1] + self.adx_hist[0])
+
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+        self.count += 1
+        return row
+
+    def snapshot(self):
+        """Return the full state as a JSON-serializable dict."""
+        state = {}
+        for key, value in self.__dict__.items():
+            if isinstance(value, deque):
+                value = [None if math.isnan(v) else v for v in value]
+            state[key] = value
+        return state
+
+    @classmethod
+    def restore(cls, snapshot):
+        """Rebuild a state object from ``snapshot()`` output."""
+        state = cls(snapshot.get("adx_length"))
+        for key, value in snapshot.items():
+            if key in cls._WINDOWS:
+                window = getattr(state, key)
+                window.extend(_NAN if v is None else v for v in value)
+            else:
+                setattr(state, key, value)
+        return state
+
+    @classmethod
+    def from_frame(cls, df):
+        """Warm up a state from an OHLCV DataFrame."""
+        state = cls()
+        for candle in df[["open", "high", "low", "close", "volume"]].to_dict("records"):
+            state.update(candle)
+        return state
+
+
+def stream_indicators(df, state=None):
+    """Compute indicators by streaming ``df`` through an ``IndicatorState``.
+
+    Returns ``(df_with_indicators, state)``; pass ``state`` back in with the
+    next batch of candles to continue without recomputing history.
+    """
+    state = state or IndicatorState()
+    rows = [state.update(c)
+            for c in df[["open", "high", "low", "close", "volume"]].to_dict("records")]
+    out = df.copy()
+    if rows:
+        out = out.join(pd.DataFrame(rows, index=df.index, columns=state.columns))
+    return out, state
@@ -0,0 +1,201 @@
+"""Content-addressed store of LLM requests and responses, plus recorded cycles.
+
+Every analysis request is keyed by a hash of its normalized inputs (model
+and messages).  Message parts are stored once as blobs named by their own
+SHA-256, so the instructions and repeated charts cost nothing after the
+first cycle.  Layout under ``LLM_CACHE_DIR``:
+
+    blobs/ab/abcdef...      raw message contents and cycle inputs
+    responses/ab/abcd....json  {key, model, messages: [blob refs], response, ...}
+    cycles.jsonl            one line per analysis cycle: input blob refs + context
+
+``LLM_CACHE_MODE`` selects "record" (call the API and store), "replay"
+(serve stored responses, never call the API) or "off" (the default).
+Nothing is pruned, so recording is meant to be switched on for a period
+whose cycles should be replayable, not left on indefinitely.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import config
+
+logger = logging.getLogger("autotrade")
+
+CACHE_MODES = ("off", "record", "replay")
+
+
+def _sha256(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _canonical_text(text):
+    """JSON payloads are re-serialized sorted and compact; other text is stripped."""
+    stripped = text.strip()
+    if stripped[:1] in ("{", "["):
+        try:
+            return json.dumps(json.loads(stripped), sort_keys=True,
+                              separators=(",", ":"), ensure_ascii=False)
+        except ValueError:
+            pass
+    return stripped
+
+
+def normalize_messages(messages):
+    """Messages with canonical text and image payloads replaced by their digest."""
+    out = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            content = _canonical_text(content)
+        else:
+            parts = []
+            for part in content:
+                if part.get("type") == "image_url":
+                    url = part["image_url"]["url"]
+                    parts.append({"type": "image_url", "sha256": _sha256(url.split(",", 1)[-1]),
+                                  "detail": part["image_url"].get("detail")})
+                elif "text" in part:
+                    parts.append({**part, "text": _canonical_text(part["text"])})
+                else:
+                    parts.append(part)
+            content = parts
+        out.append({"role": message["role"], "content": content})
+    return out
+
+
+def request_key(model, messages):
+    """Stable key for an analysis request; insensitive to JSON formatting."""
+    payload = json.dumps({"model": model, "messages": normalize_messages(messages)},
+                         sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return _sha256(payload)
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class ResponseStore:
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    def _path(self, kind, digest, suffix=""):
+        return os.path.join(self.root, kind, digest[:2], digest + suffix)
+
+    # -- blobs -------------------------------------------------------------
+    def put_blob(self, text):
+        digest = _sha256(text)
+        path = self._path("blobs", digest)
+        if not os.path.exists(path):
+            _atomic_write(path, text.encode("utf-8"))
+        return digest
+
+    def get_blob(self, digest):
+        with open(self._path("blobs", digest), "r", encoding="utf-8") as f:
+            return f.read()
+
+    # -- responses ---------------------------------------------------------
+    def put(self, key, model, messages, response, **meta):
+        refs = []
+        for message in messages:
+            content = message["content"]
+            if not isinstance(content, str):
+                content = json.dumps(content, separators=(",", ":"))
+            refs.append({"role": message["role"], "blob": self.put_blob(content),
+                         "json": not isinstance(message["content"], str)})
+        record = {"key": key, "model": model, "messages": refs, "response": response,
+                  "recorded_at": time.time(), **meta}
+        _atomic_write(self._path("responses", key, ".json"),
+                      json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        with self.lock:
+            self.stats["writes"] += 1
+
+    def get(self, key):
+        """Stored record for ``key`` or None."""
+        try:
+            with open(self._path("responses", key, ".json"), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            record = None
+        with self.lock:
+            self.stats["hits" if record else "misses"] += 1
+        return record
+
+    def load_messages(self, record):
+        """Rebuild the full message list of a stored record."""
+        messages = []
+        for ref in record["messages"]:
+            content = self.get_blob(ref["blob"])
+            messages.append({"role": ref["role"],
+                             "content": json.loads(content) if ref["json"] else content})
+        return messages
+
+    # -- cycles ------------------------------------------------------------
+    def record_cycle(self, inputs, context=None):
+        """Append one analysis cycle: named text inputs plus JSON-able context."""
+        line = {"recorded_at": time.time(),
+                "inputs": {name: self.put_blob(text or "") for name, text in inputs.items()},
+                "context": context or {}}
+        os.makedirs(self.root, exist_ok=True)
+        with self.lock, open(os.path.join(self.root, "cycles.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, default=float) + "\n")
+
+    def cycles(self):
+        """Yield recorded cycles in order with their inputs loaded."""
+        try:
+            f = open(os.path.join(self.root, "cycles.jsonl"), "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if not line.strip():
+                    continue
+                cycle = json.loads(line)
+                cycle["inputs"] = {name: self.get_blob(digest)
+                                   for name, digest in cycle["inputs"].items()}
+                yield cycle
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResponseStore(config.LLM_CACHE_DIR)
+        return _store
+
+
+def set_store(store):
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def record_cycle(inputs, context=None):
+    """Record a cycle's inputs when recording is on; never raises."""
+    if config.LLM_CACHE_MODE != "record":
+        return
+    try:
+        get_store().record_cycle(inputs, context)
+    except Exception as e:
+        logger.error(f"Error recording cycle: {e}")
@@ -3,30 +3,23 @@
 import base64
 import json
 import logging
+import os
 import time
-from io import BytesIO
 
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import mplfinance as mpf
 import pandas as pd
 import pyupbit
 
 import config
 from trading.utils import safe_float
+from trading.account import get_account
 from trading.indicators import add_indicators, detect_support_resistance
+from trading.charts import get_chart, get_preset
+from trading.prompt import encode_frames
 
 logger = logging.getLogger("autotrade")
 
-# Lazy init — set from autotrade_v3 main
-upbit = None
-
-
-def set_upbit(upbit_instance):
-    global upbit
-    upbit = upbit_instance
-
+DAILY_BARS = 30   # candles per timeframe in each analysis cycle
+HOURLY_BARS = 24
 
 def get_current_status():
     orderbook = pyupbit.get_orderbook(ticker="KRW-BTC")
@@ -35,12 +28,11 @@ def get_current_status():
     current_time = orderbook.get("timestamp", int(time.time() * 1000))
     btc_balance = krw_balance = btc_avg_buy_price = 0
     try:
-        for b in upbit.get_balances():
-            if b["currency"] == "BTC":
-                btc_balance = safe_float(b.get("balance"))
-                btc_avg_buy_price = safe_float(b.get("avg_buy_price"))
-            if b["currency"] == "KRW":
-                krw_balance = safe_float(b.get("balance"))
+        balances = get_account().snapshot()
+        btc = balances.get("BTC", {})
+        btc_balance = btc.get("balance", 0.0)
+        btc_avg_buy_price = btc.get("avg_buy_price", 0.0)
+        krw_balance = balances.get("KRW", {}).get("balance", 0.0)
     except Exception as e:
         logger.error(f"Error getting balances: {e}")
 
@@ -112,72 +104,47 @@ def build_market_context(df_hourly):
 
 
 def fetch_and_prepare_data():
-    df_daily = pyupbit.get_ohlcv("KRW-BTC", "day", count=30)
-    df_hourly = pyupbit.get_ohlcv("KRW-BTC", interval="minute60", count=24)
+    df_daily = pyupbit.get_ohlcv("KRW-BTC", "day", count=DAILY_BARS)
+    df_hourly = pyupbit.get_ohlcv("KRW-BTC", interval="minute60", count=HOURLY_BARS)
     if df_daily is None or df_hourly is None:
         raise ValueError("Failed to fetch OHLCV data from Upbit")
+    combined_json, market_ctx, _, df_hourly = prepare_market_data(df_daily, df_hourly)
+    return combined_json, market_ctx, df_hourly
+
 
-    df_daily = add_indicators(df_daily)
-    df_hourly = add_indicators(df_hourly)
+def prepare_market_data(df_daily, df_hourly):
+    """Prompt JSON, market context and indicator frames from raw candles.
 
-    combined = pd.concat([df_daily, df_hourly], keys=["daily", "hourly"])
-    combined_json = combined.to_json(orient="split")
+    Shared by the live cycle and the historical backtest so both feed the
+    model identical inputs.  Returns ``(json, market_ctx, df_daily, df_hourly)``.
+    """
+    return encode_market_data(add_indicators(df_daily), add_indicators(df_hourly))
+
+
+def encode_market_data(df_daily, df_hourly):
+    """``prepare_market_data`` for frames that already carry indicators."""
+    if config.PROMPT_COMPACT:
+        combined_json = encode_frames({"daily": df_daily, "hourly": df_hourly})
+    else:
+        combined = pd.concat([df_daily, df_hourly], keys=["daily", "hourly"])
+        combined_json = combined.to_json(orient="split")
     market_ctx = build_market_context(df_hourly)
-    return combined_json, market_ctx, df_hourly
+    return combined_json, market_ctx, df_daily, df_hourly
 
 
 def generate_chart_image(df_hourly):
-    """Generate a candlestick chart with BB, MACD, RSI using mplfinance."""
+    """Render (or fetch from cache) the hourly chart as base64 for the LLM."""
     try:
-        df = df_hourly.copy()
-        df.index = pd.to_datetime(df.index)
-
-        bb_upper = df["Upper_Band"]
-        bb_lower = df["Lower_Band"]
-        bb_mid = df["Middle_Band"]
-        macd = df["MACD"]
-        signal_line = df["Signal_Line"]
-        hist = df["MACD_Histogram"]
-        rsi = df["RSI_14"]
-        rsi_70 = pd.Series(70.0, index=df.index)
-        rsi_30 = pd.Series(30.0, index=df.index)
-
-        hist_colors = ["#26a69a" if v >= 0 else "#ef5350" for v in hist.fillna(0)]
-
-        apds = [
-            mpf.make_addplot(bb_upper, color="steelblue", linestyle="dashed", width=0.7),
-            mpf.make_addplot(bb_lower, color="steelblue", linestyle="dashed", width=0.7),
-            mpf.make_addplot(bb_mid, color="steelblue", width=0.5, alpha=0.5),
-            mpf.make_addplot(df["SMA_10"], color="orange", width=0.8),
-            mpf.make_addplot(df["EMA_10"], color="cyan", width=0.8),
-            mpf.make_addplot(macd, panel=2, color="blue", ylabel="MACD"),
-            mpf.make_addplot(signal_line, panel=2, color="orange"),
-            mpf.make_addplot(hist, panel=2, type="bar", color=hist_colors),
-            mpf.make_addplot(rsi, panel=3, color="purple", ylabel="RSI"),
-            mpf.make_addplot(rsi_70, panel=3, color="red", linestyle="--", width=0.5, alpha=0.5),
-            mpf.make_addplot(rsi_30, panel=3, color="green", linestyle="--", width=0.5, alpha=0.5),
-        ]
-
-        fig, _ = mpf.plot(
-            df, type="candle", style="charles",
-            addplot=apds, volume=True,
-            title="KRW-BTC 1H Chart",
-            figratio=(16, 10), figscale=1.2,
-            panel_ratios=(4, 1, 1, 1),
-            returnfig=True,
-        )
-
-        buf = BytesIO()
-        fig.savefig(buf, format="png", dpi=100, bbox_inches="tight")
-        plt.close(fig)
-        buf.seek(0)
+        image = get_chart(df_hourly)
 
-        with open(config.SCREENSHOT_PATH, "wb") as f:
-            f.write(buf.getvalue())
-        buf.seek(0)
+        path = config.SCREENSHOT_PATH
+        if get_preset()["format"] != "png":
+            path = os.path.splitext(path)[0] + ".jpg"
+        with open(path, "wb") as f:
+            f.write(image)
 
-        logger.info("Chart image generated successfully")
-        return base64.b64encode(buf.read()).decode("utf-8")
+        logger.info(f"Chart image ready ({len(image) / 1024:.0f} KB)")
+        return base64.b64encode(image).decode("utf-8")
     except Exception as e:
         logger.error(f"Error generating chart image: {e}")
         return ""
@@ -1,48 +1,154 @@
-"""Orderbook depth analysis for slippage estimation."""
+"""Orderbook depth analysis for slippage estimation.
+
+``Orderbook`` is built once per snapshot: per side it keeps price and size
+arrays plus cumulative BTC and KRW, so a fill for any order size is one
+``searchsorted`` into the cumulative column and a partial final level.
+Every query accepts a scalar or an array of sizes.
+"""
 
 import logging
+from collections import namedtuple
+
+import numpy as np
 
 from trading.utils import safe_float
 
 logger = logging.getLogger("autotrade")
 
+# Arrays (or scalars) per queried size.  qty: BTC; notional: KRW before fees;
+# remaining: unfilled part in the units of the query.
+DepthQuote = namedtuple("DepthQuote", ["qty", "notional", "avg_price", "slippage_pct", "remaining"])
+
+
+class _Side:
+    """Price levels of one side, best first, with cumulative BTC and KRW."""
+
+    def __init__(self, prices, sizes):
+        prices = np.asarray(prices, dtype=float)
+        sizes = np.asarray(sizes, dtype=float)
+        keep = (prices > 0) & (sizes > 0)
+        self.prices = prices[keep]
+        self.sizes = sizes[keep]
+        self.cum_btc = np.cumsum(self.sizes)
+        self.cum_krw = np.cumsum(self.prices * self.sizes)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def take(self, amounts, cum):
+        """Fill ``amounts`` measured in ``cum`` units (cum_krw or cum_btc).
+
+        Returns ``(qty, notional)``; a size beyond the book takes it all.
+        """
+        k = np.searchsorted(cum, amounts, side="left")
+        full = k >= len(cum)
+        k = np.minimum(k, len(cum) - 1)
+        prev_btc = np.where(k > 0, self.cum_btc[k - 1], 0.0)
+        prev_krw = np.where(k > 0, self.cum_krw[k - 1], 0.0)
+        price = self.prices[k]
+        if cum is self.cum_krw:
+            qty = prev_btc + (amounts - prev_krw) / price
+            notional = amounts
+        else:
+            qty = amounts
+            notional = prev_krw + (amounts - prev_btc) * price
+        qty = np.where(full, self.cum_btc[-1], qty)
+        notional = np.where(full, self.cum_krw[-1], notional)
+        return qty, notional
+
+
+class Orderbook:
+    """Snapshot with both sides as NumPy arrays for fast fill estimates."""
+
+    def __init__(self, ask_prices, ask_sizes, bid_prices, bid_sizes, timestamp=None):
+        self.asks = _Side(ask_prices, ask_sizes)
+        self.bids = _Side(bid_prices, bid_sizes)
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_units(cls, units, timestamp=None):
+        columns = {f: [safe_float(u.get(f)) for u in units]
+                   for f in ("ask_price", "ask_size", "bid_price", "bid_size")}
+        return cls(columns["ask_price"], columns["ask_size"],
+                   columns["bid_price"], columns["bid_size"], timestamp)
+
+    @classmethod
+    def from_dict(cls, orderbook):
+        """From a pyupbit orderbook dict (or ``OrderbookStore.snapshots`` entry)."""
+        return cls.from_units(orderbook.get("orderbook_units", []), orderbook.get("timestamp"))
+
+    @property
+    def best_ask(self):
+        return float(self.asks.prices[0]) if len(self.asks) else 0.0
+
+    @property
+    def best_bid(self):
+        return float(self.bids.prices[0]) if len(self.bids) else 0.0
+
+    @property
+    def mid(self):
+        if self.best_ask and self.best_bid:
+            return (self.best_ask + self.best_bid) / 2
+        return max(self.best_ask, self.best_bid)
+
+    def _quote(self, side, amounts, cum, sign, best):
+        scalar = np.ndim(amounts) == 0
+        amounts = np.atleast_1d(np.asarray(amounts, dtype=float))
+        if len(side) == 0:
+            zeros = np.zeros_like(amounts)
+            quote = DepthQuote(zeros, zeros, zeros, zeros, amounts)
+        else:
+            qty, notional = side.take(amounts, cum)
+            filled = notional if cum is side.cum_krw else qty
+            with np.errstate(divide="ignore", invalid="ignore"):
+                avg = np.where(qty > 0, notional / qty, best)
+            remaining = np.maximum(amounts - filled, 0.0)
+            quote = DepthQuote(qty, notional, avg, sign * (avg - best) / best, remaining)
+        return DepthQuote(*(float(v[0]) for v in quote)) if scalar else quote
+
+    def buy(self, amount_krw):
+        """Market buy spending ``amount_krw``; slippage versus the best ask."""
+        return self._quote(self.asks, amount_krw, self.asks.cum_krw, 1, self.best_ask)
+
+    def sell(self, amount_btc):
+        """Market sell of ``amount_btc`` into the bids; slippage versus the best bid."""
+        return self._quote(self.bids, amount_btc, self.bids.cum_btc, -1, self.best_bid)
+
+    def capacity(self, side, max_slippage):
+        """Largest order (KRW for a buy, BTC for a sell) within ``max_slippage``."""
+        book = self.asks if side == "buy" else self.bids
+        if len(book) == 0:
+            return 0.0
+        best = book.prices[0]
+        limit = best * (1 + max_slippage) if side == "buy" else best * (1 - max_slippage)
+        avg = book.cum_krw / book.cum_btc  # average price after each full level
+        beyond = avg > limit if side == "buy" else avg < limit
+        if not beyond.any():
+            return float(book.cum_krw[-1] if side == "buy" else book.cum_btc[-1])
+        k = int(np.argmax(beyond))
+        prev_btc = book.cum_btc[k - 1] if k else 0.0
+        prev_krw = book.cum_krw[k - 1] if k else 0.0
+        p = book.prices[k]
+        # Solve notional / qty == limit within level k
+        if side == "buy":
+            return float(limit * (p * prev_btc - prev_krw) / (p - limit))
+        return float((prev_krw - prev_btc * p) / (limit - p))
+
 
 def analyze_orderbook_depth(orderbook, amount_krw):
     """Estimate slippage for a given order size against the orderbook."""
     try:
-        units = orderbook.get("orderbook_units", [])
-        if not units:
+        book = Orderbook.from_dict(orderbook)
+        if book.best_ask <= 0:
             return {"slippage_pct": 0, "executable": True}
 
-        best_ask = safe_float(units[0].get("ask_price"))
-        if best_ask <= 0:
-            return {"slippage_pct": 0, "executable": True}
-
-        remaining = amount_krw
-        total_btc = 0.0
-        for u in units:
-            ask_price = safe_float(u.get("ask_price"))
-            ask_size = safe_float(u.get("ask_size"))
-            if ask_price <= 0:
-                continue
-            available = ask_price * ask_size
-            if remaining <= available:
-                total_btc += remaining / ask_price
-                remaining = 0
-                break
-            total_btc += ask_size
-            remaining -= available
-
-        if total_btc <= 0:
+        quote = book.buy(amount_krw)
+        if quote.qty <= 0:
             return {"slippage_pct": 0, "executable": False}
-
-        filled = amount_krw - remaining
-        avg_price = filled / total_btc
-        slippage = (avg_price - best_ask) / best_ask
         return {
-            "slippage_pct": slippage,
-            "executable": remaining == 0,
-            "avg_fill_price": avg_price,
+            "slippage_pct": quote.slippage_pct,
+            "executable": quote.remaining == 0,
+            "avg_fill_price": quote.avg_price,
         }
     except Exception as e:
         logger.error(f"Error analyzing orderbook depth: {e}")
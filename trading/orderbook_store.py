@@ -0,0 +1,248 @@
+"""Orderbook snapshot recorder and time-partitioned binary store.
+
+Snapshots are fixed-width records appended to one file per market per UTC
+day, so a range read only opens the days it covers and binary-searches the
+timestamp column of a memory map.  Layout under ``ORDERBOOK_STORE_DIR``:
+
+    <market>/meta.json          {"depth": N}
+    <market>/YYYY-MM-DD.bin     records sorted by timestamp
+
+Each record is ``timestamp`` (int64 ms), the two totals (float64), then
+``depth`` levels of ask/bid prices (float64) and sizes (float32).  Missing
+levels are zero.  A partial record left by a crash mid-append is ignored.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyupbit
+
+import config
+from trading.utils import safe_float
+
+logger = logging.getLogger("autotrade")
+
+DAY_MS = 86_400_000
+
+
+def record_dtype(depth):
+    return np.dtype([
+        ("timestamp", "<i8"),
+        ("total_ask_size", "<f8"), ("total_bid_size", "<f8"),
+        ("ask_price", "<f8", (depth,)), ("bid_price", "<f8", (depth,)),
+        ("ask_size", "<f4", (depth,)), ("bid_size", "<f4", (depth,)),
+    ])
+
+
+def to_epoch_ms(t):
+    """Epoch milliseconds from a datetime, pandas Timestamp or number.
+
+    Naive times are local, like ``datetime.now()`` and the candle index.
+    """
+    if t is None or isinstance(t, (int, float, np.integer, np.floating)):
+        return None if t is None else int(t)
+    if hasattr(t, "to_pydatetime"):
+        t = t.to_pydatetime()
+    return int(t.timestamp() * 1000)
+
+
+def _day(ms):
+    return datetime.fromtimestamp(ms // 1000, timezone.utc).strftime("%Y-%m-%d")
+
+
+class OrderbookStore:
+    """Append-only snapshot files per market and UTC day."""
+
+    def __init__(self, root=None, depth=None):
+        self.root = root or config.ORDERBOOK_STORE_DIR
+        self.depth = depth or config.ORDERBOOK_RECORD_DEPTH
+        self._depths = {}
+        self._last = {}  # market -> last written timestamp
+        self.lock = threading.Lock()
+
+    # -- paths -------------------------------------------------------------
+    def _dir(self, market):
+        return os.path.join(self.root, market)
+
+    def _path(self, market, day):
+        return os.path.join(self._dir(market), f"{day}.bin")
+
+    def days(self, market):
+        """Partition days held for ``market``, oldest first."""
+        try:
+            names = os.listdir(self._dir(market))
+        except FileNotFoundError:
+            return []
+        return sorted(n[:-4] for n in names if n.endswith(".bin"))
+
+    def market_depth(self, market):
+        """Depth the market was recorded with (fixed on first write)."""
+        if market not in self._depths:
+            try:
+                with open(os.path.join(self._dir(market), "meta.json"), "r") as f:
+                    self._depths[market] = json.load(f)["depth"]
+            except (FileNotFoundError, json.JSONDecodeError, KeyError):
+                return self.depth
+        return self._depths[market]
+
+    def _ensure_meta(self, market):
+        if market in self._depths:
+            return
+        os.makedirs(self._dir(market), exist_ok=True)
+        meta_path = os.path.join(self._dir(market), "meta.json")
+        if not os.path.exists(meta_path):
+            tmp = meta_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"depth": self.depth}, f)
+            os.replace(tmp, meta_path)
+        self._depths[market] = self.market_depth(market)
+
+    # -- writes ------------------------------------------------------------
+    def encode(self, orderbook, depth):
+        """One record from a pyupbit orderbook dict."""
+        record = np.zeros(1, dtype=record_dtype(depth))
+        units = orderbook.get("orderbook_units", [])[:depth]
+        record["timestamp"] = int(orderbook.get("timestamp") or time.time() * 1000)
+        record["total_ask_size"] = safe_float(orderbook.get("total_ask_size"))
+        record["total_bid_size"] = safe_float(orderbook.get("total_bid_size"))
+        for field in ("ask_price", "bid_price", "ask_size", "bid_size"):
+            record[field][0, :len(units)] = [safe_float(u.get(field)) for u in units]
+        return record
+
+    def append(self, market, orderbook):
+        """Append one snapshot; returns False for stale or duplicate timestamps."""
+        with self.lock:
+            self._ensure_meta(market)
+            record = self.encode(orderbook, self._depths[market])
+            ts = int(record["timestamp"][0])
+            last = self._last.get(market)
+            if last is None:
+                tail = self.read(market, start=ts - DAY_MS)
+                last = int(tail["timestamp"][-1]) if len(tail) else -1
+            if ts <= last:
+                return False
+            path = self._path(market, _day(ts))
+            with open(path, "ab") as f:
+                self._trim_partial(f, record.itemsize)
+                f.write(record.tobytes())
+            self._last[market] = ts
+            return True
+
+    @staticmethod
+    def _trim_partial(f, itemsize):
+        """Drop a torn trailing record so appends stay aligned."""
+        size = f.seek(0, os.SEEK_END)
+        if size % itemsize:
+            f.truncate(size - size % itemsize)
+
+    # -- reads -------------------------------------------------------------
+    def _open(self, market, day, dtype):
+        path = self._path(market, day)
+        count = os.path.getsize(path) // dtype.itemsize
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def read(self, market, start=None, end=None):
+        """Records with ``start <= timestamp <= end`` as a structured array."""
+        dtype = record_dtype(self.market_depth(market))
+        start, end = to_epoch_ms(start), to_epoch_ms(end)
+        days = self.days(market)
+        if start is not None:
+            days = [d for d in days if d >= _day(start)]
+        if end is not None:
+            days = [d for d in days if d <= _day(end)]
+        parts = []
+        for day in days:
+            data = self._open(market, day, dtype)
+            ts = data["timestamp"]
+            lo = 0 if start is None else int(np.searchsorted(ts, start, "left"))
+            hi = len(ts) if end is None else int(np.searchsorted(ts, end, "right"))
+            if hi > lo:
+                parts.append(np.array(data[lo:hi]))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    def snapshots(self, market, start=None, end=None):
+        """Range read as pyupbit-shaped orderbook dicts (empty levels dropped)."""
+        out = []
+        for r in self.read(market, start, end):
+            units = [{"ask_price": float(ap), "bid_price": float(bp),
+                      "ask_size": float(asz), "bid_size": float(bsz)}
+                     for ap, bp, asz, bsz in zip(r["ask_price"], r["bid_price"],
+                                                 r["ask_size"], r["bid_size"])
+                     if ap > 0 or bp > 0]
+            out.append({"market": market, "timestamp": int(r["timestamp"]),
+                        "total_ask_size": float(r["total_ask_size"]),
+                        "total_bid_size": float(r["total_bid_size"]),
+                        "orderbook_units": units})
+        return out
+
+    def prune(self, market, keep_days):
+        """Delete partitions older than ``keep_days``; returns the number removed."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=keep_days)).strftime("%Y-%m-%d")
+        removed = 0
+        for day in self.days(market):
+            if day < cutoff:
+                os.remove(self._path(market, day))
+                removed += 1
+        return removed
+
+
+# ---------------------------------------------------------------------------
+# Recorder
+# ---------------------------------------------------------------------------
+class OrderbookRecorder:
+    """Samples the orderbook every ``interval`` seconds on a daemon thread."""
+
+    def __init__(self, store=None, market=None, interval=None, fetcher=None):
+        self.store = store or OrderbookStore()
+        self.market = market or config.ORDERBOOK_RECORD_MARKET
+        self.interval = interval or config.ORDERBOOK_RECORD_INTERVAL_SECONDS
+        self.fetcher = fetcher or (lambda market: pyupbit.get_orderbook(ticker=market))
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"samples": 0, "duplicates": 0, "errors": 0}
+
+    def sample(self):
+        """Fetch and store one snapshot; never raises."""
+        try:
+            orderbook = self.fetcher(self.market)
+            if isinstance(orderbook, list):
+                orderbook = orderbook[0] if orderbook else None
+            if not orderbook or not orderbook.get("orderbook_units"):
+                self.stats["errors"] += 1
+                return False
+            stored = self.store.append(self.market, orderbook)
+            self.stats["samples" if stored else "duplicates"] += 1
+            return stored
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Orderbook sample failed: {e}")
+            return False
+
+    def run(self):
+        next_due = time.monotonic()
+        while not self._stop.is_set():
+            self.sample()
+            next_due += self.interval
+            self._stop.wait(max(0.0, next_due - time.monotonic()))
+            next_due = max(next_due, time.monotonic() - self.interval)  # no burst after a stall
+
+    def start(self):
+        if config.ORDERBOOK_RETENTION_DAYS:
+            self.store.prune(self.market, config.ORDERBOOK_RETENTION_DAYS)
+        self._thread = threading.Thread(target=self.run, name="orderbook-recorder", daemon=True)
+        self._thread.start()
+        logger.info(f"Orderbook recorder started ({self.market}, every {self.interval}s)")
+        return self._thread
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        logger.info(f"Orderbook recorder stats: {self.stats}")
@@ -0,0 +1,160 @@
+"""Background order tracking: confirms fills and reconciles them into the DB.
+
+Market orders return before they execute, so the response carries no
+executed volume or price.  Every placed order is handed to ``track_order``,
+which only enqueues its UUID; a daemon thread polls ``get_order`` until the
+order reaches a terminal state, stores the executed volume, funds, average
+price and fees in the ``orders`` table, invalidates the account cache and
+rolls the totals up into the decision the order belongs to.  Orders left
+pending by a restart are picked up again from the table.
+"""
+
+import logging
+import threading
+import time
+
+import config
+from trading.utils import safe_float
+from trading.database import TERMINAL_ORDER_STATES, get_repository
+
+logger = logging.getLogger("autotrade")
+
+
+def parse_order(order):
+    """``(state, executed_volume, funds, paid_fee)`` from an Upbit order dict."""
+    trades = order.get("trades") or []
+    volume = safe_float(order.get("executed_volume")) or sum(
+        safe_float(t.get("volume")) for t in trades)
+    funds = sum(safe_float(t.get("funds")) for t in trades)
+    if not funds and trades:
+        funds = sum(safe_float(t.get("price")) * safe_float(t.get("volume")) for t in trades)
+    return order.get("state", "wait"), volume, funds, safe_float(order.get("paid_fee"))
+
+
+class OrderTracker:
+    """Polls placed orders by UUID until they finish; never blocks the caller."""
+
+    def __init__(self, client, db_path=None, poll_interval=None, timeout=None,
+                 on_fill=None, clock=time.monotonic):
+        self.client = client
+        self.db_path = db_path
+        self.poll_interval = (config.ORDER_POLL_INTERVAL_SECONDS
+                              if poll_interval is None else poll_interval)
+        self.timeout = config.ORDER_TRACK_TIMEOUT_SECONDS if timeout is None else timeout
+        self.on_fill = on_fill
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.pending = {}  # uuid -> monotonic deadline
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"tracked": 0, "filled": 0, "timeouts": 0, "errors": 0}
+
+    def track(self, uuid, side=None):
+        """Start tracking ``uuid``; returns immediately."""
+        get_repository(self.db_path).save_order(uuid, side)
+        with self.lock:
+            self.pending[uuid] = self.clock() + self.timeout
+            self.stats["tracked"] += 1
+        self._wake.set()
+
+    def resume(self):
+        """Re-queue orders a previous run left unfinished."""
+        uuids = get_repository(self.db_path).pending_orders()
+        with self.lock:
+            for uuid in uuids:
+                self.pending.setdefault(uuid, self.clock() + self.timeout)
+        if uuids:
+            logger.info(f"Order tracker resumed {len(uuids)} pending order(s)")
+        return len(uuids)
+
+    def poll_once(self):
+        """Check every pending order once; returns the UUIDs that finished."""
+        with self.lock:
+            batch = list(self.pending.items())
+        finished = []
+        repo = get_repository(self.db_path)
+        for uuid, deadline in batch:
+            try:
+                order = self.client.get_order(uuid)
+            except Exception as e:
+                logger.warning(f"Order lookup failed for {uuid}: {e}")
+                order = None
+            if not isinstance(order, dict) or "state" not in order:
+                self.stats["errors"] += 1
+                if self.clock() < deadline:
+                    continue
+                logger.error(f"Order {uuid} not confirmed within {self.timeout}s")
+                self.stats["timeouts"] += 1
+                order = {"state": "timeout"}
+
+            state, volume, funds, fee = parse_order(order)
+            decision_id = repo.save_order(uuid, order.get("side"), state, volume, funds, fee)
+            if state not in TERMINAL_ORDER_STATES:
+                continue
+            with self.lock:
+                self.pending.pop(uuid, None)
+            finished.append(uuid)
+            if volume > 0:
+                self.stats["filled"] += 1
+                logger.info(f"Order {uuid} {state}: {volume:.8f} BTC @ "
+                            f"{funds / volume:,.0f} (fee {fee:,.0f})")
+            if decision_id is not None:
+                repo.reconcile(decision_id)
+            if self.on_fill is not None:
+                try:
+                    self.on_fill(order)
+                except Exception as e:
+                    logger.error(f"Order fill callback failed: {e}")
+        return finished
+
+    # -- lifecycle ---------------------------------------------------------
+    def run(self):
+        while not self._stop.is_set():
+            if not self.pending:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"Order tracker error: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self.resume()
+        self._thread = threading.Thread(target=self.run, name="order-tracker", daemon=True)
+        self._thread.start()
+        logger.info("Order tracker started")
+        return self._thread
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        logger.info(f"Order tracker stats: {self.stats}")
+
+
+_tracker = None
+
+
+def set_tracker(tracker):
+    global _tracker
+    _tracker = tracker
+
+
+def track_order(result, side=None):
+    """Hand a placed order's response to the tracker; never raises.
+
+    Returns the order UUID (or None) so callers can link it to a decision.
+    """
+    uuid = result.get("uuid") if isinstance(result, dict) else None
+    if not uuid:
+        return None
+    if _tracker is not None:
+        try:
+            _tracker.track(uuid, side or result.get("side"))
+        except Exception as e:
+            logger.error(f"Error tracking order {uuid}: {e}")
+    return uuid
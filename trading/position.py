@@ -0,0 +1,55 @@
+"""In-memory position state: high watermark and last decision time.
+
+Risk checks read these on every cycle (and far more often from a price-driven
+loop), so they are loaded from the decisions table once and then kept in
+memory.  The decision repository updates the state after every committed
+save, so memory and SQLite never diverge while the bot is the only writer.
+"""
+
+import threading
+
+
+class PositionState:
+    """Latest non-null high watermark and the time of the last saved decision."""
+
+    def __init__(self, high_watermark=0.0, last_decision_time=None):
+        self._lock = threading.Lock()
+        self._high_watermark = high_watermark
+        self._last_decision_time = last_decision_time
+
+    @classmethod
+    def rehydrate(cls, repository):
+        """Build the state from what the repository has persisted."""
+        return cls(repository.high_watermark(), repository.last_decision_time())
+
+    @property
+    def high_watermark(self):
+        with self._lock:
+            return self._high_watermark
+
+    @property
+    def last_decision_time(self):
+        with self._lock:
+            return self._last_decision_time
+
+    def record(self, timestamp, high_watermark=None):
+        """Apply a saved decision; ``None`` leaves the watermark unchanged."""
+        with self._lock:
+            self._last_decision_time = timestamp
+            if high_watermark is not None:
+                self._high_watermark = float(high_watermark)
+
+    def observe_price(self, price):
+        """Raise the watermark to a live price (memory only).
+
+        The new peak reaches SQLite with the next saved decision, whose
+        ``high_watermark`` is computed from this state.
+        """
+        with self._lock:
+            if price > self._high_watermark:
+                self._high_watermark = float(price)
+
+    def snapshot(self):
+        with self._lock:
+            return {"high_watermark": self._high_watermark,
+                    "last_decision_time": self._last_decision_time}
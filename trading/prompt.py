@@ -0,0 +1,206 @@
+"""Compact prompt encodings and a token-budgeted prompt builder.
+
+The encoders replace verbose payloads (``to_json(orient="split")`` frames
+with every column at full float precision, ``str(dict)`` dumps, full
+orderbooks) with a column-subsetted, fixed-precision JSON form:
+``{"fields": [...], "rows": [[...], ...]}`` for record lists and the
+``columns`` / ``index`` / ``data`` layout that instructions_v3.md describes
+for market data.  ``PromptBuilder`` measures each section and, while the
+total exceeds the budget, shrinks the lowest-priority shrinkable section.
+"""
+
+import json
+import logging
+from datetime import datetime, timezone
+
+import config
+
+logger = logging.getLogger("autotrade")
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # optional dependency; fall back to a character estimate
+    _encoding = None
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def _round(value, decimals):
+    if value is None or value != value:  # None / NaN
+        return None
+    if decimals == 0:
+        return int(round(value))
+    return round(float(value), decimals)
+
+
+def column_name(name):
+    """Resolve a length placeholder in a configured column name
+    (``"ADX_{adx}"`` -> ``"ADX_14"``) from the indicator settings."""
+    return name.format(adx=config.ADX_LENGTH)
+
+
+def _decimals(column):
+    precision = {column_name(k): v for k, v in config.PROMPT_PRECISION.items()}
+    return precision.get(column, precision["default"])
+
+
+# ---------------------------------------------------------------------------
+# Encoders
+# ---------------------------------------------------------------------------
+def encode_frames(frames, columns=None, rows=None):
+    """Encode ``{label: df}`` as compact split JSON with the last N rows each."""
+    columns = [column_name(c) for c in columns or config.PROMPT_COLUMNS]
+    rows = rows or config.PROMPT_ROWS
+    present = [c for c in columns if any(c in df.columns for df in frames.values())]
+    index, data = [], []
+    for label, df in frames.items():
+        tail = df.tail(rows.get(label, len(df)))
+        fmt = "%Y-%m-%d" if label == "daily" else "%Y-%m-%d %H:%M"
+        index.extend([label, ts] for ts in tail.index.strftime(fmt))
+        values = [tail[c].tolist() if c in tail.columns else [None] * len(tail)
+                  for c in present]
+        decimals = [_decimals(c) for c in present]
+        data.extend([_round(v, d) for v, d in zip(row, decimals)] for row in zip(*values))
+    return _dumps({"columns": present, "index": index, "data": data})
+
+
+def encode_records(records, fields, max_text=None):
+    """Encode a list of dicts as one field header plus value rows."""
+    max_text = max_text or config.PROMPT_MAX_TEXT
+    out = []
+    for record in records:
+        row = []
+        for field in fields:
+            value = record.get(field)
+            if isinstance(value, float):
+                value = _round(value, _decimals(field))
+            elif isinstance(value, str) and len(value) > max_text:
+                value = value[:max_text - 1] + "…"
+            row.append(value)
+        out.append(row)
+    return _dumps({"fields": list(fields), "rows": out})
+
+
+def _epoch_date(timestamp):
+    """``YYYY-MM-DD`` (UTC, the index's update day) of an epoch-seconds value."""
+    try:
+        return datetime.fromtimestamp(int(timestamp), tz=timezone.utc).strftime("%Y-%m-%d")
+    except (TypeError, ValueError, OverflowError, OSError):
+        return timestamp
+
+
+def encode_fear_greed(entries):
+    """Fear & Greed history as (date, value, classification) rows, newest first."""
+    rows = [{"date": _epoch_date(e.get("timestamp")), "value": int(e.get("value", 0)),
+             "classification": e.get("value_classification")} for e in entries]
+    return encode_records(rows, ["date", "value", "classification"])
+
+
+def encode_status(current_status, depth=None):
+    """Current state with the orderbook cut to ``depth`` levels as rows."""
+    depth = depth or config.PROMPT_ORDERBOOK_DEPTH
+    status = json.loads(current_status) if isinstance(current_status, str) else current_status
+    orderbook = status.get("orderbook") or {}
+    units = orderbook.get("orderbook_units", [])[:depth]
+    return _dumps({
+        "current_time": status.get("current_time"),
+        "orderbook": {
+            "total_ask_size": _round(orderbook.get("total_ask_size"), 4),
+            "total_bid_size": _round(orderbook.get("total_bid_size"), 4),
+            "fields": ["ask_price", "ask_size", "bid_price", "bid_size"],
+            "rows": [[_round(u.get("ask_price"), 0), _round(u.get("ask_size"), 4),
+                      _round(u.get("bid_price"), 0), _round(u.get("bid_size"), 4)]
+                     for u in units],
+        },
+        "btc_balance": status.get("btc_balance"),
+        "krw_balance": _round(status.get("krw_balance"), 0),
+        "btc_avg_buy_price": _round(status.get("btc_avg_buy_price"), 0),
+    })
+
+
+# ---------------------------------------------------------------------------
+# Shrinkers: return a smaller encoding, or None when nothing is left to drop
+# ---------------------------------------------------------------------------
+def shrink_rows(content):
+    """Drop the last quarter of a ``fields``/``rows`` payload (rows lead with the newest)."""
+    try:
+        payload = json.loads(content)
+        rows = payload["rows"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if len(rows) <= 1:
+        return None
+    payload["rows"] = rows[:len(rows) - max(1, len(rows) // 4)]
+    return _dumps(payload)
+
+
+def shrink_frames(content):
+    """Halve the rows of each timeframe in a compact split frame, keeping the latest."""
+    try:
+        payload = json.loads(content)
+        index, data = payload["index"], payload["data"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    by_label = {}
+    for pos, (label, _) in enumerate(index):
+        by_label.setdefault(label, []).append(pos)
+    keep = set()
+    for positions in by_label.values():
+        keep.update(positions[len(positions) // 2:])
+    if len(keep) == len(index):
+        return None
+    payload["index"] = [v for i, v in enumerate(index) if i in keep]
+    payload["data"] = [v for i, v in enumerate(data) if i in keep]
+    return _dumps(payload)
+
+
+# ---------------------------------------------------------------------------
+# Builder
+# ---------------------------------------------------------------------------
+class PromptBuilder:
+    """Collects prompt sections and fits them into a token budget.
+
+    Sections with a higher ``priority`` number are shrunk first.  Sections
+    without a shrinker are never changed.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = config.PROMPT_TOKEN_BUDGET if budget is None else budget
+        self.sections = []
+
+    def add(self, name, content, priority=0, shrink=None):
+        self.sections.append({"name": name, "content": content, "priority": priority,
+                              "shrink": shrink, "tokens": count_tokens(content)})
+        return self
+
+    def total(self):
+        return sum(s["tokens"] for s in self.sections)
+
+    def build(self):
+        """Return ``(contents, report)``; report maps section name to token count."""
+        while self.total() > self.budget:
+            candidates = sorted((s for s in self.sections if s["shrink"]),
+                                key=lambda s: (-s["priority"], -s["tokens"]))
+            for section in candidates:
+                smaller = section["shrink"](section["content"])
+                if smaller is not None and len(smaller) < len(section["content"]):
+                    section["content"] = smaller
+                    section["tokens"] = count_tokens(smaller)
+                    break
+                section["shrink"] = None
+            else:
+                logger.warning(f"Prompt is {self.total()} tokens; "
+                               f"cannot fit budget of {self.budget}")
+                break
+        report = {s["name"]: s["tokens"] for s in self.sections}
+        report["total"] = self.total()
+        return [s["content"] for s in self.sections], report
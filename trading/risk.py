@@ -0,0 +1,297 @@
+"""Vectorized risk kernel shared by the live policy and the backtesters.
+
+Every function here is pure: it takes NumPy arrays (or scalars) of prices,
+position state and market context plus a ``RiskParams`` snapshot of the
+thresholds, and returns arrays — no JSON, no database, no config reads in
+the math.  ``trading.decision`` calls it with length-1 arrays for the live
+decision; the backtest engines and sweeps pass whole histories.  Both paths
+run the same element-wise operations in the same order, so a bar evaluated
+alone or inside a batch gives bit-identical results.
+
+Pipeline, mirroring ``apply_risk_policy``:
+  position_exits  stop-loss (fixed or ATR), trailing stop, tiered take-profit
+  size_orders     slippage, trend/RSI/momentum filters, volatility, regime,
+                  clamp and buy floor
+  order_checks    minimum order size and available balance
+``evaluate`` chains the three.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+import config
+
+HOLD, BUY, SELL = 0, 1, 2
+ACTIONS = ("hold", "buy", "sell")
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+
+# Exit rules, in priority order
+EXIT_NONE, EXIT_STOP_LOSS, EXIT_TRAILING_STOP, EXIT_TAKE_PROFIT = 0, 1, 2, 3
+
+# Sizing flags (bit mask), in the order the live reason lists them
+HIGH_SLIPPAGE = 1 << 0
+DOWNTREND = 1 << 1
+RSI_OVERBOUGHT = 1 << 2
+NEGATIVE_MOMENTUM = 1 << 3
+RSI_DEEP_OVERSOLD = 1 << 4
+UPTREND = 1 << 5
+RSI_OVERSOLD = 1 << 6
+POSITIVE_MOMENTUM = 1 << 7
+FLOOR_APPLIED = 1 << 8
+
+# Order check results
+ORDER_OK, INSUFFICIENT_KRW, BELOW_MINIMUM, NO_BTC = 0, 1, 2, 3
+
+
+class RiskParams(namedtuple("RiskParams", [
+    "stop_loss_pct", "stop_loss_sell_pct", "dynamic_stop", "dynamic_stop_atr_mult",
+    "trailing_stop", "trailing_stop_pct", "trailing_stop_sell_pct",
+    "take_profit",  # ((threshold, sell_pct, always), ...) in config order
+    "rsi_accumulation", "rsi_deep_oversold", "rsi_oversold_boost",
+    "high_volatility", "low_volatility", "volatility_reduction", "volatility_boost",
+    "regime_enabled", "ranging_mult", "trending_mult", "counter_trend_mult",
+    "max_buy_pct", "max_sell_pct", "min_buy_pct_floor", "max_slippage_pct",
+    "min_order_amount",
+])):
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls):
+        """Snapshot of the current ``config`` thresholds."""
+        return cls(
+            stop_loss_pct=config.STOP_LOSS_PCT,
+            stop_loss_sell_pct=config.STOP_LOSS_SELL_PCT,
+            dynamic_stop=getattr(config, "DYNAMIC_STOP_LOSS_ENABLED", False),
+            dynamic_stop_atr_mult=getattr(config, "DYNAMIC_STOP_LOSS_ATR_MULT", 0.0),
+            trailing_stop=config.TRAILING_STOP_ENABLED,
+            trailing_stop_pct=config.TRAILING_STOP_PCT,
+            trailing_stop_sell_pct=config.TRAILING_STOP_SELL_PCT,
+            take_profit=tuple((t["threshold"], t["sell_pct"], t["condition"] == "always")
+                              for t in config.TIERED_TAKE_PROFIT),
+            rsi_accumulation=getattr(config, "RSI_OVERSOLD_ACCUMULATION_ENABLED", False),
+            rsi_deep_oversold=getattr(config, "RSI_DEEP_OVERSOLD", 25),
+            rsi_oversold_boost=getattr(config, "RSI_OVERSOLD_BOOST", 1.5),
+            high_volatility=config.HIGH_VOLATILITY_THRESHOLD,
+            low_volatility=config.LOW_VOLATILITY_THRESHOLD,
+            volatility_reduction=config.VOLATILITY_REDUCTION,
+            volatility_boost=config.VOLATILITY_BOOST,
+            regime_enabled=config.REGIME_DETECTION_ENABLED,
+            ranging_mult=config.REGIME_RANGING_SIZE_MULT,
+            trending_mult=config.REGIME_TRENDING_SIZE_MULT,
+            counter_trend_mult=config.REGIME_COUNTER_TREND_SIZE_MULT,
+            max_buy_pct=config.MAX_BUY_PERCENT,
+            max_sell_pct=config.MAX_SELL_PERCENT,
+            min_buy_pct_floor=config.MIN_BUY_PCT_FLOOR,
+            max_slippage_pct=config.MAX_SLIPPAGE_PCT,
+            min_order_amount=config.MIN_ORDER_AMOUNT,
+        )
+
+
+def _floats(*values):
+    return [np.asarray(v, dtype=float) for v in values]
+
+
+def action_codes(decisions):
+    """``"buy"``/``"sell"``/``"hold"`` (scalar or array) to action codes."""
+    decisions = np.asarray(decisions)
+    return np.where(decisions == "buy", BUY, np.where(decisions == "sell", SELL, HOLD))
+
+
+# ---------------------------------------------------------------------------
+# Position exits
+# ---------------------------------------------------------------------------
+Exits = namedtuple("Exits", ["rule", "percentage", "pnl", "stop_pct", "drawdown",
+                             "high_watermark", "tier"])
+
+
+def stop_distance(avg_price, atr, params):
+    """Stop-loss distance: fixed, or ATR-based with the fixed one as floor."""
+    avg_price, atr = _floats(avg_price, atr)
+    if not params.dynamic_stop:
+        return np.full(np.broadcast(avg_price, atr).shape, float(params.stop_loss_pct))
+    use_atr = (atr > 0) & (avg_price > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        atr_stop = np.where(use_atr, (atr * params.dynamic_stop_atr_mult) / avg_price, 0.0)
+    return np.where(use_atr, np.maximum(params.stop_loss_pct, atr_stop), params.stop_loss_pct)
+
+
+def take_profit_tier(pnl, momentum, params):
+    """Index of the highest take-profit tier met (-1 for none)."""
+    pnl, momentum = _floats(pnl, momentum)
+    tier = np.full(np.broadcast(pnl, momentum).shape, -1)
+    for k, (threshold, _, always) in enumerate(params.take_profit):
+        hit = (pnl >= threshold) & (always | (momentum < 0))
+        tier = np.where(hit, k, tier)  # later (higher) tiers win
+    return tier
+
+
+def position_exits(price, avg_price, btc, high_watermark, momentum, atr, params):
+    """Forced sells for an open position.
+
+    ``high_watermark`` is the peak before this bar; the returned one includes
+    it (raised only while the trailing stop is on and price is above cost).
+    """
+    price, avg_price, btc, hw, momentum, atr = _floats(
+        price, avg_price, btc, high_watermark, momentum, atr)
+    held = (btc > 0) & (avg_price > 0) & (price > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pnl = np.where(held, (price - avg_price) / avg_price, 0.0)
+    stop_pct = stop_distance(avg_price, atr, params)
+    stop_hit = held & (pnl <= -stop_pct)
+
+    trailing = held & (price > avg_price) & bool(params.trailing_stop)
+    hw = np.where(trailing, np.maximum(np.maximum(hw, avg_price), price), hw)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = np.where(trailing & (hw > 0), (hw - price) / hw, 0.0)
+    trail_hit = trailing & (hw > 0) & (drawdown >= params.trailing_stop_pct)
+
+    tier = np.where(held, take_profit_tier(pnl, momentum, params), -1)
+    tp_pct = np.array([t[1] for t in params.take_profit] + [0], dtype=float)[tier]
+
+    rule = np.where(stop_hit, EXIT_STOP_LOSS, np.where(
+        trail_hit, EXIT_TRAILING_STOP, np.where(tier >= 0, EXIT_TAKE_PROFIT, EXIT_NONE)))
+    percentage = np.where(stop_hit, float(params.stop_loss_sell_pct), np.where(
+        trail_hit, float(params.trailing_stop_sell_pct), tp_pct))
+    return Exits(rule, percentage, pnl, stop_pct, drawdown, hw, tier)
+
+
+def exit_decision(exits, i, price, params):
+    """The sell decision dict for element ``i`` of ``exits`` (None if no exit)."""
+    rule = int(exits.rule[i])
+    pnl = float(exits.pnl[i])
+    if rule == EXIT_STOP_LOSS:
+        return {"decision": "sell", "percentage": float(exits.percentage[i]),
+                "reason": (f"Stop-loss triggered at {pnl:.2%} "
+                           f"(threshold {float(exits.stop_pct[i]):.2%})")}
+    if rule == EXIT_TRAILING_STOP:
+        hw = float(exits.high_watermark[i])
+        return {"decision": "sell", "percentage": float(exits.percentage[i]),
+                "reason": (f"Trailing stop: price {float(price):,.0f} "
+                           f"dropped {float(exits.drawdown[i]):.2%} from high {hw:,.0f}"),
+                "high_watermark": hw}
+    if rule == EXIT_TAKE_PROFIT:
+        threshold, sell_pct, always = params.take_profit[int(exits.tier[i])]
+        reason = (f"Tiered take-profit at {pnl:.2%} (tier >= {threshold:.0%})" if always
+                  else f"Tiered take-profit at {pnl:.2%} with weakening momentum")
+        return {"decision": "sell", "percentage": sell_pct, "reason": reason}
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Sizing
+# ---------------------------------------------------------------------------
+Sizing = namedtuple("Sizing", ["percentage", "flags"])
+
+
+def _apply(pct, flags, cond, factor, flag):
+    return np.where(cond, pct * factor, pct), np.where(cond, flags | flag, flags)
+
+
+def direction_filters(action, percentage, trend, rsi, momentum, params):
+    """Trend/RSI/momentum multipliers for buys and sells."""
+    action = np.asarray(action)
+    pct, rsi, momentum = _floats(percentage, rsi, momentum)
+    trend = np.asarray(trend)
+    pct = pct * np.ones(np.broadcast(action, pct, rsi, momentum, trend).shape)
+    flags = np.zeros(pct.shape, dtype=np.int64)
+    buy, sell = action == BUY, action == SELL
+
+    pct, flags = _apply(pct, flags, buy & (trend == "down"), 0.5, DOWNTREND)
+    pct, flags = _apply(pct, flags, buy & (rsi >= 70), 0.4, RSI_OVERBOUGHT)
+    pct, flags = _apply(pct, flags, buy & (momentum < 0), 0.7, NEGATIVE_MOMENTUM)
+    if params.rsi_accumulation:
+        pct, flags = _apply(pct, flags, buy & (rsi > 0) & (rsi < params.rsi_deep_oversold),
+                            params.rsi_oversold_boost, RSI_DEEP_OVERSOLD)
+
+    pct, flags = _apply(pct, flags, sell & (trend == "up"), 0.6, UPTREND)
+    pct, flags = _apply(pct, flags, sell & (rsi <= 30), 0.5, RSI_OVERSOLD)
+    pct, flags = _apply(pct, flags, sell & (momentum > 0), 0.8, POSITIVE_MOMENTUM)
+    return Sizing(pct, flags)
+
+
+def volatility_multiplier(volatility, params):
+    (vol,) = _floats(volatility)
+    return np.where(vol >= params.high_volatility, params.volatility_reduction,
+                    np.where((vol > 0) & (vol <= params.low_volatility),
+                             params.volatility_boost, 1.0))
+
+
+def regime_multiplier(action, regime, params):
+    action, regime = np.asarray(action), np.asarray(regime)
+    shape = np.broadcast(action, regime).shape
+    if not params.regime_enabled:
+        return np.ones(shape)
+    buy, sell = action == BUY, action == SELL
+    with_trend = ((regime == "trending_up") & buy) | ((regime == "trending_down") & sell)
+    against = ((regime == "trending_up") & sell) | ((regime == "trending_down") & buy)
+    return np.select([regime == "ranging", with_trend, against],
+                     [params.ranging_mult, params.trending_mult, params.counter_trend_mult],
+                     1.0) * np.ones(shape)
+
+
+def size_orders(action, percentage, trend, rsi, momentum, volatility, regime, params,
+                slippage=0.0):
+    """Final order percentage for proposed buys and sells (holds pass through).
+
+    ``slippage`` is the estimated fill slippage of the buy (0 when unknown).
+    """
+    action = np.asarray(action)
+    (slippage,) = _floats(slippage)
+    pct = np.asarray(percentage, dtype=float)
+    trade = (action == BUY) | (action == SELL)
+
+    slipped = (action == BUY) & (slippage > params.max_slippage_pct)
+    pct = np.where(slipped, pct * 0.5, pct)
+    pct, flags = direction_filters(action, pct, trend, rsi, momentum, params)
+    flags = flags | np.where(slipped, HIGH_SLIPPAGE, 0)
+
+    sized = pct * volatility_multiplier(volatility, params)
+    sized = sized * regime_multiplier(action, regime, params)
+    max_pct = np.where(action == BUY, params.max_buy_pct, params.max_sell_pct)
+    sized = np.minimum(np.clip(np.nan_to_num(sized, nan=0.0), 0.0, 100.0), max_pct)
+    floor = (action == BUY) & (sized > 0) & (sized < params.min_buy_pct_floor)
+    sized = np.where(floor, float(params.min_buy_pct_floor), sized)
+    flags = np.where(floor, flags | FLOOR_APPLIED, flags)
+    return Sizing(np.where(trade, sized, pct), flags)
+
+
+# ---------------------------------------------------------------------------
+# Order checks
+# ---------------------------------------------------------------------------
+def order_checks(action, percentage, price, btc, krw, params):
+    """Why an order cannot be placed (``ORDER_OK`` if it can)."""
+    action = np.asarray(action)
+    pct, price, btc, krw = _floats(percentage, price, btc, krw)
+    minimum = params.min_order_amount
+    buy, sell = action == BUY, action == SELL
+    buy_check = np.where(krw < minimum, INSUFFICIENT_KRW,
+                         np.where(krw * (pct / 100) < minimum, BELOW_MINIMUM, ORDER_OK))
+    sell_check = np.where(btc <= 0, NO_BTC,
+                          np.where(price * btc * (pct / 100) < minimum, BELOW_MINIMUM, ORDER_OK))
+    return np.where(buy, buy_check, np.where(sell, sell_check, ORDER_OK))
+
+
+# ---------------------------------------------------------------------------
+# Whole pipeline
+# ---------------------------------------------------------------------------
+RiskDecision = namedtuple("RiskDecision", ["action", "percentage", "exits", "flags", "blocked"])
+
+
+def evaluate(action, percentage, price, avg_price, btc, krw, high_watermark,
+             momentum, atr, trend, rsi, volatility, regime, params, slippage=0.0):
+    """Exits, then sizing, then order checks, element-wise.
+
+    ``action`` holds action codes.  Where an exit fires the result is a sell
+    of the exit percentage; a blocked order becomes a hold of 0.
+    """
+    action = np.asarray(action)
+    exits = position_exits(price, avg_price, btc, high_watermark, momentum, atr, params)
+    sizing = size_orders(action, percentage, trend, rsi, momentum, volatility, regime,
+                         params, slippage)
+    forced = exits.rule != EXIT_NONE
+    blocked = np.where(forced, ORDER_OK,
+                       order_checks(action, sizing.percentage, price, btc, krw, params))
+    final = np.where(forced, SELL, np.where(blocked != ORDER_OK, HOLD, action))
+    pct = np.where(forced, exits.percentage, np.where(final == HOLD, 0.0, sizing.percentage))
+    return RiskDecision(final, pct, exits, np.where(forced, 0, sizing.flags), blocked)
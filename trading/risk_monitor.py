@@ -0,0 +1,216 @@
+"""Event-driven risk monitor fed by a ticker stream.
+
+Replaces interval polling for stop-loss / trailing-stop / take-profit: every
+tick updates the hourly momentum window and the in-memory high watermark,
+then runs ``check_position_risk`` against the cached position.  No REST call
+is made on the hot path — only when a trigger fires, when a refresh is
+requested after a trade, or on the periodic position refresh.
+"""
+
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+import pyupbit
+
+import config
+from trading.utils import safe_float
+from trading.account import get_account
+from trading.database import get_position_state
+from trading.decision import check_position_risk
+
+logger = logging.getLogger("autotrade")
+
+Tick = namedtuple("Tick", ["timestamp", "price"])  # epoch seconds, KRW
+
+MOMENTUM_BARS = 6  # hourly closes, same window as the polling risk check
+
+
+# ---------------------------------------------------------------------------
+# Feeds
+# ---------------------------------------------------------------------------
+def upbit_ticker_feed(market=None):
+    """Yield ticks from the Upbit ticker websocket."""
+    wm = pyupbit.WebSocketManager("ticker", [market or config.RISK_MONITOR_MARKET])
+    try:
+        while True:
+            msg = wm.get()
+            if not isinstance(msg, dict):
+                logger.warning(f"Ticker stream: {msg}")
+                continue
+            yield Tick(msg["trade_timestamp"] / 1000, float(msg["trade_price"]))
+    finally:
+        wm.terminate()
+
+
+def candles_to_ticks(df):
+    """Expand OHLC candles into an open → extreme → extreme → close tick path."""
+    for ts, row in df.iterrows():
+        start = ts.timestamp()
+        if row["close"] >= row["open"]:
+            path = (row["open"], row["low"], row["high"], row["close"])
+        else:
+            path = (row["open"], row["high"], row["low"], row["close"])
+        for k, price in enumerate(path):
+            yield Tick(start + k, float(price))
+
+
+def replay_feed(ticks, speed=None, sleep=time.sleep):
+    """Replay recorded ticks; ``speed`` > 0 paces them (2.0 = twice real time)."""
+    prev = None
+    for tick in ticks:
+        if speed and prev is not None and tick.timestamp > prev:
+            sleep((tick.timestamp - prev) / speed)
+        prev = tick.timestamp
+        yield tick
+
+
+def fetch_position():
+    """Return ``(btc_balance, avg_buy_price)`` from the exchange.
+
+    Always reloads the account cache: after a buy the cached balances only
+    have the KRW reserved, not the BTC bought, until the fill is read back.
+    """
+    account = get_account()
+    account.refresh()
+    btc = account.snapshot().get("BTC", {})
+    return safe_float(btc.get("balance")), safe_float(btc.get("avg_buy_price"))
+
+
+# ---------------------------------------------------------------------------
+# Monitor
+# ---------------------------------------------------------------------------
+class RiskMonitor:
+    """Evaluates position risk on every tick of a price feed.
+
+    ``on_trigger(decision, tick)`` is called when ``check_position_risk``
+    returns a sell.  Further triggers are suppressed for
+    ``RISK_MONITOR_COOLDOWN_SECONDS`` and until the position has been
+    reloaded, so one crash does not fire a burst of sells.
+    """
+
+    def __init__(self, on_trigger, position_loader=fetch_position,
+                 position_state=None, refresh_interval=None, clock=time.monotonic):
+        self.on_trigger = on_trigger
+        self.position_loader = position_loader
+        self.position_state = position_state
+        self.refresh_interval = (config.RISK_MONITOR_POSITION_REFRESH_SECONDS
+                                 if refresh_interval is None else refresh_interval)
+        self.clock = clock
+
+        self.btc_balance = 0.0
+        self.avg_price = 0.0
+        self._closes = deque(maxlen=MOMENTUM_BARS)  # (hour, last price)
+        self._next_refresh = 0.0  # monotonic deadline; 0 = refresh on next tick
+        self._cooldown_until = 0.0
+        self._last_tick = None  # monotonic time of the last tick
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"ticks": 0, "triggers": 0, "refreshes": 0,
+                      "max_latency_ms": 0.0, "last_price": None}
+
+    # -- state -------------------------------------------------------------
+    def seed_closes(self, df_hourly):
+        """Prime the momentum window from recent hourly candles."""
+        for ts, close in df_hourly["close"].tail(MOMENTUM_BARS).items():
+            self._closes.append((int(ts.timestamp() // 3600), float(close)))
+
+    @property
+    def momentum(self):
+        if len(self._closes) < MOMENTUM_BARS:
+            return 0.0
+        return self._closes[-1][1] / self._closes[0][1] - 1
+
+    def _update_closes(self, tick):
+        hour = int(tick.timestamp // 3600)
+        if self._closes and self._closes[-1][0] == hour:
+            self._closes[-1] = (hour, tick.price)
+        elif not self._closes or hour > self._closes[-1][0]:
+            self._closes.append((hour, tick.price))
+
+    def healthy(self, max_age=None):
+        """True while ticks keep arriving (the last one within ``max_age`` s)."""
+        max_age = config.RISK_MONITOR_STALE_SECONDS if max_age is None else max_age
+        last = self._last_tick
+        return last is not None and self.clock() - last <= max_age
+
+    def request_refresh(self):
+        """Reload the position on the next tick (call after any trade)."""
+        self._next_refresh = 0.0
+
+    def refresh_position(self):
+        self.btc_balance, self.avg_price = self.position_loader()
+        self._next_refresh = self.clock() + self.refresh_interval
+        self.stats["refreshes"] += 1
+        logger.info(f"Risk monitor position: {self.btc_balance:.8f} BTC "
+                    f"@ {self.avg_price:,.0f}")
+
+    # -- hot path ----------------------------------------------------------
+    def on_tick(self, tick):
+        """Process one tick; returns the risk decision if a trigger fired."""
+        started = time.perf_counter()
+        self.stats["ticks"] += 1
+        self.stats["last_price"] = tick.price
+        self._last_tick = self.clock()
+        self._update_closes(tick)
+
+        if self.clock() >= self._next_refresh:
+            try:
+                self.refresh_position()
+            except Exception as e:
+                logger.error(f"Risk monitor position refresh failed: {e}")
+                self._next_refresh = self.clock() + config.RISK_MONITOR_RECONNECT_DELAY
+
+        if self.btc_balance <= 0 or self.avg_price <= 0:
+            return None
+
+        position = self.position_state or get_position_state()
+        if tick.price > self.avg_price:
+            position.observe_price(tick.price)
+
+        if self.clock() < self._cooldown_until:
+            return None
+
+        decision = check_position_risk(tick.price, self.avg_price, self.momentum)
+        latency = (time.perf_counter() - started) * 1000
+        self.stats["max_latency_ms"] = max(self.stats["max_latency_ms"], latency)
+        if not decision:
+            return None
+
+        self._cooldown_until = self.clock() + config.RISK_MONITOR_COOLDOWN_SECONDS
+        self.stats["triggers"] += 1
+        logger.warning(f"Risk monitor trigger at {tick.price:,.0f} "
+                       f"({latency:.2f}ms): {decision['reason']}")
+        try:
+            self.on_trigger(decision, tick)
+        except Exception as e:
+            logger.error(f"Risk trigger handler failed: {e}", exc_info=True)
+        self.request_refresh()
+        return decision
+
+    # -- lifecycle ---------------------------------------------------------
+    def run(self, feed_factory):
+        """Consume feeds until stopped, reconnecting when a feed ends or fails."""
+        while not self._stop.is_set():
+            try:
+                for tick in feed_factory():
+                    self.on_tick(tick)
+                    if self._stop.is_set():
+                        return
+                logger.warning("Price feed ended")
+            except Exception as e:
+                logger.error(f"Price feed error: {e}")
+            self._stop.wait(config.RISK_MONITOR_RECONNECT_DELAY)
+
+    def start(self, feed_factory=upbit_ticker_feed):
+        self._thread = threading.Thread(target=self.run, args=(feed_factory,),
+                                        name="risk-monitor", daemon=True)
+        self._thread.start()
+        logger.info("Risk monitor started")
+        return self._thread
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,299 @@
+"""Asyncio job scheduler for the bot's recurring work.
+
+Each job runs its (blocking) function on its own worker thread, so a slow
+GPT analysis never delays a risk check or DCA tranche.  Jobs carry:
+  priority  — lower runs first; a due job waits while a more urgent one runs
+  timeout   — a run past its deadline is reported and stops gating others
+  catch_up  — what to do with runs missed while busy or asleep:
+              "skip" (only runs within ``grace`` of their slot),
+              "coalesce" (one run for any number of misses),
+              "all" (every missed run, back to back)
+A job never overlaps itself.  SIGINT/SIGTERM stop the loop and wait for
+running jobs up to ``shutdown_timeout``; worker threads are daemons, so a
+job still hung after that does not hold up interpreter exit.
+"""
+
+import asyncio
+import logging
+import signal
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("autotrade")
+
+PRIORITY_RISK = 0
+PRIORITY_DCA = 1
+PRIORITY_ANALYSIS = 2
+
+CATCH_UP_POLICIES = ("skip", "coalesce", "all")
+
+
+# ---------------------------------------------------------------------------
+# Triggers
+# ---------------------------------------------------------------------------
+class Every:
+    """Fixed interval, anchored at scheduler start."""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        self.interval = timedelta(seconds=seconds)
+
+    def first(self, now):
+        return now + self.interval
+
+    def next_after(self, t):
+        return t + self.interval
+
+    def __repr__(self):
+        return f"every {self.interval.total_seconds():g}s"
+
+
+class DailyAt:
+    """Fixed local times of day, e.g. ``["00:01", "12:01"]``."""
+
+    def __init__(self, times):
+        if not times:
+            raise ValueError("DailyAt needs at least one time")
+        self.times = sorted(datetime.strptime(t, "%H:%M").time() for t in times)
+
+    def next_after(self, t):
+        for day in (t.date(), t.date() + timedelta(days=1)):
+            for at in self.times:
+                candidate = datetime.combine(day, at)
+                if candidate > t:
+                    return candidate
+
+    def first(self, now):
+        return self.next_after(now)
+
+    def __repr__(self):
+        return "daily at " + ", ".join(t.strftime("%H:%M") for t in self.times)
+
+
+class NextDue:
+    """Whenever ``due()`` says (a datetime, or None for nothing pending).
+
+    Re-read each time the scheduler wakes while the job is idle, so work
+    scheduled by another job is picked up as soon as that job finishes.
+    After a run is queued the next one waits at least ``min_gap`` seconds,
+    so a due time that does not move on (a failed run) retries at that pace.
+    """
+
+    dynamic = True
+
+    def __init__(self, due, min_gap=60):
+        self.due = due
+        self.min_gap = timedelta(seconds=min_gap)
+        self._not_before = None
+
+    def first(self, now):
+        t = self.due()
+        if t is None or self._not_before is None:
+            return t
+        return max(t, self._not_before)
+
+    def next_after(self, t):
+        self._not_before = t + self.min_gap
+        return None  # refreshed through first() once the run is done
+
+    def __repr__(self):
+        return f"when due (min gap {self.min_gap.total_seconds():g}s)"
+
+
+# ---------------------------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------------------------
+class Job:
+    def __init__(self, name, fn, trigger, priority=PRIORITY_ANALYSIS, timeout=None,
+                 catch_up="coalesce", grace=60, run_at_start=False):
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch-up policy: {catch_up}")
+        self.name = name
+        self.fn = fn
+        self.trigger = trigger
+        self.priority = priority
+        self.timeout = timeout
+        self.catch_up = catch_up
+        self.grace = timedelta(seconds=grace)
+        self.run_at_start = run_at_start
+
+        self.next_run = None
+        self.pending = 0
+        self.running = False
+        self.overdue = False  # running past its timeout
+        self.stats = {"runs": 0, "failures": 0, "timeouts": 0, "missed": 0}
+
+    @property
+    def gating(self):
+        """A running job holds back less urgent ones until it finishes or overruns."""
+        return self.running and not self.overdue
+
+    def refresh(self, now):
+        """Re-read a dynamic trigger's next run while nothing is queued."""
+        if getattr(self.trigger, "dynamic", False) and not (self.pending or self.running):
+            self.next_run = self.trigger.first(now)
+
+    def collect_due(self, now):
+        """Queue runs for every slot up to ``now`` according to ``catch_up``."""
+        slots = []
+        while self.next_run is not None and self.next_run <= now:
+            slots.append(self.next_run)
+            self.next_run = self.trigger.next_after(self.next_run)
+        if not slots:
+            return
+
+        if self.catch_up == "all":
+            runs = len(slots)
+        elif self.catch_up == "coalesce":
+            runs = 0 if self.pending or self.running else 1
+        else:  # skip
+            on_time = now - slots[-1] <= self.grace
+            runs = 1 if on_time and not (self.pending or self.running) else 0
+
+        if len(slots) > 1 or runs < len(slots):
+            logger.warning(f"Job '{self.name}': {len(slots)} slot(s) due, "
+                           f"queuing {runs} ({self.catch_up})")
+        self.stats["missed"] += len(slots) - runs
+        self.pending += runs
+
+    def start(self, loop):
+        """Run ``fn`` once on a fresh daemon thread; returns an asyncio future."""
+        future = loop.create_future()
+
+        def settle(result, error):
+            if not future.done():
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+        def target():
+            try:
+                result, error = self.fn(), None
+            except BaseException as e:
+                result, error = None, e
+            try:
+                loop.call_soon_threadsafe(settle, result, error)
+            except RuntimeError:  # loop closed while the job was abandoned
+                pass
+
+        threading.Thread(target=target, name=f"job-{self.name}", daemon=True).start()
+        return future
+
+
+# ---------------------------------------------------------------------------
+# Scheduler
+# ---------------------------------------------------------------------------
+class Scheduler:
+    def __init__(self, now=datetime.now, shutdown_timeout=30):
+        self.now = now
+        self.shutdown_timeout = shutdown_timeout
+        self.jobs = {}
+        self.on_stop = []  # callables run as soon as shutdown begins
+        self._tasks = set()
+        self._wake = None
+        self._stopping = None
+
+    def add(self, job):
+        if job.name in self.jobs:
+            raise ValueError(f"Duplicate job: {job.name}")
+        self.jobs[job.name] = job
+        return job
+
+    def stop(self, sig=None):
+        if sig is not None:
+            logger.info(f"Received signal {sig}, shutting down gracefully...")
+        if self._stopping is not None and not self._stopping.is_set():
+            self._stopping.set()
+            self._wake.set()
+            for callback in self.on_stop:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Shutdown hook failed: {e}")
+
+    def stats(self):
+        return {name: dict(job.stats) for name, job in self.jobs.items()}
+
+    def _dispatch(self):
+        urgent = min((j.priority for j in self.jobs.values() if j.gating), default=None)
+        for job in sorted(self.jobs.values(), key=lambda j: j.priority):
+            if not job.pending or job.running:
+                continue
+            if urgent is not None and job.priority > urgent:
+                continue
+            job.pending -= 1
+            job.running = True
+            urgent = job.priority if urgent is None else min(urgent, job.priority)
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        future = job.start(loop)
+        try:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), job.timeout)
+            except asyncio.TimeoutError:
+                job.overdue = True
+                job.stats["timeouts"] += 1
+                logger.error(f"Job '{job.name}' exceeded {job.timeout}s timeout")
+                self._wake.set()
+                await future
+            job.stats["runs"] += 1
+        except Exception as e:
+            job.stats["failures"] += 1
+            logger.error(f"Job '{job.name}' failed: {e}", exc_info=True)
+        finally:
+            job.running = False
+            job.overdue = False
+            logger.debug(f"Job '{job.name}' finished in {loop.time() - started:.1f}s")
+            self._wake.set()
+
+    async def run(self, install_signals=True):
+        """Run until ``stop()`` or SIGINT/SIGTERM."""
+        loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        signals = (signal.SIGINT, signal.SIGTERM) if install_signals else ()
+        for sig in signals:
+            loop.add_signal_handler(sig, self.stop, sig)
+
+        now = self.now()
+        for job in self.jobs.values():
+            job.next_run = job.trigger.first(now)
+            if job.run_at_start:
+                job.pending += 1
+            logger.info(f"  {job.name}: {job.trigger} (priority {job.priority})")
+
+        try:
+            while not self._stopping.is_set():
+                now = self.now()
+                for job in self.jobs.values():
+                    job.refresh(now)
+                    job.collect_due(now)
+                self._dispatch()
+
+                next_due = min((j.next_run for j in self.jobs.values() if j.next_run is not None),
+                               default=None)
+                delay = (None if next_due is None
+                         else max(0.0, (next_due - self.now()).total_seconds()))
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+            if self._tasks:
+                logger.info(f"Waiting for {len(self._tasks)} running job(s)...")
+                _, still_running = await asyncio.wait(self._tasks, timeout=self.shutdown_timeout)
+                if still_running:
+                    logger.warning("Abandoning jobs still running: " + ", ".join(
+                        j.name for j in self.jobs.values() if j.running))
+                    for task in still_running:
+                        task.cancel()
@@ -0,0 +1,289 @@
+"""Shared HTTP transport: pooled sessions, rate limiting, retries, circuit breaking.
+
+Every outbound call (Upbit quotation/exchange via pyupbit, Google News,
+alternative.me) goes through one ``Transport`` so connections are reused
+and each endpoint group gets its own token bucket and circuit breaker.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+
+logger = logging.getLogger("autotrade")
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_METHODS = {"GET"}  # never retry order placement
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised when an endpoint group's circuit breaker is open."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire`` blocks until a token is free."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token, returning how long the caller must wait for it."""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """Block until a token is available; return the time spent waiting."""
+        wait = self._reserve()
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; half-opens after a cooldown.
+
+    While half-open a single probe request is let through; its success
+    closes the breaker and its failure re-opens it for another cooldown.  A
+    probe that never reports back frees the slot after one cooldown.
+    """
+
+    def __init__(self, failure_threshold, cooldown, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None  # monotonic start of the in-flight half-open probe
+        self.lock = threading.Lock()
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return "closed"
+        if now - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    @property
+    def state(self):
+        with self.lock:
+            return self._state(self.clock())
+
+    def allow(self):
+        with self.lock:
+            now = self.clock()
+            state = self._state(now)
+            if state != "half_open":
+                return state == "closed"
+            if self.probe_started is not None and now - self.probe_started < self.cooldown:
+                return False  # a probe is already in flight
+            self.probe_started = now
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_started = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Circuit opened after "
+                                   f"{self.failures} consecutive failures")
+                elif self.probe_started is not None:
+                    logger.warning("Circuit probe failed; re-opened")
+                self.opened_at = self.clock()
+                self.probe_started = None
+
+
+def classify(method, url):
+    """Map a request to its rate-limit group."""
+    parsed = urlparse(url)
+    host, path = parsed.netloc, parsed.path
+    if host.endswith("upbit.com"):
+        if path.startswith("/v1/order") and method in ("POST", "DELETE"):
+            return "upbit_order"
+        if path.startswith(("/v1/candles", "/v1/orderbook", "/v1/ticker",
+                            "/v1/trades", "/v1/market")):
+            return "upbit_quotation"
+        return "upbit_exchange"
+    if host.endswith("news.google.com"):
+        return "news"
+    if host.endswith("alternative.me"):
+        return "fear_greed"
+    return "default"
+
+
+class Transport:
+    """Pooled ``requests.Session`` with per-group limits, retries and breakers."""
+
+    def __init__(self, rate_limits=None, max_retries=None, backoff_base=None,
+                 backoff_max=None, failure_threshold=None, cooldown=None,
+                 pool_size=None, session=None, sleep=time.sleep):
+        self.rate_limits = rate_limits or config.TRANSPORT_RATE_LIMITS
+        self.max_retries = config.TRANSPORT_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = backoff_base or config.TRANSPORT_BACKOFF_BASE
+        self.backoff_max = backoff_max or config.TRANSPORT_BACKOFF_MAX
+        self.failure_threshold = failure_threshold or config.TRANSPORT_CIRCUIT_FAILURES
+        self.cooldown = config.TRANSPORT_CIRCUIT_COOLDOWN if cooldown is None else cooldown
+        self.sleep = sleep
+
+        self.session = session or requests.Session()
+        if session is None:
+            size = pool_size or config.TRANSPORT_POOL_SIZE
+            adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+        self._buckets = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: defaultdict(int))
+
+    def _bucket(self, group):
+        with self._lock:
+            if group not in self._buckets:
+                rate, burst = self.rate_limits.get(group, self.rate_limits["default"])
+                self._buckets[group] = TokenBucket(rate, burst, sleep=self.sleep)
+            return self._buckets[group]
+
+    def breaker(self, group):
+        with self._lock:
+            if group not in self._breakers:
+                self._breakers[group] = CircuitBreaker(self.failure_threshold, self.cooldown)
+            return self._breakers[group]
+
+    def _count(self, group, key, n=1):
+        with self._lock:
+            self._counters[group][key] += n
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, delay)  # full jitter
+
+    def request(self, method, url, group=None, **kwargs):
+        """Send a request; retries idempotent calls on transient failures.
+
+        Returns the final ``requests.Response`` (even a 429/5xx once retries
+        are exhausted, so callers keep their own status handling) or raises
+        the last connection error / ``CircuitOpenError``.
+        """
+        method = method.upper()
+        group = group or classify(method, url)
+        kwargs.setdefault("timeout", config.API_TIMEOUT)
+        breaker = self.breaker(group)
+        retries = self.max_retries if method in RETRY_METHODS else 0
+
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                self._count(group, "circuit_rejections")
+                raise CircuitOpenError(f"Circuit open for '{group}'")
+
+            if self._bucket(group).acquire() > 0:
+                self._count(group, "throttles")
+            self._count(group, "requests")
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                breaker.record_failure()
+                self._count(group, "failures")
+                if attempt >= retries:
+                    raise
+                logger.warning(f"{group} {method} failed ({e}); retrying")
+            else:
+                if resp.status_code not in RETRY_STATUS:
+                    breaker.record_success()
+                    return resp
+                breaker.record_failure()
+                self._count(group, "failures")
+                if attempt >= retries:
+                    return resp
+                logger.warning(f"{group} {method} returned {resp.status_code}; retrying")
+
+            self._count(group, "retries")
+            self.sleep(self._backoff(attempt))
+
+    def get(self, url, group=None, **kwargs):
+        return self.request("GET", url, group=group, **kwargs)
+
+    def post(self, url, group=None, **kwargs):
+        return self.request("POST", url, group=group, **kwargs)
+
+    def delete(self, url, group=None, **kwargs):
+        return self.request("DELETE", url, group=group, **kwargs)
+
+    def stats(self):
+        """Return ``{group: {requests, retries, throttles, failures, ...}}``."""
+        with self._lock:
+            out = {g: dict(c) for g, c in self._counters.items()}
+        for group, breaker in list(self._breakers.items()):
+            out.setdefault(group, {})["circuit"] = breaker.state
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Shared instance
+# ---------------------------------------------------------------------------
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Return the process-wide transport, creating it on first use."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
+
+
+def set_transport(transport):
+    global _transport
+    _transport = transport
+
+
+def get(url, group=None, **kwargs):
+    return get_transport().get(url, group=group, **kwargs)
+
+
+class _PyupbitRequests:
+    """Stand-in for the ``requests`` module inside ``pyupbit.request_api``."""
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def get(self, url, **kwargs):
+        return get_transport().get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return get_transport().post(url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return get_transport().delete(url, **kwargs)
+
+
+def install_pyupbit():
+    """Route all pyupbit REST calls through the shared transport."""
+    from pyupbit import request_api
+    request_api.requests = _PyupbitRequests()